@@ -0,0 +1,250 @@
+# File Name: admission.py
+# Owner: Andrew John Holland
+# Purpose: Admission control for chat requests in one worker: a bounded number of chats in flight, a bounded priority queue (short questions first) with a wait deadline, and per-client rate and concurrency limits. Rejections carry a Retry-After hint so overload is answered quickly with 429 instead of every request timing out together.
+# Version: v1.2
+# Last Updated: 2026-10-18
+# Change Log:
+# 1. v1.2 - estimated_wait spreads the chats ahead over all slots ((ahead + 1) / slots x service time), so with every slot busy a chat is queued instead of rejected as if it waited a whole service time
+# 2. v1.1 - Per-client limits off by default: behind a proxy without ADMISSION_CLIENT_HEADER every chat has the proxy's address
+# 3. v1.0 - Initial creation: AdmissionController (acquire/slot/Ticket), AdmissionRejected, deadline-aware queueing from a service-time estimate
+
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+# Chats served at once per worker (DB lookup + Gemini round-trip); CHAT_CONCURRENCY kept as the setting's name
+MAX_ACTIVE = int(os.getenv('CHAT_CONCURRENCY', '32'))
+# Chats allowed to wait for a slot; beyond this they are rejected straight away
+MAX_QUEUE = int(os.getenv('ADMISSION_MAX_QUEUE', '64'))
+# Longest a chat waits for a slot, and the estimated wait beyond which it is not queued at all
+QUEUE_DEADLINE = float(os.getenv('ADMISSION_QUEUE_DEADLINE', '5'))
+# Per client (IP, or ADMISSION_CLIENT_HEADER behind a proxy): chats per minute, burst, and chats in flight or queued.
+# 0 disables, the default: behind nginx without the header every visitor shares the proxy's address (e.g. 30 / 10 / 4 once set)
+CLIENT_RPM = float(os.getenv('ADMISSION_CLIENT_RPM', '0'))
+CLIENT_BURST = float(os.getenv('ADMISSION_CLIENT_BURST', '10'))
+CLIENT_ACTIVE = int(os.getenv('ADMISSION_CLIENT_ACTIVE', '0'))
+# Questions up to this many characters are queued as if their deadline were SHORT_QUERY_PRIORITY x the real one,
+# so they go ahead of longer questions without starving them
+SHORT_QUERY_CHARS = int(os.getenv('ADMISSION_SHORT_QUERY_CHARS', '200'))
+# Longest accepted chat message; routes answer longer ones with 413
+MAX_MESSAGE_CHARS = int(os.getenv('MAX_MESSAGE_CHARS', '2000'))
+SHORT_QUERY_PRIORITY = 0.5
+
+# Starting guess for one chat's service time (mostly the Gemini call); replaced by a moving average as chats finish
+INITIAL_SERVICE_SECONDS = 1.0
+SERVICE_SMOOTHING = 0.2
+# Remembered clients (least recently seen are dropped first)
+MAX_CLIENTS = 10000
+
+
+class AdmissionRejected(Exception):
+    """A chat was not admitted; retry_after is whole seconds for the Retry-After header."""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f'Chat rejected ({reason}), retry after {retry_after}s')
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def _seconds(value):
+    return max(1, math.ceil(value))
+
+
+class _Client:
+    __slots__ = ('tokens', 'updated', 'pending')
+
+    def __init__(self, tokens, now):
+        self.tokens = tokens
+        self.updated = now
+        self.pending = 0
+
+
+class Ticket:
+    """One admitted chat's slot; release() is idempotent, so several cleanup paths may call it."""
+
+    __slots__ = ('_controller', '_client', '_started', '_released')
+
+    def __init__(self, controller, client, started):
+        self._controller = controller
+        self._client = client
+        self._started = started
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller._release(self._client, self._started)
+
+
+class AdmissionController:
+    """Per-worker gate in front of the chat flow, run on the event loop (no locking).
+
+    A chat either gets a slot now, waits in a bounded queue, or is rejected with AdmissionRejected. The
+    queue is served earliest-deadline-first, with short questions given a nearer deadline, so they go ahead
+    of long ones that have not waited long. A chat is rejected up front when the queue is full or its
+    estimated wait ((chats ahead + 1) x average service time / slots) is past the deadline, and at the deadline
+    if it is still queued; no chat waits longer than queue_deadline.
+    """
+
+    def __init__(self, max_active=MAX_ACTIVE, max_queue=MAX_QUEUE, queue_deadline=QUEUE_DEADLINE,
+                 client_rpm=CLIENT_RPM, client_burst=CLIENT_BURST, client_active=CLIENT_ACTIVE,
+                 short_query_chars=SHORT_QUERY_CHARS, clock=time.monotonic):
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.queue_deadline = queue_deadline
+        self.client_rate = client_rpm / 60.0
+        self.client_burst = client_burst
+        self.client_active = client_active
+        self.short_query_chars = short_query_chars
+        self.service_seconds = INITIAL_SERVICE_SECONDS
+        self._clock = clock
+        self._active = 0
+        # (ordering deadline, arrival, future); futures of abandoned waiters stay until popped and are skipped
+        self._waiters = []
+        self._waiting = 0
+        self._arrivals = itertools.count()
+        self._clients = OrderedDict()
+        self.admitted = 0
+        self.queued = 0
+        self.rejected_client = 0
+        self.rejected_queue_full = 0
+        self.rejected_deadline = 0
+
+    # ---- Per-client limits ----
+
+    def _client_state(self, client, now):
+        state = self._clients.get(client)
+        if state is None:
+            state = self._clients[client] = _Client(self.client_burst, now)
+            while len(self._clients) > MAX_CLIENTS:
+                oldest, old = next(iter(self._clients.items()))
+                if old.pending:
+                    break
+                del self._clients[oldest]
+        else:
+            self._clients.move_to_end(client)
+        return state
+
+    def _check_client(self, client, now):
+        """Take one of the client's tokens and count the chat as pending, or raise AdmissionRejected."""
+        if client is None or (not self.client_rate and not self.client_active):
+            return
+        state = self._client_state(client, now)
+        if self.client_active and state.pending >= self.client_active:
+            self.rejected_client += 1
+            raise AdmissionRejected('too many chats from this client', _seconds(self.service_seconds))
+        if self.client_rate:
+            state.tokens = min(self.client_burst, state.tokens + (now - state.updated) * self.client_rate)
+            state.updated = now
+            if state.tokens < 1:
+                self.rejected_client += 1
+                raise AdmissionRejected('client rate limit', _seconds((1 - state.tokens) / self.client_rate))
+            state.tokens -= 1
+        state.pending += 1
+
+    def _client_done(self, client):
+        state = self._clients.get(client)
+        if state is not None and state.pending:
+            state.pending -= 1
+
+    # ---- Global slots and queue ----
+
+    def estimated_wait(self, ahead=None):
+        """Seconds until a chat joining behind `ahead` waiting chats (default: the current queue) gets a slot.
+
+        With busy slots finishing at staggered times, one frees about every service_seconds / max_active.
+        """
+        ahead = self._waiting if ahead is None else ahead
+        return (ahead + 1) / max(1, self.max_active) * self.service_seconds
+
+    def _reject(self, client, reason, retry_after):
+        self._client_done(client)
+        setattr(self, f'rejected_{reason}', getattr(self, f'rejected_{reason}') + 1)
+        logger.debug(f'Admission rejected a chat: {reason} ({self._active} active, {self._waiting} waiting)')
+        raise AdmissionRejected(reason.replace('_', ' '), _seconds(retry_after))
+
+    async def acquire(self, client=None, message=''):
+        """Wait for a slot; returns a Ticket to release when the chat is done, or raises AdmissionRejected."""
+        now = self._clock()
+        self._check_client(client, now)
+        if self._active < self.max_active and not self._waiting:
+            return self._admit(client, now)
+        if self._waiting >= self.max_queue:
+            self._reject(client, 'queue_full', self.estimated_wait())
+        share = SHORT_QUERY_PRIORITY if len(message) <= self.short_query_chars else 1.0
+        order = now + self.queue_deadline * share
+        ahead = sum(1 for key, _, f in self._waiters if key <= order and not f.done())
+        if self.estimated_wait(ahead) > self.queue_deadline:
+            self._reject(client, 'deadline', self.estimated_wait(ahead))
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (order, next(self._arrivals), future))
+        self._waiting += 1
+        self.queued += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_deadline)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # The slot was handed over as we timed out or were cancelled: give it to the next chat
+                if isinstance(e, asyncio.CancelledError):
+                    self._release(client)
+                    raise
+                return Ticket(self, client, self._clock())
+            future.cancel()
+            self._waiting -= 1
+            if isinstance(e, asyncio.CancelledError):
+                self._client_done(client)
+                raise
+            self._reject(client, 'deadline', self.estimated_wait())
+        return Ticket(self, client, self._clock())
+
+    def _admit(self, client, now):
+        self._active += 1
+        self.admitted += 1
+        return Ticket(self, client, now)
+
+    def _release(self, client, started=None):
+        self._client_done(client)
+        if started is not None:
+            self.service_seconds += SERVICE_SMOOTHING * (self._clock() - started - self.service_seconds)
+        self._active -= 1
+        # Hand the slot straight to the best waiter still waiting
+        while self._waiters and self._active < self.max_active:
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self._waiting -= 1
+            self._active += 1
+            self.admitted += 1
+            future.set_result(True)
+
+    @asynccontextmanager
+    async def slot(self, client=None, message=''):
+        """`async with` form of acquire/release."""
+        ticket = await self.acquire(client, message)
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    def stats(self):
+        return {
+            'active': self._active,
+            'waiting': self._waiting,
+            'max_active': self.max_active,
+            'max_queue': self.max_queue,
+            'service_seconds': round(self.service_seconds, 4),
+            'admitted': self.admitted,
+            'queued': self.queued,
+            'rejected_client': self.rejected_client,
+            'rejected_queue_full': self.rejected_queue_full,
+            'rejected_deadline': self.rejected_deadline,
+        }
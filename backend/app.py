@@ -1,8 +1,8 @@
 # File Name: app.py
 # Owner: Andrew John Holland
-# Purpose: Flask application for the Cyberpunk Monk Chatbot, handling HTTP requests and Gemini API integration.
-# Version: v2.3
-# Last Updated: 2025-08-08
+# Purpose: Entry point kept for the old Flask app.py: the Cyberpunk Monk Chatbot now runs as one ASGI app (backend.monk_bot), which also serves /monk.
+# Version: v4.0
+# Last Updated: 2026-10-18
 # Change Log:
 # 1. Initial creation of Flask structure - 2025-08-07
 # 2. Added Gemini API integration - 2025-08-07
@@ -17,87 +17,27 @@
 # 11. Fixed database query to use 'url' column, incremented to v2.1 - 2025-08-08
 # 12. Enabled debug mode, enhanced static file checks, incremented to v2.2 - 2025-08-08
 # 13. Simplified routing, added fallback response, incremented to v2.3 - 2025-08-08
+# 14. Replaced url LIKE lookup on ../data_cache.db with ranked full-text search via backend.retrieval, incremented to v2.4 - 2026-10-18
+# 15. Prompt data is the top-ranked cleaned chunks via get_context, incremented to v2.5 - 2026-10-18
+# 16. Response cache in front of Gemini with generation invalidation; added /stats, incremented to v2.6 - 2026-10-18
+# 17. Prompts built with build_prompt under the model's char budget; prompt size logged, incremented to v2.7 - 2026-10-18
+# 18. Replaced the sleeping 429 retry loop with the shared ModelGate (token bucket, jittered backoff, circuit breaker, queue deadline); shed requests get busy_reply, incremented to v2.8 - 2026-10-18
+# 19. Per-stage timing spans, request/in-flight/reply metrics and a Prometheus /metrics route via backend.metrics, incremented to v2.9 - 2026-10-18
+# 20. Logging via backend.logging_setup (queued, rotating, LOG_LEVEL default INFO); stopped logging whole request payloads, incremented to v3.0 - 2026-10-18
+# 21. Model client from backend.model_client.ModelClients (built once, configurable model/backend) instead of a module-level GenerativeModel, incremented to v3.1 - 2026-10-18
+# 22. Retired the Flask server: app.py re-exports the FastAPI app from backend.monk_bot (shared ChatService hot path, /monk and /stats compatibility routes) and runs it with uvicorn; production uses gunicorn.conf.py, incremented to v4.0 - 2026-10-18
 
-import logging
 import os
-from flask import Flask, request, jsonify, send_from_directory
-from flask_cors import CORS
-from prompts import get_prompt
-import google.generativeai as genai
-import sqlite3
-import time
-from google.api_core.exceptions import ResourceExhausted
+import sys
 
-app = Flask(__name__, static_folder="../static")
-CORS(app)
-logging.basicConfig(
-    filename="../logs/execution.log",
-    level=logging.DEBUG,
-    format="%(asctime)s - %(levelname)s - %(message)s"
-)
+# Run from backend/ as a script; make the backend package importable
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
 
-genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
-model = genai.GenerativeModel('gemini-1.5-flash')
-
-@app.route('/')
-def serve_chat():
-    chat_path = os.path.join(app.static_folder, 'chat.html')
-    logging.debug(f"Attempting to serve chat.html from {chat_path}")
-    if not os.path.exists(chat_path):
-        logging.error("chat.html not found in static folder")
-        return "Error: chat.html not found in static folder", 404
-    return send_from_directory(app.static_folder, 'chat.html')
-
-@app.route('/static/<path:filename>')
-def serve_static(filename):
-    file_path = os.path.join(app.static_folder, filename)
-    logging.debug(f"Attempting to serve static file: {filename}")
-    if not os.path.exists(file_path):
-        logging.error(f"Static file {filename} not found")
-        return f"Error: {filename} not found", 404
-    return send_from_directory(app.static_folder, filename)
-
-@app.route('/monk', methods=['POST'])
-def monk_endpoint():
-    try:
-        start_time = time.time()
-        data = request.get_json()
-        query = data.get('message', '').strip().lower()
-        logging.debug(f"Received POST request to /monk: {data}")
-
-        conn = sqlite3.connect('../data_cache.db')
-        cursor = conn.cursor()
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='data_cache'")
-        if not cursor.fetchone():
-            logging.error("Table 'data_cache' does not exist")
-            raise Exception("Table 'data_cache' does not exist")
-        cursor.execute("SELECT content FROM data_cache WHERE url LIKE ?", ('%' + query + '%',))
-        result = cursor.fetchone()
-        conn.close()
-
-        data_content = result[0] if result else ""
-        prompt = get_prompt(query, data_content)
-        retries = 3
-        for attempt in range(retries):
-            try:
-                response = model.generate_content(prompt)
-                break
-            except ResourceExhausted as e:
-                if attempt < retries - 1:
-                    logging.warning(f"429 error on attempt {attempt + 1}, retrying in {e.retry_delay} seconds")
-                    time.sleep(e.retry_delay)
-                else:
-                    logging.error(f"Error in /monk endpoint: {str(e)}")
-                    return jsonify({"error": str(e)}), 500
-
-        response_text = response.text if response else "No response generated."
-        latency = time.time() - start_time
-        logging.info(f"Generated response for query: {query}, latency: {latency:.2f}s")
-        return jsonify({"response": response_text})
-    except Exception as e:
-        logging.error(f"Error in /monk endpoint: {str(e)}")
-        return jsonify({"error": str(e)}), 500
+from backend.monk_bot import app  # noqa: E402,F401  (gunicorn/uvicorn target: backend.app:app)
 
 if __name__ == '__main__':
-    logging.info("Starting Flask application")
-    app.run(host='0.0.0.0', port=5000, debug=True)  # Debug mode enabled
\ No newline at end of file
+    import uvicorn
+    # Development server; production: gunicorn -c gunicorn.conf.py backend.monk_bot:app
+    uvicorn.run(app, host='0.0.0.0', port=5000)
\ No newline at end of file
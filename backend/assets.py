@@ -0,0 +1,219 @@
+# File Name: assets.py
+# Owner: Andrew John Holland
+# Purpose: Static/frontend asset pipeline for the Cyberpunk Monk Chatbot: indexes /static and /frontend once, fingerprints filenames, rewrites references in CSS/HTML, precompresses (gzip, brotli when installed) and serves from memory with ETag/304 and long-lived Cache-Control.
+# Version: v1.0
+# Last Updated: 2026-10-18
+# Change Log:
+# 1. v1.0 - Initial creation: AssetIndex (fingerprints, reference rewriting, gzip/br variants), conditional responses
+
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import threading
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+# URL prefix -> directory
+ASSET_ROOTS = {
+    '/static': os.path.join(PROJECT_ROOT, 'static'),
+    '/frontend': os.path.join(PROJECT_ROOT, 'frontend'),
+}
+
+# Fingerprinted URLs never change content; plain URLs (and the HTML that names the fingerprints) revalidate
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE = os.getenv('ASSET_CACHE_CONTROL', 'public, max-age=0, must-revalidate')
+
+COMPRESSIBLE = frozenset(('.html', '.css', '.js', '.json', '.svg', '.txt', '.ico', '.xml', '.map'))
+# References inside these are rewritten to fingerprinted URLs (CSS first, since HTML links the CSS)
+REWRITE_ORDER = ('.css', '.html')
+# Keep a compressed variant only when it saves at least this share of the bytes
+MIN_SAVING = 0.1
+FINGERPRINT_CHARS = 10
+
+
+class Asset:
+    """One file held in memory: identity bytes plus any precompressed variants, keyed by encoding."""
+
+    def __init__(self, url, body, media_type):
+        self.url = url
+        self.media_type = media_type
+        self.digest = hashlib.sha256(body).hexdigest()[:FINGERPRINT_CHARS]
+        self.bodies = {'identity': body}
+        ext = os.path.splitext(url)[1].lower()
+        if ext in COMPRESSIBLE:
+            self._add_variant('gzip', gzip.compress(body, compresslevel=9, mtime=0))
+            if brotli is not None:
+                self._add_variant('br', brotli.compress(body, quality=11))
+        base, _ = os.path.splitext(url)
+        self.fingerprinted_url = f'{base}.{self.digest}{ext}'
+
+    def _add_variant(self, encoding, body):
+        if len(body) <= len(self.bodies['identity']) * (1 - MIN_SAVING):
+            self.bodies[encoding] = body
+
+    @property
+    def compressible(self):
+        return len(self.bodies) > 1
+
+    def etag(self, encoding):
+        return f'"{self.digest}"' if encoding == 'identity' else f'"{self.digest}-{encoding}"'
+
+    def choose_encoding(self, accept_encoding):
+        """Smallest variant the client accepts (br, then gzip), else identity."""
+        accepted = parse_accept_encoding(accept_encoding)
+        for encoding in ('br', 'gzip'):
+            if encoding in self.bodies and accepted.get(encoding, accepted.get('*', 0)) > 0:
+                return encoding
+        return 'identity'
+
+    def matches(self, if_none_match):
+        """True when If-None-Match names any representation of this content (weak comparison)."""
+        if not if_none_match:
+            return False
+        tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+        return '*' in tags or any(self.etag(encoding) in tags for encoding in self.bodies)
+
+
+def parse_accept_encoding(header):
+    """{coding: q} from an Accept-Encoding header."""
+    accepted = {}
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    return accepted
+
+
+def media_type_for(path):
+    media_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    if media_type.startswith('text/') or media_type in ('application/javascript', 'image/svg+xml', 'application/json'):
+        media_type += '; charset=utf-8'
+    return media_type
+
+
+class AssetIndex:
+    """Every file under the asset roots, loaded once (on startup or first request) and served from memory."""
+
+    def __init__(self, roots=None):
+        self.roots = dict(ASSET_ROOTS if roots is None else roots)
+        self._assets = None  # url (plain and fingerprinted) -> (Asset, immutable)
+        self._lock = threading.Lock()
+        self.responses = 0
+        self.not_modified = 0
+        self.compressed = 0
+
+    def load(self):
+        """Read, fingerprint, rewrite and compress every asset; safe to run in a worker thread."""
+        with self._lock:
+            if self._assets is None:
+                self._assets = self._build()
+                logger.info(f"Asset index ready: {self.stats()['files']} files")
+        return self
+
+    def _build(self):
+        files = {}
+        for prefix, directory in self.roots.items():
+            if not os.path.isdir(directory):
+                logger.warning(f"Asset directory missing: {directory}")
+                continue
+            for folder, _, names in os.walk(directory):
+                for name in sorted(names):
+                    path = os.path.join(folder, name)
+                    url = prefix + '/' + os.path.relpath(path, directory).replace(os.sep, '/')
+                    with open(path, 'rb') as f:
+                        files[url] = f.read()
+
+        def rank(url):
+            ext = os.path.splitext(url)[1].lower()
+            return REWRITE_ORDER.index(ext) + 1 if ext in REWRITE_ORDER else 0
+
+        assets, renames = {}, {}
+        for url in sorted(files, key=rank):
+            body = files[url]
+            if rank(url):
+                body = rewrite_references(body, renames)
+            asset = Asset(url, body, media_type_for(url))
+            renames[url] = asset.fingerprinted_url
+            assets[url] = (asset, False)
+            assets[asset.fingerprinted_url] = (asset, True)
+        return assets
+
+    def get(self, url):
+        """(Asset, immutable) for a plain or fingerprinted URL, or None."""
+        if self._assets is None:
+            self.load()
+        return self._assets.get(url)
+
+    def url_for(self, url):
+        """Fingerprinted URL for a plain asset URL (unchanged when unknown)."""
+        entry = self.get(url)
+        return entry[0].fingerprinted_url if entry else url
+
+    def response(self, url, headers, method='GET'):
+        """Starlette response for an asset request: 200 with the best encoding, 304 when unchanged, None when unknown."""
+        entry = self.get(url)
+        if entry is None:
+            return None
+        asset, immutable = entry
+        encoding = asset.choose_encoding(headers.get('accept-encoding'))
+        response_headers = {
+            'Cache-Control': IMMUTABLE_CACHE if immutable else REVALIDATE_CACHE,
+            'ETag': asset.etag(encoding),
+        }
+        if asset.compressible:
+            response_headers['Vary'] = 'Accept-Encoding'
+        if asset.matches(headers.get('if-none-match')):
+            self.not_modified += 1
+            return Response(status_code=304, headers=response_headers)
+
+        body = asset.bodies[encoding]
+        if encoding != 'identity':
+            response_headers['Content-Encoding'] = encoding
+            self.compressed += 1
+        self.responses += 1
+        if method == 'HEAD':
+            response_headers['Content-Length'] = str(len(body))
+            body = b''
+        return Response(body, headers=response_headers, media_type=asset.media_type)
+
+    def stats(self):
+        assets = {id(asset): asset for asset, _ in (self._assets or {}).values()}.values()
+        return {
+            'files': len(assets),
+            'bytes': sum(len(asset.bodies['identity']) for asset in assets),
+            'compressed_bytes': sum(min(len(body) for body in asset.bodies.values()) for asset in assets),
+            'brotli': brotli is not None,
+            'responses': self.responses,
+            'not_modified': self.not_modified,
+            'compressed': self.compressed,
+        }
+
+
+def rewrite_references(body, renames):
+    """Point quoted/url() references to already-indexed assets at their fingerprinted URLs."""
+    try:
+        text = body.decode('utf-8')
+    except UnicodeDecodeError:
+        return body
+    for url, fingerprinted in renames.items():
+        for quote in ('"', "'", '('):
+            closing = ')' if quote == '(' else quote
+            text = text.replace(f'{quote}{url}{closing}', f'{quote}{fingerprinted}{closing}')
+    return text.encode('utf-8')
@@ -0,0 +1,92 @@
+# File Name: conftest.py
+# Owner: Andrew John Holland
+# Purpose: Shared pytest fixtures for offline backend tests (SQLite cache in a temp dir, no Gemini calls).
+# Version Control: v1.7
+# Change Log:
+# 1. Initial creation with offline monk_bot fixture - 2026-10-18
+# 2. Added cache_db fixture for a fresh, initialised SQLite data_cache per test - 2026-10-18
+# 3. Added open_gate fixture so load tests are not shed by the Gemini quota guard - 2026-10-18
+# 4. Test runs log to a temp dir instead of the tracked logs/ files - 2026-10-18
+# 5. Added use_model fixture for swapping the model client backend - 2026-10-18
+# 6. open_gate and use_model patch the shared ChatService (monk_bot.service) - 2026-10-18
+# 7. Per-client admission limits off for the shared test client address - 2026-10-18
+# 8. monk_bot no longer exports a placeholder GOOGLE_API_KEY for the session - 2026-10-18
+# 9. Keyword retrieval and a temp embedding index dir, so a local .env or a built embeddings/ index cannot reach the chat tests - 2026-10-18
+
+import os
+import tempfile
+import pytest
+
+# backend.database reads these at import, which can happen while test modules are collected
+os.environ["DB_BACKEND"] = "sqlite"
+os.environ["SQLITE_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="monk-test-"), "data_cache.db")
+os.environ["LOG_DIR"] = tempfile.mkdtemp(prefix="monk-logs-")
+# Vector retrieval is covered by test_embeddings.py against its own index dirs
+os.environ["RETRIEVAL_MODE"] = "fts"
+os.environ["EMBEDDING_INDEX_DIR"] = tempfile.mkdtemp(prefix="monk-embeddings-")
+# Every test client shares one address; per-client admission limits are covered by test_admission.py
+os.environ["ADMISSION_CLIENT_RPM"] = "0"
+os.environ["ADMISSION_CLIENT_ACTIVE"] = "0"
+
+
+@pytest.fixture(scope="session")
+def monk_bot():
+    """Import backend.monk_bot against a throwaway SQLite cache (the Gemini SDK reads its key on first use only)."""
+    from backend import monk_bot as module
+    return module
+
+
+@pytest.fixture
+def cache_db(monk_bot, tmp_path, monkeypatch):
+    """backend.database pointed at an empty SQLite file for one test."""
+    from backend import database
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "data_cache.db"))
+    monkeypatch.setattr(database, "_pool", None)
+    database.init_db()
+    yield database
+    database.get_pool().close()
+
+
+@pytest.fixture
+def open_gate(monk_bot, monkeypatch):
+    """A ModelGate with quota to spare, for tests that fire more chats than the default burst."""
+    from backend.rate_limit import ModelGate, TokenBucket
+    gate = ModelGate(bucket=TokenBucket(rate_per_minute=60000, burst=1000))
+    monkeypatch.setattr(monk_bot.service, "model_gate", gate)
+    return gate
+
+
+@pytest.fixture
+def use_model(monk_bot, monkeypatch):
+    """Serve chats from a fake model class; it is built like a backend client, as cls(name, generation_config)."""
+    from backend.model_client import ModelClients
+
+    def install(model_cls):
+        clients = ModelClients(backend=model_cls, generation_config={})
+        monkeypatch.setattr(monk_bot.service, "model_clients", clients)
+        return clients
+    return install
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class SlowModel:
+    """Stand-in for genai.GenerativeModel that answers after a fixed async delay."""
+
+    delay = 0.2
+
+    def __init__(self, name, generation_config=None):
+        self.name = name
+
+    async def generate_content_async(self, prompt):
+        import asyncio
+        await asyncio.sleep(self.delay)
+        return FakeResponse(f"echo: {prompt[-20:]}")
+
+
+@pytest.fixture
+def slow_model():
+    return SlowModel
@@ -2,33 +2,44 @@
 File: backend/database.py
 Owner: Andrew John Holland
 Purpose: Manages PostgreSQL database for caching data retrieved from Holland's URLs for the Cyberpunk Monk Chatbot
-Version: 2.6
+Version: 3.10
 Change Log:
+v3.10 - get_pool initialises through init_db(only_if_missing=True), which re-checks under the pool lock: threads racing to the first query build one pool instead of closing each other's
+v3.9 - store_document documented as the seeding helper for tests and benchmarks; the crawler writes through store_crawl_results
+v3.8 - Full-text schema (tsvector + GIN, FTS5 + triggers) applied once as migration 3 instead of on every start
+v3.7 - Schema version read without creating the table (migrate creates it under the migration lock)
+v3.6 - Schema from migrations.py (versioned, locked): data_cache unique on url with content_hash and a timestamp index, written by upsert; SQLite connections in WAL with busy_timeout and synchronous=NORMAL
+v3.5 - Added cache_events (generation, url) written with every generation bump; get_cache_changes lets servers invalidate only replies built from changed pages
+v3.4 - psycopg2 imported on first PostgreSQL connect; DB_CONNECT_TIMEOUT bounds the connect attempt; close_db for shutdown; no logging setup at import
+v3.3 - Logging via logging_setup.configure_logging (queued, rotating, ERROR-only error.log) instead of basicConfig FileHandlers
+v3.2 - Added cache_meta generation counter, bumped whenever cached pages change, for response cache invalidation
+v3.1 - Added crawl_state (etag, last_modified, content_hash per url) and store_crawl_results for one-transaction crawler writes
+v3.0 - Added data_chunks (url, chunk_index, char_offset, content_hash, fetched_at) with FTS over chunks; store_document; backfill of legacy rows
+v2.9 - Added full-text search index on data_cache (SQLite FTS5 kept in sync by triggers; PostgreSQL tsvector + GIN)
+v2.8 - Added fetch_one_async/fetch_all_async running pooled queries on a bounded executor for the async chat path
+v2.7 - Added pooled data-access layer; backend (PostgreSQL or SQLite) chosen once in init_db; pool/wait/fallback counters
 v2.6 - Load .env from project root explicitly; ensured logs dir creation
 v2.5 - Fixed SyntaxError at line 1
 v2.4 - Fixed invalid content at line 1
 v2.3 - Re-verified syntax for line 38 issue
 """
 import os
+import asyncio
 import logging
-import psycopg2
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
 from dotenv import load_dotenv
+from . import ingest, migrations
+from .migrations import POSTGRESQL, SQLITE
 
 # Paths
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
-LOG_DIR = os.path.join(PROJECT_ROOT, 'logs')
-os.makedirs(LOG_DIR, exist_ok=True)
-
-# Setup logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(os.path.join(LOG_DIR, 'execution.log')),
-        logging.FileHandler(os.path.join(LOG_DIR, 'error.log')),
-        logging.StreamHandler()
-    ]
-)
+
 logger = logging.getLogger(__name__)
 
 # Load .env from project root explicitly
@@ -41,66 +52,425 @@ DB_USER = os.getenv('DB_USER', 'postgres')
 DB_PASSWORD = os.getenv('DB_PASSWORD', 'Predator67')
 
 # Fallback SQLite path
-DB_PATH = os.path.join(PROJECT_ROOT, 'data_cache.db')
-
-def init_db():
-    """Initialize PostgreSQL or SQLite database."""
-    try:
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            port=DB_PORT,
-            database=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD
-        )
-        logger.debug(f'Connected to PostgreSQL database at {DB_HOST}:{DB_PORT}/{DB_NAME}')
-        c = conn.cursor()
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS data_cache (
-                id SERIAL PRIMARY KEY,
-                url TEXT,
-                content TEXT,
-                timestamp TIMESTAMP
-            )
-        ''')
-        conn.commit()
-        logger.info('PostgreSQL database initialized with table data_cache')
-
-        c.execute("SELECT EXISTS (SELECT FROM information_schema.tables WHERE table_name = 'data_cache')")
-        exists = c.fetchone()[0]
-        if exists:
-            logger.debug('Table data_cache confirmed to exist (PostgreSQL)')
-        else:
-            logger.error('Table data_cache not created (PostgreSQL)')
-            raise Exception('Failed to create table data_cache (PostgreSQL)')
-
-        conn.close()
-    except Exception as e:
-        logger.warning(f'PostgreSQL failed: {str(e)}. Falling back to SQLite.')
+DB_PATH = os.getenv('SQLITE_DB_PATH', os.path.join(PROJECT_ROOT, 'data_cache.db'))
+
+# Backend selection and pool sizing
+DB_BACKEND = os.getenv('DB_BACKEND', 'auto').lower()  # auto | postgresql | sqlite
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '5'))
+# Seconds a PostgreSQL connect may take before auto mode falls back to SQLite
+DB_CONNECT_TIMEOUT = int(os.getenv('DB_CONNECT_TIMEOUT', '3'))
+# Seconds a SQLite statement waits for another connection's write lock before failing with "database is locked"
+SQLITE_BUSY_TIMEOUT = float(os.getenv('SQLITE_BUSY_TIMEOUT', '5'))
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection frees up within DB_POOL_TIMEOUT."""
+
+
+class ConnectionPool:
+    """Bounded pool of reusable DB-API connections for a single backend."""
+
+    def __init__(self, backend, factory, max_size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT):
+        self.backend = backend
+        self.max_size = max_size
+        self.timeout = timeout
+        self._factory = factory
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.discarded = 0
+        self.in_use = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.timeouts = 0
+
+    def add(self, conn):
+        """Hand an already-open connection (e.g. the init_db one) to the pool."""
+        with self._lock:
+            self.opened += 1
+        self._idle.put(conn)
+
+    def _acquire_slot(self):
+        if self._slots.acquire(blocking=False):
+            return
+        start = time.perf_counter()
+        acquired = self._slots.acquire(timeout=self.timeout)
+        waited = time.perf_counter() - start
+        with self._lock:
+            self.waits += 1
+            self.wait_time += waited
+            if not acquired:
+                self.timeouts += 1
+        if not acquired:
+            raise PoolTimeout(f'No {self.backend} connection available after {self.timeout}s')
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; commit on success, roll back (or discard if broken) on error."""
+        self._acquire_slot()
+        conn = None
         try:
-            import sqlite3
-            conn = sqlite3.connect(DB_PATH)
-            logger.debug(f'Connected to SQLite database at: {DB_PATH}')
-            c = conn.cursor()
-            c.execute('''
-                CREATE TABLE IF NOT EXISTS data_cache (
-                    id INTEGER PRIMARY KEY,
-                    url TEXT,
-                    content TEXT,
-                    timestamp DATETIME
-                )
-            ''')
-            conn.commit()
-            logger.info('SQLite database initialized with table data_cache')
-
-            c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='data_cache'")
-            if c.fetchone():
-                logger.debug('Table data_cache confirmed to exist (SQLite)')
-            else:
-                logger.error('Table data_cache not created (SQLite)')
-                raise Exception('Failed to create table data_cache (SQLite)')
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._factory()
+                with self._lock:
+                    self.opened += 1
+            with self._lock:
+                self.in_use += 1
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                try:
+                    conn.rollback()
+                except Exception:
+                    self._discard(conn)
+                    conn = None
+                raise
+            finally:
+                with self._lock:
+                    self.in_use -= 1
+            if conn is not None and getattr(conn, 'closed', 0):
+                self._discard(conn)
+                conn = None
+            if conn is not None:
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
 
+    def _discard(self, conn):
+        with self._lock:
+            self.discarded += 1
+        try:
             conn.close()
-        except Exception as e2:
-            logger.error(f'SQLite initialization failed: {str(e2)}')
-            raise
+        except Exception:
+            pass
+
+    def close(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': self.backend,
+                'max_size': self.max_size,
+                'size': self.opened - self.discarded,
+                'idle': self._idle.qsize(),
+                'in_use': self.in_use,
+                'waits': self.waits,
+                'wait_time_seconds': round(self.wait_time, 6),
+                'timeouts': self.timeouts,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_fallbacks = 0
+
+# One executor thread per pooled connection keeps async callers from oversubscribing the pool
+_executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix='db')
+
+
+def _connect_postgresql():
+    # Imported on first use so SQLite-only workers never load libpq
+    import psycopg2
+    return psycopg2.connect(
+        host=DB_HOST,
+        port=DB_PORT,
+        database=DB_NAME,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        connect_timeout=DB_CONNECT_TIMEOUT
+    )
+
+
+def _connect_sqlite():
+    # Connections move between worker threads but are only ever used by one at a time.
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, timeout=SQLITE_BUSY_TIMEOUT)
+    # WAL: chat reads never wait for a crawler write (and vice versa); only writers queue, up to busy_timeout.
+    # synchronous=NORMAL is durable in WAL mode except for the last commits on power loss (the cache is rebuildable).
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute('PRAGMA cache_size=-16000')
+    return conn
+
+
+# Generations of events kept; a server further behind than this clears its caches instead
+CACHE_EVENTS_KEEP = int(os.getenv('CACHE_EVENTS_KEEP', '1000'))
+
+
+def _init_postgresql():
+    conn = _connect_postgresql()
+    logger.debug(f'Connected to PostgreSQL database at {DB_HOST}:{DB_PORT}/{DB_NAME}')
+    migrations.migrate(conn, POSTGRESQL)
+    logger.info(f'PostgreSQL database initialized at schema version {migrations.schema_version(conn, POSTGRESQL)}')
+    _backfill_chunks(conn, POSTGRESQL)
+    return conn
+
+
+def _init_sqlite():
+    conn = _connect_sqlite()
+    logger.debug(f'Connected to SQLite database at: {DB_PATH}')
+    migrations.migrate(conn, SQLITE)
+    logger.info(f'SQLite database initialized at schema version {migrations.schema_version(conn, SQLITE)}')
+    _backfill_chunks(conn, SQLITE)
+    return conn
+
+
+def _backfill_chunks(conn, backend):
+    """Chunk pages cached before data_chunks existed (raw HTML rows from older monitoring runs)."""
+    c = conn.cursor()
+    c.execute('SELECT COUNT(*) FROM data_chunks')
+    if c.fetchone()[0]:
+        return
+    c.execute('SELECT url, content, timestamp FROM data_cache WHERE content IS NOT NULL')
+    rows = c.fetchall()
+    for url, content, fetched_at in rows:
+        if content.startswith('%PDF-'):
+            logger.warning(f'Skipping backfill of {url}: PDF stored as text, re-run monitoring.py')
+            continue
+        text = ingest.html_to_text(content) if content.lstrip()[:1] == '<' else content
+        _write_chunks(c, backend, url, text, fetched_at)
+    conn.commit()
+    if rows:
+        logger.info(f'Backfilled data_chunks from {len(rows)} cached pages')
+
+
+def _write_chunks(c, backend, url, text, fetched_at):
+    c.execute(_adapt('DELETE FROM data_chunks WHERE url = ?', backend), (url,))
+    chunks = ingest.chunk_text(text)
+    c.executemany(
+        _adapt('INSERT INTO data_chunks (url, chunk_index, char_offset, content, content_hash, fetched_at) '
+               'VALUES (?, ?, ?, ?, ?, ?)', backend),
+        [(url, i, offset, chunk, ingest.content_hash(chunk), fetched_at) for i, (offset, chunk) in enumerate(chunks)],
+    )
+    return len(chunks)
+
+
+def init_db(only_if_missing=False):
+    """Initialize PostgreSQL or SQLite database and build the connection pool for the chosen backend.
+
+    An existing pool is closed and rebuilt, unless only_if_missing, which keeps it (and returns its backend).
+    """
+    global _pool, _fallbacks
+    with _pool_lock:
+        if _pool is not None:
+            if only_if_missing:
+                return _pool.backend
+            _pool.close()
+            _pool = None
+
+        conn = None
+        backend = None
+        if DB_BACKEND in ('auto', POSTGRESQL):
+            try:
+                conn = _init_postgresql()
+                backend = POSTGRESQL
+            except Exception as e:
+                if DB_BACKEND == POSTGRESQL:
+                    logger.error(f'PostgreSQL failed: {str(e)}')
+                    raise
+                logger.warning(f'PostgreSQL failed: {str(e)}. Falling back to SQLite.')
+                _fallbacks += 1
+        if conn is None:
+            try:
+                conn = _init_sqlite()
+                backend = SQLITE
+            except Exception as e2:
+                logger.error(f'SQLite initialization failed: {str(e2)}')
+                raise
+
+        factory = _connect_postgresql if backend == POSTGRESQL else _connect_sqlite
+        _pool = ConnectionPool(backend, factory)
+        _pool.add(conn)
+        logger.info(f'Connection pool ready: backend={backend}, max_size={_pool.max_size}')
+        return backend
+
+
+def get_pool():
+    """Return the active connection pool, running init_db on first use."""
+    pool = _pool
+    if pool is None:
+        init_db(only_if_missing=True)
+        pool = _pool
+    return pool
+
+
+def close_db():
+    """Close every pooled connection (server shutdown); the next get_pool call re-initializes."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def get_backend():
+    return get_pool().backend
+
+
+def _adapt(sql, backend):
+    # Queries are written with sqlite '?' placeholders; psycopg2 expects '%s'.
+    return sql.replace('?', '%s') if backend == POSTGRESQL else sql
+
+
+def fetch_one(sql, params=()):
+    pool = get_pool()
+    with pool.connection() as conn:
+        c = conn.cursor()
+        c.execute(_adapt(sql, pool.backend), params)
+        return c.fetchone()
+
+
+def fetch_all(sql, params=()):
+    pool = get_pool()
+    with pool.connection() as conn:
+        c = conn.cursor()
+        c.execute(_adapt(sql, pool.backend), params)
+        return c.fetchall()
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _write_document(c, backend, url, text, fetched_at):
+    c.execute(
+        _adapt('''
+            INSERT INTO data_cache (url, content, content_hash, timestamp) VALUES (?, ?, ?, ?)
+            ON CONFLICT (url) DO UPDATE SET content = excluded.content, content_hash = excluded.content_hash,
+                timestamp = excluded.timestamp
+        ''', backend),
+        (url, text, ingest.content_hash(text), fetched_at),
+    )
+    return _write_chunks(c, backend, url, text, fetched_at)
+
+
+def _bump_generation(c, backend, urls):
+    """Advance the generation and log which urls changed under it, inside the caller's transaction."""
+    c.execute(_adapt('''
+        INSERT INTO cache_meta (key, value) VALUES ('generation', 1)
+        ON CONFLICT (key) DO UPDATE SET value = cache_meta.value + 1
+    ''', backend))
+    c.execute(GENERATION_QUERY)
+    generation = c.fetchone()[0]
+    changed_at = _now()
+    c.executemany(_adapt('INSERT INTO cache_events (generation, url, changed_at) VALUES (?, ?, ?)', backend),
+                  [(generation, url, changed_at) for url in urls])
+    c.execute(_adapt('DELETE FROM cache_events WHERE generation <= ?', backend), (generation - CACHE_EVENTS_KEEP,))
+
+
+def store_document(url, text, fetched_at=None):
+    """Replace the cached page and its chunks for url in one transaction; returns the chunk count.
+
+    Seeding helper for tests and benchmarks: monitoring.py writes crawls (with crawl_state) through store_crawl_results.
+    """
+    pool = get_pool()
+    with pool.connection() as conn:
+        c = conn.cursor()
+        chunks = _write_document(c, pool.backend, url, text, fetched_at or _now())
+        _bump_generation(c, pool.backend, [url])
+        return chunks
+
+
+GENERATION_QUERY = "SELECT value FROM cache_meta WHERE key = 'generation'"
+CHANGED_URLS_QUERY = 'SELECT DISTINCT url FROM cache_events WHERE generation > ?'
+OLDEST_EVENT_QUERY = 'SELECT MIN(generation) FROM cache_events'
+
+
+def get_cache_generation():
+    """Counter that changes whenever monitoring rewrites cached pages."""
+    row = fetch_one(GENERATION_QUERY)
+    return row[0] if row else 0
+
+
+async def get_cache_generation_async():
+    row = await fetch_one_async(GENERATION_QUERY)
+    return row[0] if row else 0
+
+
+def _changed_urls(since, generation, oldest, rows):
+    # Going backwards (fresh database) or a gap before the oldest logged event: the log cannot say what changed
+    if generation < since or oldest is None or oldest > since + 1:
+        return None
+    return [row[0] for row in rows]
+
+
+def get_cache_changes(since):
+    """(generation, urls changed after generation `since`); urls is None when only a full invalidation is safe."""
+    generation = get_cache_generation()
+    if since is None or generation == since:
+        return generation, []
+    oldest = fetch_one(OLDEST_EVENT_QUERY)[0]
+    return generation, _changed_urls(since, generation, oldest, fetch_all(CHANGED_URLS_QUERY, (since,)))
+
+
+async def get_cache_changes_async(since):
+    generation = await get_cache_generation_async()
+    if since is None or generation == since:
+        return generation, []
+    oldest = (await fetch_one_async(OLDEST_EVENT_QUERY))[0]
+    return generation, _changed_urls(since, generation, oldest, await fetch_all_async(CHANGED_URLS_QUERY, (since,)))
+
+
+def get_crawl_state():
+    """{url: (etag, last_modified, content_hash)} from the previous crawl."""
+    rows = fetch_all('SELECT url, etag, last_modified, content_hash FROM crawl_state')
+    return {url: (etag, last_modified, digest) for url, etag, last_modified, digest in rows}
+
+
+def store_crawl_results(results):
+    """Write one crawl in a single transaction.
+
+    results: dicts with url, etag, last_modified, content_hash and, for pages whose content changed, text.
+    Returns the number of documents rewritten.
+    """
+    checked_at = _now()
+    pool = get_pool()
+    changed = []
+    with pool.connection() as conn:
+        c = conn.cursor()
+        for result in results:
+            if result.get('text'):
+                _write_document(c, pool.backend, result['url'], result['text'], checked_at)
+                changed.append(result['url'])
+        c.executemany(
+            _adapt('''
+                INSERT INTO crawl_state (url, etag, last_modified, content_hash, checked_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (url) DO UPDATE SET etag = excluded.etag, last_modified = excluded.last_modified,
+                    content_hash = excluded.content_hash, checked_at = excluded.checked_at
+            ''', pool.backend),
+            [(r['url'], r.get('etag'), r.get('last_modified'), r.get('content_hash'), checked_at) for r in results],
+        )
+        if changed:
+            _bump_generation(c, pool.backend, changed)
+    return len(changed)
+
+
+async def fetch_one_async(sql, params=()):
+    """fetch_one without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, fetch_one, sql, params)
+
+
+async def fetch_all_async(sql, params=()):
+    """fetch_all without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, fetch_all, sql, params)
+
+
+def pool_stats():
+    """Pool size, wait-time and fallback counters for logging and monitoring."""
+    stats = _pool.stats() if _pool is not None else {'backend': None}
+    stats['fallbacks'] = _fallbacks
+    return stats
@@ -0,0 +1,444 @@
+# File Name: embeddings.py
+# Owner: Andrew John Holland
+# Purpose: Local semantic retrieval for the Cyberpunk Monk Chatbot: hashed word + character n-gram embeddings of data_chunks, built offline into a memory-mapped float32 matrix and searched with batched cosine similarity, optionally fused with the FTS keyword ranking.
+# Version: v1.2
+# Last Updated: 2026-10-18
+# Change Log:
+# 1. v1.2 - generation property (the cache_events generation the mapped index was written at), so readers can tell a stale index
+# 2. v1.1 - Writers (build/update, incl. a worker building a missing index at startup) take an exclusive file lock and re-check index.json, so concurrent workers build once; only files index.json no longer references are deleted; numpy imported by the first EmbeddingIndex instead of at module import (fts-only workers never load it)
+# 3. v1.0 - Initial creation: HashingVectorizer, EmbeddingIndex (build/incremental update from cache_events, memmap load, batched top-k), hybrid rank fusion; numpy optional
+#
+# Usage (from project root): python backend/embeddings.py [--rebuild]
+# Writers: this script and monitoring.py after each refresh that stored pages (also when run by scheduler.py). Chat workers only map the files and reload when they change.
+
+import array
+import asyncio
+import json
+import logging
+import math
+import mmap
+import os
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+from contextlib import contextmanager
+
+# Run from backend/ as a script; make the backend package importable for shared modules
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from backend.database import fetch_all, fetch_all_async, get_cache_changes
+from backend.retrieval import CONTEXT_CHUNKS, STOPWORDS, TOKEN_RE, search_cache, search_cache_async
+
+try:
+    import fcntl
+except ImportError:  # not on Windows: writers there are serialized per process only
+    fcntl = None
+
+_NOT_LOADED = object()
+# numpy, imported by the first EmbeddingIndex so fts-only workers never pay for it; None when not installed
+# (optional: pure-Python scoring over the mapped file is fine for a few thousand chunks)
+np = _NOT_LOADED
+
+logger = logging.getLogger(__name__)
+
+# fts (keyword only, the default) | vector | hybrid (vector and keyword rankings fused)
+RETRIEVAL_MODE = os.getenv('RETRIEVAL_MODE', 'fts')
+EMBEDDING_DIM = int(os.getenv('EMBEDDING_DIM', '2048'))
+EMBEDDING_INDEX_DIR = os.getenv('EMBEDDING_INDEX_DIR', os.path.join(PROJECT_ROOT, 'embeddings'))
+# Share of the fused score given to the vector ranking in hybrid mode
+EMBEDDING_HYBRID_WEIGHT = float(os.getenv('EMBEDDING_HYBRID_WEIGHT', '0.5'))
+
+NGRAM = 3
+# Character n-grams carry most of the signal (they let "deployed"/"deployment" and misspelled names meet);
+# whole words add a smaller bonus for exact matches
+WORD_WEIGHT = 0.3
+# Document frequencies are kept per feature hash in a table this large (float32 IDF, 1 MB), independent of
+# EMBEDDING_DIM, so rare n-grams outweigh common ones before they are folded into the dense vector
+IDF_BUCKETS = 1 << 18
+# Reciprocal rank fusion constant: damps the gap between the first few ranks
+RRF_K = 60
+# Chunks embedded per batch while building
+BUILD_BATCH = 512
+INDEX_FILE = 'index.json'
+LOCK_FILE = 'index.lock'
+
+
+def load_numpy():
+    """Import numpy on first use; returns the module, or None when it is not installed."""
+    global np
+    if np is _NOT_LOADED:
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            np = None
+    return np
+
+
+class HashingVectorizer:
+    """Text to a fixed-size vector without a vocabulary: each word and character n-gram is hashed to a signed
+    bucket, weighted by sublinear term frequency and (when given) IDF. Deterministic across processes (crc32, not
+    the salted hash())."""
+
+    def __init__(self, dim=EMBEDDING_DIM, ngram=NGRAM, word_weight=WORD_WEIGHT):
+        self.dim = dim
+        self.ngram = ngram
+        self.word_weight = word_weight
+
+    def config(self):
+        return {'dim': self.dim, 'ngram': self.ngram, 'word_weight': self.word_weight, 'idf_buckets': IDF_BUCKETS}
+
+    def hashed(self, text):
+        """[(feature hash, term weight)] for the searchable words of text."""
+        counts = Counter()
+        for token in TOKEN_RE.findall((text or '').lower()):
+            if token in STOPWORDS:
+                continue
+            counts['w:' + token] += 1
+            padded = f'<{token}>'
+            for i in range(len(padded) - self.ngram + 1):
+                counts['c:' + padded[i:i + self.ngram]] += 1
+        return [(zlib.crc32(feature.encode('utf-8')),
+                 (1 + math.log(count)) * (self.word_weight if feature[0] == 'w' else 1.0))
+                for feature, count in counts.items()]
+
+    def features(self, text, idf=None):
+        """{bucket: weight}, L2-normalized; empty when the text has no searchable words."""
+        return self.fold(self.hashed(text), idf)
+
+    def fold(self, hashed, idf=None):
+        """Signed, IDF-weighted hashed features summed into EMBEDDING_DIM buckets and L2-normalized."""
+        vector = {}
+        for digest, weight in hashed:
+            if idf is not None:
+                weight *= idf[digest % IDF_BUCKETS]
+            bucket = digest % self.dim
+            vector[bucket] = vector.get(bucket, 0.0) + (weight if digest & 0x80000000 else -weight)
+        norm = math.sqrt(sum(w * w for w in vector.values()))
+        return {bucket: w / norm for bucket, w in vector.items() if w} if norm else {}
+
+    @staticmethod
+    def idf_table(corpus):
+        """Smoothed IDF per feature hash bucket over a corpus of hashed() outputs (float32, IDF_BUCKETS long)."""
+        df = array.array('i', bytes(4 * IDF_BUCKETS))
+        count = 0
+        for hashed in corpus:
+            count += 1
+            for digest in {digest % IDF_BUCKETS for digest, _ in hashed}:
+                df[digest] += 1
+        if np is not None:
+            return (np.log((1 + count) / (1 + np.asarray(df, dtype=np.float32))) + 1).astype(np.float32)
+        return array.array('f', (math.log((1 + count) / (1 + n)) + 1 for n in df))
+
+
+class _Loaded:
+    """One immutable view of the index files; searches hold a reference while a reload swaps in the next."""
+
+    def __init__(self, meta, matrix, idf, mtime):
+        self.meta = meta
+        self.matrix = matrix  # numpy memmap (rows x dim) or a flat float memoryview over an mmap
+        self.idf = idf
+        self.mtime = mtime
+        self.ids = meta['ids']
+
+
+class EmbeddingIndex:
+    """Chunk embeddings on disk (vectors-*.f32, idf-*.f32 and index.json) and top-k search over them."""
+
+    def __init__(self, directory=EMBEDDING_INDEX_DIR, vectorizer=None):
+        self.directory = directory
+        self.vectorizer = vectorizer or HashingVectorizer()
+        load_numpy()
+        self._loaded = None
+        self._lock = threading.Lock()
+        self.searches = 0
+        self.reloads = 0
+        self.embedded = 0
+
+    @property
+    def ready(self):
+        return self._loaded is not None
+
+    @property
+    def generation(self):
+        """cache_events generation the mapped index was written at (None when nothing is mapped)."""
+        loaded = self._loaded
+        return loaded.meta['generation'] if loaded is not None else None
+
+    @property
+    def meta_path(self):
+        return os.path.join(self.directory, INDEX_FILE)
+
+    # ---- Writing (offline script / refresh scheduler) ----
+
+    @contextmanager
+    def _writing(self):
+        """Exclusive across threads and (where fcntl exists) processes: one writer at a time per directory."""
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, LOCK_FILE), 'a') as lock:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _read_meta(self):
+        try:
+            with open(self.meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if meta.get('vectorizer') == self.vectorizer.config() else None
+
+    def _embed(self, hashed_rows, idf):
+        """Row-major float32 vectors for hashed() outputs."""
+        dim = self.vectorizer.dim
+        # Per-feature lookups into a plain list are several times faster than numpy scalar indexing
+        idf = idf.tolist()
+        if np is not None:
+            matrix = np.zeros((len(hashed_rows), dim), dtype=np.float32)
+            for i, hashed in enumerate(hashed_rows):
+                vector = self.vectorizer.fold(hashed, idf)
+                matrix[i, list(vector)] = list(vector.values())
+            return matrix
+        matrix = array.array('f', bytes(4 * dim * len(hashed_rows)))
+        for i, hashed in enumerate(hashed_rows):
+            for bucket, weight in self.vectorizer.fold(hashed, idf).items():
+                matrix[i * dim + bucket] = weight
+        return matrix
+
+    def _write(self, generation, ids, urls, blocks, idf_name):
+        """Write the vector blocks as one file, then point index.json at it (atomic for readers). Call under _writing."""
+        name = f'vectors-{generation}-{os.getpid()}-{time.time_ns()}.f32'
+        with open(os.path.join(self.directory, name), 'wb') as f:
+            for block in blocks:
+                (block.astype('<f4') if np is not None else block).tofile(f)
+        meta = {'vectorizer': self.vectorizer.config(), 'generation': generation, 'vectors': name, 'idf': idf_name,
+                'ids': ids, 'urls': urls}
+        tmp = self.meta_path + f'.{os.getpid()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp, self.meta_path)
+        # Readers that mapped an older file keep it until they reload (unlinked files stay readable)
+        current = self._read_meta() or meta
+        for old in os.listdir(self.directory):
+            if old.startswith(('vectors-', 'idf-')) and old not in (current['vectors'], current['idf']):
+                try:
+                    os.remove(os.path.join(self.directory, old))
+                except FileNotFoundError:
+                    pass
+        return len(ids)
+
+    def build(self):
+        """Embed every cached chunk, with IDF recomputed over them; returns the row count."""
+        with self._writing():
+            return self._build()
+
+    def _build(self):
+        generation, _ = get_cache_changes(None)
+        rows = fetch_all('SELECT id, url, content FROM data_chunks ORDER BY id')
+        hashed = [self.vectorizer.hashed(content) for _, _, content in rows]
+        idf = self.vectorizer.idf_table(hashed)
+        idf_name = f'idf-{generation}-{os.getpid()}-{time.time_ns()}.f32'
+        with open(os.path.join(self.directory, idf_name), 'wb') as f:
+            idf.tofile(f)
+        blocks = [self._embed(hashed[i:i + BUILD_BATCH], idf) for i in range(0, len(rows), BUILD_BATCH)]
+        self.embedded += len(rows)
+        count = self._write(generation, [r[0] for r in rows], [r[1] for r in rows], blocks, idf_name)
+        logger.info(f"Embedding index built: {count} chunks, dim {self.vectorizer.dim}, generation {generation}")
+        return count
+
+    def _complete_meta(self):
+        meta = self._read_meta()
+        if meta is None or not all(os.path.exists(os.path.join(self.directory, meta[key])) for key in ('vectors', 'idf')):
+            return None
+        return meta
+
+    def update(self):
+        """Re-embed only the pages changed since the index was written (cache_events); rebuild when unknown.
+
+        IDF stays as of the last build (new pages shift it little); returns the number of chunks embedded.
+        """
+        with self._writing():
+            meta = self._complete_meta()
+            if meta is None:
+                return self._build()
+            generation, changed = get_cache_changes(meta['generation'])
+            if changed is None:
+                return self._build()
+            if generation == meta['generation']:
+                return 0
+            changed = set(changed)
+            keep = [i for i, url in enumerate(meta['urls']) if url not in changed]
+            marks = ','.join('?' * len(changed))
+            rows = fetch_all(f'SELECT id, url, content FROM data_chunks WHERE url IN ({marks}) ORDER BY id',
+                             tuple(changed)) if changed else []
+            old, idf = self._map(meta)
+            dim = self.vectorizer.dim
+            if np is not None:
+                kept = old[keep] if keep else np.zeros((0, dim), dtype=np.float32)
+            else:
+                kept = array.array('f')
+                for i in keep:
+                    kept.extend(old[i * dim:(i + 1) * dim])
+            ids = [meta['ids'][i] for i in keep] + [r[0] for r in rows]
+            urls = [meta['urls'][i] for i in keep] + [r[1] for r in rows]
+            self.embedded += len(rows)
+            self._write(generation, ids, urls, [kept, self._embed([self.vectorizer.hashed(r[2]) for r in rows], idf)], meta['idf'])
+        logger.info(f"Embedding index updated to generation {generation}: {len(rows)} chunks re-embedded "
+                    f"for {len(changed)} changed pages, {len(keep)} kept")
+        return len(rows)
+
+    # ---- Reading (chat workers) ----
+
+    def _map(self, meta):
+        """(vectors, idf) mapped read-only: numpy memmaps, or flat float memoryviews without numpy."""
+        dim = meta['vectorizer']['dim']
+        shape = (len(meta['ids']), dim)
+        mapped = []
+        for key, key_shape in (('vectors', shape), ('idf', (IDF_BUCKETS,))):
+            path = os.path.join(self.directory, meta[key])
+            if key_shape[0] == 0:
+                mapped.append(np.zeros(key_shape, dtype=np.float32) if np is not None else memoryview(b'').cast('f'))
+            elif np is not None:
+                mapped.append(np.memmap(path, dtype='<f4', mode='r', shape=key_shape))
+            else:
+                with open(path, 'rb') as f:
+                    mapped.append(memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)).cast('f'))
+        return tuple(mapped)
+
+    def load(self, build_missing=True):
+        """Map the index files (building them first when missing); safe to run in a worker thread."""
+        meta = self._read_meta()
+        if meta is None and build_missing:
+            # Workers starting together queue on the lock; the first builds, the rest find its index.json
+            with self._writing():
+                if self._complete_meta() is None:
+                    self._build()
+            meta = self._read_meta()
+        if meta is None:
+            logger.warning(f"No embedding index in {self.directory}; keyword retrieval only")
+            return self
+        self._loaded = _Loaded(meta, *self._map(meta), os.path.getmtime(self.meta_path))
+        logger.info(f"Embedding index loaded: {len(meta['ids'])} chunks, generation {meta['generation']}")
+        return self
+
+    def reload_if_changed(self):
+        """Pick up a newer index written by another process; cheap (one stat) when nothing changed."""
+        try:
+            mtime = os.path.getmtime(self.meta_path)
+        except OSError:
+            return False
+        if self._loaded is not None and mtime == self._loaded.mtime:
+            return False
+        self.load(build_missing=False)
+        self.reloads += 1
+        return True
+
+    def search_ids(self, queries, limit):
+        """[(chunk id, cosine score), ...] best first, per query; one matrix product for the whole batch."""
+        loaded = self._loaded
+        if loaded is None or not loaded.ids:
+            return [[] for _ in queries]
+        self.searches += len(queries)
+        vectors = [self.vectorizer.features(query, loaded.idf) for query in queries]
+        if np is not None:
+            weights = np.zeros((len(queries), loaded.matrix.shape[1]), dtype=np.float32)
+            for i, vector in enumerate(vectors):
+                for bucket, weight in vector.items():
+                    weights[i, bucket] = weight
+            scores = loaded.matrix @ weights.T  # rows x queries
+            results = []
+            for j in range(len(queries)):
+                column = scores[:, j]
+                top = np.argpartition(-column, limit - 1)[:limit] if len(column) > limit else np.arange(len(column))
+                top = top[np.argsort(-column[top], kind='stable')]
+                results.append([(loaded.ids[i], float(column[i])) for i in top if column[i] > 0])
+            return results
+        return [self._scan(loaded, vector, limit) for vector in vectors]
+
+    def _scan(self, loaded, vector, limit):
+        dim = loaded.meta['vectorizer']['dim']
+        items = list(vector.items())
+        matrix = loaded.matrix
+        scored = []
+        for row in range(len(loaded.ids)):
+            base = row * dim
+            score = sum(matrix[base + bucket] * w for bucket, w in items)
+            if score > 0:
+                scored.append((score, row))
+        scored.sort(reverse=True)
+        return [(loaded.ids[row], score) for score, row in scored[:limit]]
+
+    @staticmethod
+    def _chunk_query(ranked):
+        marks = ','.join('?' * len(ranked))
+        return f'SELECT id, url, content FROM data_chunks WHERE id IN ({marks})', tuple(i for i, _ in ranked)
+
+    @staticmethod
+    def _rows(ranked, found):
+        """(url, content, score) in rank order; chunks rewritten since the index was built are skipped."""
+        by_id = {row[0]: row for row in found}
+        return [(by_id[i][1], by_id[i][2], score) for i, score in ranked if i in by_id]
+
+    def search(self, query, limit=CONTEXT_CHUNKS, mode=None):
+        """Best chunks as (url, content, score) rows, like retrieval.search_cache."""
+        ranked = self.search_ids([query], limit * 2)[0]
+        rows = self._rows(ranked, fetch_all(*self._chunk_query(ranked))) if ranked else []
+        if (mode or RETRIEVAL_MODE) == 'hybrid':
+            rows = fuse(rows, search_cache(query, limit * 2), limit)
+        return rows[:limit]
+
+    async def search_async(self, query, limit=CONTEXT_CHUNKS, mode=None):
+        """search without blocking the event loop (scoring in a thread, chunk reads on the DB executor)."""
+        ranked = (await asyncio.to_thread(self.search_ids, [query], limit * 2))[0]
+        rows = self._rows(ranked, await fetch_all_async(*self._chunk_query(ranked))) if ranked else []
+        if (mode or RETRIEVAL_MODE) == 'hybrid':
+            rows = fuse(rows, await search_cache_async(query, limit * 2), limit)
+        return rows[:limit]
+
+    def stats(self):
+        loaded = self._loaded
+        return {
+            'ready': loaded is not None,
+            'chunks': len(loaded.ids) if loaded else 0,
+            'generation': loaded.meta['generation'] if loaded else None,
+            'dim': self.vectorizer.dim,
+            'numpy': np is not None,
+            'searches': self.searches,
+            'reloads': self.reloads,
+            'embedded': self.embedded,
+        }
+
+
+def fuse(vector_rows, keyword_rows, limit, weight=EMBEDDING_HYBRID_WEIGHT):
+    """Weighted reciprocal rank fusion of two best-first (url, content, score) lists; scores are not comparable
+    across the two (cosine vs BM25), ranks are."""
+    scores, rows = {}, {}
+    for share, ranked in ((weight, vector_rows), (1 - weight, keyword_rows)):
+        for rank, row in enumerate(ranked):
+            key = (row[0], row[1])
+            rows.setdefault(key, row)
+            scores[key] = scores.get(key, 0.0) + share / (RRF_K + rank + 1)
+    best = sorted(scores, key=scores.get, reverse=True)[:limit]
+    return [(url, content, round(scores[(url, content)], 6)) for url, content in best]
+
+
+if __name__ == "__main__":
+    from backend.database import init_db
+    from backend.logging_setup import configure_logging
+
+    configure_logging()
+    init_db()
+    index = EmbeddingIndex()
+    if '--rebuild' in sys.argv[1:]:
+        index.build()
+    else:
+        index.update()
@@ -0,0 +1,125 @@
+# File Name: ingest.py
+# Owner: Andrew John Holland
+# Purpose: Ingestion stage for monitored pages: strips HTML markup, extracts PDF text and splits documents into bounded, hashed chunks for retrieval.
+# Version: v1.1
+# Last Updated: 2026-10-18
+# Change Log:
+# 1. v1.1 - pypdf listed in requirements.txt (monitored PDFs were always extracted as '' and refetched every crawl)
+# 2. v1.0 - Initial creation: html_to_text, optional pypdf extraction, boundary-aware chunk_text
+
+import hashlib
+import io
+import logging
+import os
+import re
+from html.parser import HTMLParser
+
+logger = logging.getLogger(__name__)
+
+CHUNK_CHARS = int(os.getenv('CHUNK_CHARS', '1200'))
+CHUNK_OVERLAP = int(os.getenv('CHUNK_OVERLAP', '150'))
+
+# PDF extraction needs pypdf (requirements.txt); a bare install without it skips PDFs with a warning
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+_SKIP_TAGS = {'script', 'style', 'noscript', 'svg', 'template', 'iframe'}
+_BLOCK_TAGS = {
+    'address', 'article', 'aside', 'blockquote', 'br', 'dd', 'div', 'dl', 'dt', 'figcaption', 'footer',
+    'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'li', 'main', 'nav', 'ol', 'p', 'pre',
+    'section', 'table', 'td', 'th', 'title', 'tr', 'ul',
+}
+
+
+class _TextExtractor(HTMLParser):
+    """Collects visible text, turning block-level tags into line breaks."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in _BLOCK_TAGS:
+            self.parts.append('\n')
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in _BLOCK_TAGS:
+            self.parts.append('\n')
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.parts.append(data)
+
+
+def normalize_whitespace(text):
+    text = re.sub(r'[ \t\r\f\v\u00a0]+', ' ', text)
+    text = re.sub(r' *\n *', '\n', text)
+    return re.sub(r'\n{3,}', '\n\n', text).strip()
+
+
+def html_to_text(html):
+    """Visible text of an HTML page with markup, scripts and styles removed."""
+    parser = _TextExtractor()
+    parser.feed(html)
+    parser.close()
+    return normalize_whitespace(''.join(parser.parts))
+
+
+def pdf_to_text(data):
+    """Text of a PDF document, or '' when pypdf is not installed or the file cannot be read."""
+    if PdfReader is None:
+        logger.warning('pypdf not installed; skipping PDF text extraction')
+        return ''
+    try:
+        reader = PdfReader(io.BytesIO(data))
+        return normalize_whitespace('\n\n'.join(page.extract_text() or '' for page in reader.pages))
+    except Exception as e:
+        logger.error(f'PDF text extraction failed: {str(e)}')
+        return ''
+
+
+def extract_text(url, content_type, body, encoding='utf-8'):
+    """Clean text for a fetched document based on its content type (raw bytes in, text out)."""
+    content_type = (content_type or '').lower()
+    if 'pdf' in content_type or url.lower().endswith('.pdf') or body[:5] == b'%PDF-':
+        return pdf_to_text(body)
+    text = body.decode(encoding or 'utf-8', errors='replace')
+    if 'html' in content_type or 'xml' in content_type or text.lstrip()[:1] == '<':
+        return html_to_text(text)
+    return normalize_whitespace(text)
+
+
+def chunk_text(text, size=CHUNK_CHARS, overlap=CHUNK_OVERLAP):
+    """Split text into (offset, chunk) pairs of at most `size` chars, breaking at paragraph, line, sentence or word boundaries."""
+    chunks = []
+    start, length = 0, len(text)
+    while start < length:
+        end = min(start + size, length)
+        if end < length:
+            for sep in ('\n\n', '\n', '. ', ' '):
+                cut = text.rfind(sep, start + size // 2, end)
+                if cut != -1:
+                    end = cut + len(sep)
+                    break
+        raw = text[start:end]
+        piece = raw.strip()
+        if piece:
+            chunks.append((start + len(raw) - len(raw.lstrip()), piece))
+        if end >= length:
+            break
+        # Step back for overlap, then forward to the next word so chunks do not start mid-word
+        next_start = max(end - overlap, start + 1)
+        space = text.find(' ', next_start, end)
+        start = space + 1 if space != -1 else next_start
+    return chunks
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
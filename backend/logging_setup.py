@@ -0,0 +1,107 @@
+# File Name: logging_setup.py
+# Owner: Andrew John Holland
+# Purpose: One logging setup for every backend entry point: records are queued on the calling thread and written to the log files by a background listener, so disk I/O stays off the request path.
+# Version: v1.1
+# Last Updated: 2026-10-18
+# Change Log:
+# 1. v1.1 - Files reopened after logrotate moves them (LOG_ROTATION=external, the default) instead of rotated in-process: gunicorn workers, monitoring.py and scheduler.py all append to the same files, and RotatingFileHandler cannot rotate across processes; LOG_ROTATION=size keeps in-process rotation for a single process
+# 2. v1.0 - Initial creation: QueueHandler + QueueListener, rotating execution.log, ERROR-only error.log, optional JSON lines (LOG_FORMAT=json)
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+LOG_DIR = os.getenv('LOG_DIR', os.path.join(PROJECT_ROOT, 'logs'))
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+# 'text' keeps the historical line format; 'json' writes one JSON object per line
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()
+LOG_CONSOLE = os.getenv('LOG_CONSOLE', '1') != '0'
+# external (default): append, and reopen a file once logrotate (config/logrotate.conf template, installed in /etc/logrotate.d/) has
+# moved it; safe with several processes writing logs/. size: rotate at LOG_MAX_BYTES in this process, only when it is
+# the one process writing logs/ (RotatingFileHandlers in separate processes rename files from under each other)
+LOG_ROTATION = os.getenv('LOG_ROTATION', 'external').lower()
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+LOG_BACKUPS = int(os.getenv('LOG_BACKUPS', '5'))
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+_listener = None
+_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message (with any traceback folded in)."""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def _formatter(fmt):
+    return JsonFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT)
+
+
+def _file_handler(path, rotation):
+    if rotation == 'size':
+        return logging.handlers.RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS,
+                                                    encoding='utf-8')
+    return logging.handlers.WatchedFileHandler(path, encoding='utf-8')
+
+
+def build_handlers(log_dir=LOG_DIR, fmt=LOG_FORMAT, console=LOG_CONSOLE, rotation=LOG_ROTATION):
+    """Destination handlers run by the listener: every record to execution.log, ERROR and above also to error.log."""
+    os.makedirs(log_dir, exist_ok=True)
+    execution = _file_handler(os.path.join(log_dir, 'execution.log'), rotation)
+    errors = _file_handler(os.path.join(log_dir, 'error.log'), rotation)
+    errors.setLevel(logging.ERROR)
+    handlers = [execution, errors]
+    if console:
+        handlers.append(logging.StreamHandler())
+    formatter = _formatter(fmt)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+def configure_logging(level=None, log_dir=None, fmt=None, console=None):
+    """Route the root logger through a queue to a background listener. Safe to call from every module; only the first call wins."""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return _listener
+        handlers = build_handlers(log_dir or LOG_DIR, fmt or LOG_FORMAT, LOG_CONSOLE if console is None else console)
+        records = queue.SimpleQueue()
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+            handler.close()
+        root.addHandler(logging.handlers.QueueHandler(records))
+        root.setLevel(level or LOG_LEVEL)
+        _listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+        return _listener
+
+
+def shutdown_logging():
+    """Flush queued records and close the files (runs at exit)."""
+    global _listener
+    with _lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
@@ -0,0 +1,223 @@
+# File Name: metrics.py
+# Owner: Andrew John Holland
+# Purpose: Lightweight in-process metrics for the Cyberpunk Monk backends (per-stage timing spans, latency histograms, in-flight gauges, reply counters) rendered in Prometheus text format for /metrics.
+# Version: v1.3
+# Last Updated: 2026-10-18
+# Change Log:
+# 1. v1.3 - Spans also add to the current request's stage timings (track_request's 'stages'), for the Server-Timing header
+# 2. v1.2 - Chat requests and replies count admission rejections (outcome and source 'rejected')
+# 3. v1.1 - Added monk_context_total (prompt context retrieved vs reused from the conversation session)
+# 4. v1.0 - Initial creation: Counter, Gauge, Histogram, span/track_request helpers, stats collectors, Prometheus text exposition
+
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; spans DB lookups (ms) through Gemini round-trips (s)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    pairs.extend(f'{n}="{_escape(v)}"' for n, v in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(labels[n] for n in self.labelnames)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f'{self.name}{_labels(self.labelnames, key)} {_number(value)}' for key, value in items]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # Per-bucket (non-cumulative) counts, then sum; cumulated only when rendered
+                series = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, **labels):
+        series = self._values.get(self._key(labels))
+        return sum(series[:-1]) if series else 0
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._values.items())
+        lines = []
+        for key, series in items:
+            running = 0
+            for bound, hits in zip(self.buckets + (float('inf'),), series):
+                running += hits
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, key, [("le", _number(bound))])} {running}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, key)} {_number(series[-1])}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, key)} {running}')
+        return lines
+
+
+REGISTRY = []
+_collectors = {}
+
+REQUEST_SECONDS = Histogram('monk_request_seconds', 'Chat request latency in seconds.', ('endpoint',))
+REQUESTS = Counter('monk_requests_total', 'Chat requests by endpoint and outcome (ok, error or rejected).', ('endpoint', 'outcome'))
+IN_FLIGHT = Gauge('monk_requests_in_flight', 'Chat requests currently being served.', ('endpoint',))
+STAGE_SECONDS = Histogram(
+    'monk_stage_seconds',
+    'Time spent per request stage (retrieval, cache_lookup, prompt_build, model_call, model_first_chunk, serialization).',
+    ('stage',),
+)
+REPLIES = Counter(
+    'monk_replies_total',
+    'Replies by source: model, cache, the busy/empty fallbacks, or rejected by admission control.',
+    ('source',),
+)
+CONTEXT = Counter(
+    'monk_context_total',
+    'Prompt context by source: a fresh retrieval, or the conversation session\'s previous context.',
+    ('source',),
+)
+
+
+# Stage seconds of the request being served ({stage: seconds}); None outside track_request
+_request_stages = contextvars.ContextVar('monk_request_stages', default=None)
+
+
+@contextmanager
+def span(stage):
+    """Time one request stage into monk_stage_seconds (and the current request's stage timings)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        stages = _request_stages.get()
+        if stages is not None:
+            stages[stage] = stages.get(stage, 0.0) + elapsed
+
+
+def server_timing(stages, source=None):
+    """Server-Timing header value: each stage's duration in ms, then the reply source as a description."""
+    parts = [f'{stage};dur={seconds * 1000:.3f}' for stage, seconds in stages.items()]
+    if source:
+        parts.append(f'reply;desc="{source}"')
+    return ', '.join(parts)
+
+
+@contextmanager
+def track_request(endpoint):
+    """In-flight gauge, latency histogram and ok/error count for one request.
+
+    Yields a dict; handlers that turn exceptions into error responses set its 'outcome' to 'error'. Its 'stages'
+    collects the seconds of each span run while serving the request.
+    """
+    IN_FLIGHT.inc(endpoint=endpoint)
+    start = time.perf_counter()
+    request = {'outcome': 'ok', 'stages': {}}
+    token = _request_stages.set(request['stages'])
+    try:
+        yield request
+    except BaseException:
+        request['outcome'] = 'error'
+        raise
+    finally:
+        _request_stages.reset(token)
+        IN_FLIGHT.dec(endpoint=endpoint)
+        REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+        REQUESTS.inc(endpoint=endpoint, outcome=request['outcome'])
+
+
+def register_stats(prefix, stats_fn, counters=()):
+    """Expose a component's stats() dict at scrape time: numeric fields become `<prefix>_<field>` samples.
+
+    Fields named in counters are typed as counters (and get a _total suffix); the rest are gauges.
+    """
+    _collectors[prefix] = (stats_fn, frozenset(counters))
+
+
+def _collect(prefix, stats_fn, counters):
+    lines = []
+    for field, value in stats_fn().items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        kind = 'counter' if field in counters else 'gauge'
+        name = f'{prefix}_{field}_total' if kind == 'counter' else f'{prefix}_{field}'
+        lines += [f'# TYPE {name} {kind}', f'{name} {_number(value)}']
+    return lines
+
+
+def render():
+    """All metrics in Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.header() + metric.samples()
+    for prefix, (stats_fn, counters) in list(_collectors.items()):
+        try:
+            lines += _collect(prefix, stats_fn, counters)
+        except Exception as e:
+            lines.append(f'# {prefix} unavailable: {_escape(e)}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,263 @@
+"""
+File: backend/migrations.py
+Owner: Andrew John Holland
+Purpose: Versioned schema for the Cyberpunk Monk Chatbot cache (PostgreSQL and SQLite): ordered migrations recorded in schema_version, applied once by init_db under a lock so concurrent workers never race
+Version: 1.2
+Change Log:
+v1.2 - Migration 3: full-text search over data_chunks (PostgreSQL tsvector column + GIN index, SQLite FTS5 table + triggers), moved out of database.py's per-start DDL; a migration whose feature the server lacks is left unrecorded and retried at the next start
+v1.1 - migrate takes the lock before creating schema_version (workers starting on a fresh PostgreSQL database raced on CREATE TABLE IF NOT EXISTS); schema_version() only reads
+v1.0 - Initial creation: baseline (tables as of database.py v3.5), data_cache keyed by url with content_hash and a timestamp index (rebuilt from either legacy layout)
+"""
+
+import logging
+from collections import namedtuple
+from datetime import datetime, timezone
+from . import ingest
+
+logger = logging.getLogger(__name__)
+
+POSTGRESQL = 'postgresql'
+SQLITE = 'sqlite'
+
+# Any constant works; it only has to be the same in every worker
+MIGRATION_LOCK_ID = 4242021
+
+SCHEMA_VERSION_TABLE = '''
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TEXT NOT NULL
+    )
+'''
+
+# Conditional-request validators and last content hash per monitored URL (same DDL on both backends)
+CRAWL_STATE_TABLE = '''
+    CREATE TABLE IF NOT EXISTS crawl_state (
+        url TEXT PRIMARY KEY,
+        etag TEXT,
+        last_modified TEXT,
+        content_hash TEXT,
+        checked_at TEXT
+    )
+'''
+
+# Small counters shared between processes; 'generation' increments whenever cached pages change
+CACHE_META_TABLE = '''
+    CREATE TABLE IF NOT EXISTS cache_meta (
+        key TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    )
+'''
+
+# Invalidation log: which urls changed at which generation (servers poll it to drop only affected replies)
+CACHE_EVENTS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS cache_events (
+        generation INTEGER NOT NULL,
+        url TEXT NOT NULL,
+        changed_at TEXT
+    )
+'''
+
+# Backend-specific column types
+_TYPES = {
+    POSTGRESQL: {'id': 'SERIAL PRIMARY KEY', 'timestamp': 'TIMESTAMP'},
+    SQLITE: {'id': 'INTEGER PRIMARY KEY', 'timestamp': 'DATETIME'},
+}
+
+Migration = namedtuple('Migration', 'version name apply')
+
+
+def _baseline(c, backend):
+    """Tables as database.py created them up to v3.5 (a no-op on databases that already have them)."""
+    types = _TYPES[backend]
+    c.execute(f'''
+        CREATE TABLE IF NOT EXISTS data_cache (
+            id {types['id']},
+            url TEXT,
+            content TEXT,
+            timestamp {types['timestamp']}
+        )
+    ''')
+    c.execute(f'''
+        CREATE TABLE IF NOT EXISTS data_chunks (
+            id {types['id']},
+            url TEXT NOT NULL,
+            chunk_index INTEGER NOT NULL,
+            char_offset INTEGER NOT NULL,
+            content TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            fetched_at {types['timestamp']}
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS data_chunks_url_idx ON data_chunks (url)')
+    c.execute(CRAWL_STATE_TABLE)
+    c.execute(CACHE_META_TABLE)
+    c.execute(CACHE_EVENTS_TABLE)
+    c.execute('CREATE INDEX IF NOT EXISTS cache_events_generation_idx ON cache_events (generation)')
+
+
+def _columns(c, backend, table):
+    if backend == POSTGRESQL:
+        c.execute('SELECT column_name FROM information_schema.columns WHERE table_name = %s', (table,))
+        return {row[0] for row in c.fetchall()}
+    c.execute(f'PRAGMA table_info({table})')
+    return {row[1] for row in c.fetchall()}
+
+
+def _data_cache_by_url(c, backend):
+    """One row per url (unique), content_hash, and an index for newest-first reads.
+
+    Older databases hold either database.py's (id, url, content, timestamp), possibly with several rows per url,
+    or the (url PRIMARY KEY, content) table the early monitoring.py created, with no timestamp. Both are copied
+    into the new layout keeping the newest row per url.
+    """
+    columns = _columns(c, backend, 'data_cache')
+    timestamp = 'timestamp' if 'timestamp' in columns else 'NULL'
+    order = ' ORDER BY id' if 'id' in columns else ''
+    c.execute(f'SELECT url, content, {timestamp} FROM data_cache WHERE url IS NOT NULL{order}')
+    latest = {}
+    for url, content, fetched_at in c.fetchall():
+        previous = latest.get(url)
+        # Later rows win ties; rows without a timestamp never replace one that has it
+        if previous is None or fetched_at is not None and (previous[1] is None or fetched_at >= previous[1]):
+            latest[url] = (content, fetched_at)
+
+    types = _TYPES[backend]
+    c.execute('DROP TABLE data_cache')
+    c.execute(f'''
+        CREATE TABLE data_cache (
+            id {types['id']},
+            url TEXT NOT NULL UNIQUE,
+            content TEXT,
+            content_hash TEXT,
+            timestamp {types['timestamp']}
+        )
+    ''')
+    c.execute('CREATE INDEX data_cache_timestamp_idx ON data_cache (timestamp)')
+    placeholder = '%s' if backend == POSTGRESQL else '?'
+    c.executemany(
+        f'INSERT INTO data_cache (url, content, content_hash, timestamp) VALUES ({", ".join([placeholder] * 4)})',
+        [(url, content, ingest.content_hash(content) if content else None, fetched_at)
+         for url, (content, fetched_at) in latest.items()],
+    )
+    logger.info(f'data_cache rebuilt keyed by url: {len(latest)} pages kept')
+
+
+# SQLite: external-content FTS5 index over data_chunks, kept in step by triggers
+SQLITE_CHUNK_SEARCH = (
+    '''CREATE VIRTUAL TABLE IF NOT EXISTS data_chunks_fts USING fts5(
+        url, content, content='data_chunks', content_rowid='id', tokenize='porter unicode61'
+    )''',
+    '''CREATE TRIGGER IF NOT EXISTS data_chunks_fts_ai AFTER INSERT ON data_chunks BEGIN
+        INSERT INTO data_chunks_fts(rowid, url, content) VALUES (new.id, new.url, new.content);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS data_chunks_fts_ad AFTER DELETE ON data_chunks BEGIN
+        INSERT INTO data_chunks_fts(data_chunks_fts, rowid, url, content) VALUES ('delete', old.id, old.url, old.content);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS data_chunks_fts_au AFTER UPDATE ON data_chunks BEGIN
+        INSERT INTO data_chunks_fts(data_chunks_fts, rowid, url, content) VALUES ('delete', old.id, old.url, old.content);
+        INSERT INTO data_chunks_fts(rowid, url, content) VALUES (new.id, new.url, new.content);
+    END''',
+)
+
+# PostgreSQL: generated column keeps the index in step with every insert
+POSTGRESQL_CHUNK_SEARCH = (
+    '''ALTER TABLE data_chunks ADD COLUMN IF NOT EXISTS search_vector tsvector
+       GENERATED ALWAYS AS (to_tsvector('english', coalesce(url, '') || ' ' || coalesce(content, ''))) STORED''',
+    'CREATE INDEX IF NOT EXISTS data_chunks_search_idx ON data_chunks USING GIN (search_vector)',
+)
+
+
+def _chunk_search(c, backend):
+    """Full-text index over data_chunks (database.py v2.9-v3.7 created it on every start).
+
+    Inside a savepoint: a server without FTS5 (SQLite) or generated columns (PostgreSQL < 12) keeps the rest of
+    the schema, searches by scanning (retrieval.py), and is retried at the next start (returns False).
+    """
+    c.execute('SAVEPOINT chunk_search')
+    try:
+        if backend == POSTGRESQL:
+            for statement in POSTGRESQL_CHUNK_SEARCH:
+                c.execute(statement)
+        else:
+            # data_cache_fts indexed whole pages before database.py v3.0; its triggers went with data_cache in migration 2
+            c.execute('DROP TABLE IF EXISTS data_cache_fts')
+            c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'data_chunks_fts'")
+            created = c.fetchone() is None
+            for statement in SQLITE_CHUNK_SEARCH:
+                c.execute(statement)
+            if created:
+                # Index chunks stored before the FTS table existed
+                c.execute("INSERT INTO data_chunks_fts(data_chunks_fts) VALUES ('rebuild')")
+    except Exception as e:
+        c.execute('ROLLBACK TO SAVEPOINT chunk_search')
+        c.execute('RELEASE SAVEPOINT chunk_search')
+        logger.warning(f'{backend} full-text index unavailable, search will scan: {str(e)}')
+        return False
+    c.execute('RELEASE SAVEPOINT chunk_search')
+
+
+MIGRATIONS = (
+    Migration(1, 'baseline', _baseline),
+    Migration(2, 'data_cache keyed by url, content_hash, timestamp index', _data_cache_by_url),
+    Migration(3, 'full-text search over data_chunks', _chunk_search),
+)
+SCHEMA_VERSION = MIGRATIONS[-1].version
+
+
+def _lock(c, backend):
+    """Serialize migration runs across processes for the rest of this transaction."""
+    if backend == POSTGRESQL:
+        c.execute('SELECT pg_advisory_xact_lock(%s)', (MIGRATION_LOCK_ID,))
+    else:
+        # Takes the write lock now; other workers wait (busy_timeout) and then see the recorded versions
+        c.execute('BEGIN IMMEDIATE')
+
+
+def applied_versions(c):
+    c.execute('SELECT version FROM schema_version')
+    return {row[0] for row in c.fetchall()}
+
+
+def migrate(conn, backend):
+    """Apply pending migrations in one transaction; returns the versions applied (empty when up to date).
+
+    A migration's apply may return False when it could not run on this server; it is then not recorded.
+    """
+    c = conn.cursor()
+    # Lock first: concurrent CREATE TABLE IF NOT EXISTS on PostgreSQL can still fail on the pg_type entry
+    _lock(c, backend)
+    try:
+        c.execute(SCHEMA_VERSION_TABLE)
+        applied = applied_versions(c)
+        pending = [m for m in MIGRATIONS if m.version not in applied]
+        placeholder = '%s' if backend == POSTGRESQL else '?'
+        applied = []
+        for migration in pending:
+            if migration.apply(c, backend) is False:
+                continue
+            applied.append(migration.version)
+            c.execute(f'INSERT INTO schema_version (version, name, applied_at) VALUES ({placeholder}, {placeholder}, {placeholder})',
+                      (migration.version, migration.name, datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')))
+            logger.info(f'Applied {backend} migration {migration.version}: {migration.name}')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return applied
+
+
+def _table_exists(c, backend, table):
+    if backend == POSTGRESQL:
+        c.execute('SELECT to_regclass(%s)', (table,))
+        return c.fetchone()[0] is not None
+    c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+    return c.fetchone() is not None
+
+
+def schema_version(conn, backend):
+    """Highest applied migration (0 before the first run); reads only."""
+    c = conn.cursor()
+    if not _table_exists(c, backend, 'schema_version'):
+        return 0
+    return max(applied_versions(c), default=0)
@@ -0,0 +1,163 @@
+# File Name: model_client.py
+# Owner: Andrew John Holland
+# Purpose: Per-worker model client manager for the Cyberpunk Monk backends: builds each model client once, warms the SDK transport at startup and lets a local stub model stand in for Gemini.
+# Version: v1.0
+# Last Updated: 2026-10-18
+# Change Log:
+# 1. v1.0 - Initial creation: ModelClients registry, Gemini and stub backends, generation parameters from env
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from .prompts import DEFAULT_MODEL
+
+logger = logging.getLogger(__name__)
+
+# gemini | stub (local canned replies for tests and load benchmarks)
+MODEL_BACKEND = os.getenv('MODEL_BACKEND', 'gemini').lower()
+STUB_MODEL_DELAY = float(os.getenv('STUB_MODEL_DELAY', '0'))
+STUB_REPLY = ("Holland’s compliance locks are tighter than a spinner’s nav-core. His grid hums with secure "
+              "deployments. Dive in: http://www.andrewholland.com")
+
+# Optional generation parameters; unset ones keep the model's defaults
+GENERATION_ENV = (
+    ('temperature', 'GEMINI_TEMPERATURE', float),
+    ('top_p', 'GEMINI_TOP_P', float),
+    ('top_k', 'GEMINI_TOP_K', int),
+    ('max_output_tokens', 'GEMINI_MAX_OUTPUT_TOKENS', int),
+)
+
+
+def generation_config_from_env():
+    return {key: cast(os.environ[var]) for key, var, cast in GENERATION_ENV if os.getenv(var)}
+
+
+class GeminiBackend:
+    """google.generativeai clients. The SDK is imported and configured on first use; warm() opens its transports."""
+
+    def __init__(self):
+        self._sdk = None
+        self._lock = threading.Lock()
+
+    def sdk(self):
+        with self._lock:
+            if self._sdk is None:
+                api_key = os.getenv('GOOGLE_API_KEY') or os.getenv('GEMINI_API_KEY')
+                if not api_key:
+                    logger.error("GOOGLE_API_KEY not found in .env")
+                    raise ValueError("GOOGLE_API_KEY not found in .env")
+                import google.generativeai as genai
+                genai.configure(api_key=api_key)
+                self._sdk = genai
+            return self._sdk
+
+    def __call__(self, model_name, generation_config):
+        return self.sdk().GenerativeModel(model_name, generation_config=generation_config or None)
+
+    def warm(self):
+        """Create the SDK's shared sync and async service clients now instead of on the first chat.
+
+        Call from the event loop thread: the async gRPC channel binds to the running loop.
+        """
+        from google.generativeai import client
+        client.get_default_generative_client()
+        client.get_default_generative_async_client()
+
+
+class StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubStream:
+    """Async iterator of text chunks, shaped like the SDK's stream=True response."""
+
+    def __init__(self, text, delay):
+        self._words = text.split(' ')
+        self._delay = delay
+
+    async def __aiter__(self):
+        for i, word in enumerate(self._words):
+            if self._delay:
+                await asyncio.sleep(self._delay / len(self._words))
+            yield StubResponse(word if i == 0 else ' ' + word)
+
+
+class StubModel:
+    """Local stand-in with the GenerativeModel call surface: canned reply after STUB_MODEL_DELAY seconds."""
+
+    def __init__(self, model_name, generation_config=None, delay=STUB_MODEL_DELAY, reply=STUB_REPLY):
+        self.model_name = model_name
+        self.generation_config = generation_config
+        self.delay = delay
+        self.reply = reply
+
+    def generate_content(self, prompt):
+        if self.delay:
+            time.sleep(self.delay)
+        return StubResponse(self.reply)
+
+    async def generate_content_async(self, prompt, stream=False):
+        if stream:
+            return StubStream(self.reply, self.delay)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return StubResponse(self.reply)
+
+
+BACKENDS = {
+    'gemini': GeminiBackend,
+    'stub': lambda: StubModel,
+}
+
+
+def register_backend(name, factory):
+    """Add a backend: factory() returns a callable (model_name, generation_config) -> client, optionally with warm()."""
+    BACKENDS[name] = factory
+
+
+class ModelClients:
+    """One client per model name for the life of the worker, built on first use (or at startup via load)."""
+
+    def __init__(self, backend=None, generation_config=None, default_model=DEFAULT_MODEL):
+        backend = backend or MODEL_BACKEND
+        if isinstance(backend, str):
+            if backend not in BACKENDS:
+                raise ValueError(f"Unknown MODEL_BACKEND '{backend}' (expected one of {', '.join(BACKENDS)})")
+            self.backend_name, backend = backend, BACKENDS[backend]()
+        else:
+            self.backend_name = getattr(backend, '__name__', type(backend).__name__)
+        self.backend = backend
+        self.generation_config = generation_config_from_env() if generation_config is None else generation_config
+        self.default_model = default_model
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def get(self, model_name=None):
+        name = model_name or self.default_model
+        client = self._clients.get(name)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(name)
+                if client is None:
+                    client = self._clients[name] = self.backend(name, self.generation_config)
+                    logger.info(f"Model client ready: {self.backend_name}/{name}")
+        return client
+
+    def load(self):
+        """Build the default client (imports the SDK); safe to run in a worker thread."""
+        return self.get()
+
+    def warm(self):
+        warm = getattr(self.backend, 'warm', None)
+        if warm is not None:
+            warm()
+
+    def stats(self):
+        return {
+            'backend': self.backend_name,
+            'models': sorted(self._clients),
+            'generation_config': self.generation_config,
+        }
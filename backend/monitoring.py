@@ -1,8 +1,8 @@
 # File Name: monitoring.py
 # Owner: Andrew John Holland
-# Purpose: Monitors and caches content from specified URLs for the Cyberpunk Monk Chatbot, storing in data_cache.db.
-# Version: v1.8
-# Last Updated: 2025-08-08
+# Purpose: Monitors and caches content from specified URLs for the Cyberpunk Monk Chatbot, storing cleaned text and chunks via database.py.
+# Version: v2.5
+# Last Updated: 2026-10-18
 # Change Log:
 # 1. Initial creation of monitoring script - 2025-08-07
 # 2. Added URL fetching and database storage - 2025-08-07
@@ -12,47 +12,141 @@
 # 6. Fixed log path to '../logs/execution.log' for project root - 2025-08-08
 # 7. Removed BlockingScheduler, run once, added timeout handling - 2025-08-08
 # 8. Incremented version to v1.8 - 2025-08-08
+# 9. Enabled recursive_triggers so INSERT OR REPLACE keeps the data_cache FTS index in sync, incremented to v1.9 - 2026-10-18
+# 10. Strip markup/extract PDF text via ingest.py and store bounded chunks with database.store_document, incremented to v2.0 - 2026-10-18
+# 11. Concurrent conditional crawler: shared keep-alive session, ETag/Last-Modified, content-hash skip, one write transaction, URLs from config, incremented to v2.1 - 2026-10-18
+# 12. Logging via backend.logging_setup (queued, rotating) instead of basicConfig on a relative path, incremented to v2.2 - 2026-10-18
+# 13. monitor_urls returns failed_urls and takes progress=False for unattended runs; URL lines may carry a refresh interval (read by scheduler.py), incremented to v2.3 - 2026-10-18
+# 14. Re-embed stored pages into the embedding index after each crawl (when RETRIEVAL_MODE uses it), so every refresh path keeps it current, incremented to v2.4 - 2026-10-18
+# 15. configure_logging runs only when monitoring.py is the entry point, so importing the crawler (server, scheduler, tests) installs no log handlers, incremented to v2.5 - 2026-10-18
 
 import logging
-import sqlite3
+import os
+import sys
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
 from tqdm import tqdm
 from urllib.parse import urlparse
 import time
 
-logging.basicConfig(filename='../logs/execution.log', level=logging.DEBUG)
-
-def monitor_urls():
-    urls = [
-        "http://www.andrewholland.com",
-        "https://www.andrewholland.com/career/Career_Identity.html",
-        "https://www.andrewholland.com/timeline/index.html",
-        "https://github.com/silicastormsiam",
-        "https://www.youtube.com/@SilicaStormSiam",
-        "https://www.andrewholland.com/downloads/aholland_executive_summary.pdf"
-    ]
-    conn = sqlite3.connect('../data_cache.db')
-    cursor = conn.cursor()
-    cursor.execute('''CREATE TABLE IF NOT EXISTS data_cache (url TEXT PRIMARY KEY, content TEXT)''')
-    conn.commit()
-
-    progress_bar = tqdm(urls, desc="Caching URLs", unit="url")
-    for url in progress_bar:
+# Run from backend/ as a script; make the backend package importable for shared modules
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from backend import embeddings, ingest
+from backend.database import get_crawl_state, store_crawl_results
+
+MONITOR_URLS_FILE = os.getenv('MONITOR_URLS_FILE', os.path.join(PROJECT_ROOT, 'config', 'monitor_urls.txt'))
+MONITOR_WORKERS = int(os.getenv('MONITOR_WORKERS', '6'))
+MONITOR_TIMEOUT = float(os.getenv('MONITOR_TIMEOUT', '5'))
+
+def load_url_lines():
+    """Monitor entries: MONITOR_URLS (comma-separated) or one per line in MONITOR_URLS_FILE.
+
+    Each entry is a URL, optionally followed by its refresh interval (e.g. "https://example.com 15m").
+    """
+    env_urls = os.getenv('MONITOR_URLS')
+    if env_urls:
+        return [entry.split() for entry in env_urls.split(',') if entry.strip()]
+    with open(MONITOR_URLS_FILE, encoding='utf-8') as f:
+        return [line.split() for line in f if line.strip() and not line.lstrip().startswith('#')]
+
+def load_urls():
+    """URLs to monitor, without their refresh intervals."""
+    return [fields[0] for fields in load_url_lines()]
+
+def make_session(pool_size=MONITOR_WORKERS):
+    """One keep-alive session shared by all fetch workers."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['User-Agent'] = 'CyberpunkMonkMonitor/2.1'
+    return session
+
+def fetch_url(session, url, state):
+    """Conditional GET of one URL; returns a result dict whose 'text' is set only when content changed."""
+    etag, last_modified, previous_hash = state or (None, None, None)
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    response = session.get(url, timeout=MONITOR_TIMEOUT, headers=headers)
+    result = {
+        'url': url,
+        'etag': response.headers.get('ETag', etag),
+        'last_modified': response.headers.get('Last-Modified', last_modified),
+        'content_hash': previous_hash,
+        'bytes': len(response.content),
+    }
+    if response.status_code == 304:
+        result['status'] = 'not_modified'
+        return result
+    response.raise_for_status()
+    text = ingest.extract_text(url, response.headers.get('Content-Type'), response.content, response.encoding)
+    if not text:
+        result['status'] = 'empty'
+        return result
+    digest = ingest.content_hash(text)
+    result['content_hash'] = digest
+    if digest == previous_hash:
+        result['status'] = 'unchanged'
+    else:
+        result['status'] = 'changed'
+        result['text'] = text
+    return result
+
+def monitor_urls(urls=None, session=None, progress=True, index=None):
+    """Fetch all URLs concurrently, then write changed pages and validators in one transaction.
+
+    Stored pages are re-embedded into `index` (default: the configured embedding index, unless RETRIEVAL_MODE=fts).
+    Returns a summary with per-status counts, failed_urls, bytes downloaded and wall time.
+    """
+    urls = urls or load_urls()
+    state = get_crawl_state()
+    session = session or make_session()
+    start = time.perf_counter()
+    results, failed_urls = [], []
+
+    with ThreadPoolExecutor(max_workers=min(MONITOR_WORKERS, len(urls)) or 1) as pool:
+        futures = {pool.submit(fetch_url, session, url, state.get(url)): url for url in urls}
+        progress_bar = tqdm(as_completed(futures), total=len(futures), desc="Caching URLs", unit="url",
+                            disable=not progress)
+        for future in progress_bar:
+            url = futures[future]
+            try:
+                result = future.result()
+                results.append(result)
+                logging.info(f"{result['status']}: {url} ({result['bytes']} bytes)")
+                progress_bar.set_postfix(status=f"{result['status']} {urlparse(url).netloc}")
+            except requests.exceptions.RequestException as e:
+                failed_urls.append(url)
+                logging.error(f"Failed to cache {url}: {str(e)}")
+                progress_bar.set_postfix(status=f"Failed {urlparse(url).netloc}")
+
+    # Pages that came back empty keep their previous cache and validators
+    changed = store_crawl_results([r for r in results if r['status'] != 'empty'])
+    summary = {status: sum(1 for r in results if r['status'] == status)
+               for status in ('changed', 'unchanged', 'not_modified', 'empty')}
+    summary.update(failed=len(failed_urls), failed_urls=failed_urls, stored=changed, bytes=sum(r['bytes'] for r in results),
+                   seconds=round(time.perf_counter() - start, 3))
+    if index is None and embeddings.RETRIEVAL_MODE != 'fts':
+        index = embeddings.EmbeddingIndex()
+    if changed and index is not None:
         try:
-            response = requests.get(url, timeout=5)
-            response.raise_for_status()
-            content = response.text
-            cursor.execute("INSERT OR REPLACE INTO data_cache (url, content) VALUES (?, ?)", (url, content))
-            conn.commit()
-            logging.info(f"Successfully cached data from {url}")
-            progress_bar.set_postfix(status=f"Cached {urlparse(url).netloc}")
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Failed to cache {url}: {str(e)}")
-            progress_bar.set_postfix(status=f"Failed {urlparse(url).netloc}")
-    conn.close()
-    logging.info("Monitoring completed")
+            index.update()
+        except Exception as e:
+            logging.error(f"Embedding index update failed: {str(e)}")
+    logging.info(f"Monitoring completed: {summary}")
+    return summary
 
 if __name__ == "__main__":
+    from backend.logging_setup import configure_logging
+
+    configure_logging()
     logging.info("Executing monitoring.py")
     try:
         monitor_urls()
@@ -1,58 +1,119 @@
 # File Name: monk_bot.py
 # Owner: Andrew John Holland
-# Purpose: FastAPI backend to proxy Gemini AI requests securely using .env key with google-generativeai, prompts.py, and database.py. Serves frontend and static assets.
-# Version: v2.9
-# Last Updated: 2025-08-11
+# Purpose: FastAPI backend to proxy Gemini AI requests securely using .env key with google-generativeai, prompts.py, and database.py. Serves frontend and static assets, and the legacy Flask /monk route.
+# Version: v5.7
+# Last Updated: 2026-10-18
 # Change Log:
-# 1. v2.9 - Added StaticFiles mounts for /static and /frontend; added homepage route to serve ../frontend/index.html; retained existing CORS and DB init.
-# 2. v2.8 - Load .env from project root explicitly; clarified CORS; minor log hardening
-# 3. v2.7 - Fixed logger.getLogger(name), file references, and SQLite error logging
-# 4. v2.6 - Fixed CORS import to CORSMiddleware
-# 5. v2.5 - Fixed SyntaxError for unterminated string
-# 6. v2.4 - Updated for PostgreSQL integration
-# 7. v2.3 - Prepared for Hostinger VPS deployment
-
-from fastapi import FastAPI, HTTPException
+# 1. v5.7 - Session store and embedding index opened in the lifespan hook (ChatService.open), so importing monk_bot opens no sessions.db and loads no numpy
+# 2. v5.6 - SERVER_TIMING=1 adds a Server-Timing header (per-stage ms and the reply source) to /api/chat and /monk replies, so load tests get exact per-request stage timings from every worker
+# 3. v5.5 - client_key takes the last address in ADMISSION_CLIENT_HEADER (the hop the trusted proxy added), not the client-supplied first one
+# 4. v5.4 - Admission control on every chat route: 429 with Retry-After when the worker's slots and queue are full, the wait would pass its deadline, or one client sends too much (admission.py); messages over MAX_MESSAGE_CHARS get 413
+# 5. v5.3 - Embedding index (RETRIEVAL_MODE=vector|hybrid) mapped (or first built) in the lifespan hook once the DB pool is up
+# 6. v5.2 - REFRESH_IN_PROCESS=1 runs scheduler.RefreshScheduler in a worker thread from the lifespan hook (single-worker deployments); its counters under /api/stats "refresh"
+# 7. v5.1 - /, /static and /frontend served from assets.AssetIndex (loaded at startup): fingerprinted URLs, gzip/br variants, ETag/304, long-lived Cache-Control; no per-request os.path.exists
+# 8. v5.0 - The one production server: chat flow moved to service.ChatService (shared by every route); /monk and /stats compatibility routes replace the Flask app.py; run under gunicorn.conf.py (uvicorn workers)
+# 9. v4.2 - Conversation sessions (sessions.py): session_id in ChatRequest and replies, compacted history in the prompt, previous context reused when it covers a follow-up; response cache only for history-free turns
+# 10. v4.1 - Model clients built once per worker by model_client.ModelClients (configurable model, generation parameters, stub backend) and SDK transports warmed at startup
+# 11. v4.0 - Lazy startup: Gemini SDK import/configure and init_db moved into a FastAPI lifespan hook (run concurrently off the loop); /ready readiness endpoint; pool closed on shutdown
+# 12. v3.9 - Logging via logging_setup.configure_logging: queued writes, rotating files, error.log receives ERROR only
+# 13. v3.8 - Per-stage timing spans (retrieval, cache_lookup, prompt_build, model_call, serialization), request/in-flight/reply metrics and a Prometheus /metrics endpoint
+# 14. v3.7 - Gemini calls go through a shared ModelGate (token bucket, jittered backoff, circuit breaker, queue deadline); shed requests get busy_reply instead of a 500
+# 15. v3.6 - Prompts built with build_prompt under the model's char budget; prompt size/budget logged per request
+# 16. v3.5 - Added /api/chat/stream: Server-Sent Events relaying Gemini stream=True chunks; client disconnect closes the upstream stream
+# 17. v3.4 - Response cache in front of Gemini (query + context hash, TTL/LRU, generation invalidation); /api/stats
+# 18. v3.3 - Prompt context is the top-ranked cleaned chunks, not a whole cached page
+# 19. v3.2 - Cache lookups use ranked full-text search from retrieval.py instead of content LIKE scans
+# 20. v3.1 - Non-blocking /api/chat: async DB reads, generate_content_async, CHAT_CONCURRENCY limit
+# 21. v3.0 - get_cached_data reads through the pooled data-access layer in database.py; no per-request connect or fallback dial
+# 22. v2.9 - Added StaticFiles mounts for /static and /frontend; added homepage route to serve ../frontend/index.html; retained existing CORS and DB init.
+# 23. v2.8 - Load .env from project root explicitly; clarified CORS; minor log hardening
+# 24. v2.7 - Fixed logger.getLogger(name), file references, and SQLite error logging
+# 25. v2.6 - Fixed CORS import to CORSMiddleware
+# 26. v2.5 - Fixed SyntaxError for unterminated string
+# 27. v2.4 - Updated for PostgreSQL integration
+# 28. v2.3 - Prepared for Hostinger VPS deployment
+
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from starlette.responses import FileResponse
+from starlette.background import BackgroundTask
+from starlette.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
+import asyncio
+import json
 import os
-import google.generativeai as genai
+import time
 import logging
-import psycopg2
-from .prompts import get_prompt
-from .database import init_db, DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD
-
-# Ensure logs dir exists
-LOG_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'logs'))
-os.makedirs(LOG_DIR, exist_ok=True)
-
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(os.path.join(LOG_DIR, 'execution.log')),
-        logging.FileHandler(os.path.join(LOG_DIR, 'error.log')),
-        logging.StreamHandler()
-    ]
-)
+from contextlib import asynccontextmanager
+from typing import Optional
+from . import metrics
+from .admission import MAX_MESSAGE_CHARS, AdmissionRejected
+from .assets import AssetIndex
+from .logging_setup import configure_logging
+from .database import close_db, fetch_one_async, init_db, pool_stats
+from .service import ChatReply, ChatService
+
 logger = logging.getLogger(__name__)
 
 # Load .env from project root explicitly
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 load_dotenv(os.path.join(PROJECT_ROOT, '.env'))
 
-api_key = os.getenv('GOOGLE_API_KEY')
-if not api_key:
-    logger.error("GOOGLE_API_KEY not found in .env")
-    raise ValueError("GOOGLE_API_KEY not found in .env")
-genai.configure(api_key=api_key)
+# Filled in by the lifespan hook; /ready reports it
+startup_state = {"ready": False, "backend": None, "startup_seconds": None, "error": None}
+
+# Model clients, quota guard, response cache and sessions for this worker, and the chat flow over them; construction is
+# cheap, the session store and embedding index are opened by the lifespan hook
+service = ChatService()
+service.register_metrics()
+# /static and /frontend files, read and compressed once per worker
+assets = AssetIndex()
+metrics.register_stats("monk_assets", lambda: assets.stats(), counters=("responses", "not_modified", "compressed"))
+# Continuous URL refresh inside this worker (scheduler.py); with several workers run `python backend/scheduler.py` once instead
+REFRESH_IN_PROCESS = os.getenv("REFRESH_IN_PROCESS", "0") == "1"
+refresher = None
+# Header the trusted reverse proxy sets to the visitor's address (X-Real-IP from nginx; X-Forwarded-For also works, its
+# last entry being the one the proxy appended); unset: the peer address. Never set it without such a proxy in front
+ADMISSION_CLIENT_HEADER = os.getenv("ADMISSION_CLIENT_HEADER", "")
+# Per-stage timings of each chat reply in a Server-Timing header (benchmarks/bench_load.py); off in production
+SERVER_TIMING = os.getenv("SERVER_TIMING", "0") == "1"
+
+@asynccontextmanager
+async def lifespan(app):
+    """Worker startup: logging, model client, asset index and DB pool (PG connect bounded by DB_CONNECT_TIMEOUT), then
+    the session store and the embedding index when retrieval uses it."""
+    configure_logging()
+    started = time.perf_counter()
+    try:
+        # All block; run them side by side off the event loop
+        _, startup_state["backend"], _ = await asyncio.gather(
+            asyncio.to_thread(service.model_clients.load), asyncio.to_thread(init_db), asyncio.to_thread(assets.load)
+        )
+        # Needs the pool (the index may build from data_chunks on first start)
+        await asyncio.to_thread(service.open)
+        # On the loop thread: the SDK's async channel binds to the running loop
+        service.model_clients.warm()
+    except Exception as e:
+        startup_state["error"] = str(e)
+        logger.error(f"Startup failed: {str(e)}")
+        raise
+    startup_state.update(ready=True, error=None, startup_seconds=round(time.perf_counter() - started, 3))
+    logger.info(f"Startup complete in {startup_state['startup_seconds']}s: {pool_stats()}")
+    global refresher
+    if REFRESH_IN_PROCESS:
+        from .scheduler import RefreshScheduler
+        refresher = RefreshScheduler().start()
+    try:
+        yield
+    finally:
+        startup_state["ready"] = False
+        if refresher is not None:
+            await asyncio.to_thread(refresher.stop)
+            refresher = None
+        close_db()
 
 # FastAPI app + CORS
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -69,95 +130,172 @@ app.add_middleware(
 )
 
 # ---- Serve static assets and frontend ----
-STATIC_DIR = os.path.abspath(os.path.join(PROJECT_ROOT, 'static'))
-FRONTEND_DIR = os.path.abspath(os.path.join(PROJECT_ROOT, 'frontend'))
+def asset_response(url: str, request: Request) -> Response:
+    response = assets.response(url, request.headers, request.method)
+    if response is None:
+        raise HTTPException(status_code=404, detail=f"{url} not found")
+    return response
 
-app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
-app.mount("/frontend", StaticFiles(directory=FRONTEND_DIR), name="frontend")
+@app.api_route("/", methods=["GET", "HEAD"])
+async def serve_homepage(request: Request):
+    # index.html always revalidates (ETag); the assets it links are fingerprinted and cached for a year
+    return asset_response("/frontend/index.html", request)
 
-@app.get("/")
-async def serve_homepage():
-    index_path = os.path.join(FRONTEND_DIR, 'index.html')
-    if not os.path.exists(index_path):
-        logger.error(f"index.html not found at {index_path}")
-        raise HTTPException(status_code=404, detail="index.html not found")
-    return FileResponse(index_path)
+@app.api_route("/static/{path:path}", methods=["GET", "HEAD"])
+async def serve_static(path: str, request: Request):
+    return asset_response(f"/static/{path}", request)
 
-# Initialize database (PG → fallback SQLite handled inside)
-init_db()
-logger.info("Database initialized")
+@app.api_route("/frontend/{path:path}", methods=["GET", "HEAD"])
+async def serve_frontend(path: str, request: Request):
+    return asset_response(f"/frontend/{path}", request)
 
 class ChatRequest(BaseModel):
     message: str
+    # From the previous reply; omitted, unknown or expired ids start a new conversation
+    session_id: Optional[str] = None
 
-def get_cached_data(query: str) -> str:
-    """Query data_cache for latest relevant content based on the query."""
-    try:
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            port=DB_PORT,
-            database=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD
-        )
-        c = conn.cursor()
-        c.execute(
-            "SELECT content FROM data_cache WHERE content LIKE %s ORDER BY timestamp DESC LIMIT 1",
-            (f'%{query}%',),
-        )
-        result = c.fetchone()
-        conn.close()
-        return result[0] if result else ""
-    except Exception as e:
-        logger.warning(f"PostgreSQL query failed: {str(e)}. Falling back to SQLite.")
-        try:
-            import sqlite3
-            from .database import DB_PATH
-            conn = sqlite3.connect(DB_PATH)
-            c = conn.cursor()
-            c.execute(
-                "SELECT content FROM data_cache WHERE content LIKE ? ORDER BY timestamp DESC LIMIT 1",
-                (f'%{query}%',),
-            )
-            result = c.fetchone()
-            conn.close()
-            return result[0] if result else ""
-        except Exception as e2:
-            logger.error(f"SQLite query failed: {str(e2)}")
-            return ""
+def reply_response(reply: ChatReply, tracked: dict = None) -> JSONResponse:
+    """Serialize a chat reply (timed as its own stage) and count where it came from."""
+    metrics.REPLIES.inc(source=reply.source)
+    with metrics.span("serialization"):
+        response = JSONResponse({"response": reply.text, "session_id": reply.session_id})
+    if SERVER_TIMING and tracked is not None:
+        response.headers["Server-Timing"] = metrics.server_timing(tracked["stages"], reply.source)
+    return response
+
+def message_error(message: str):
+    """(status, detail) for a message the chat routes refuse, or None."""
+    if not message:
+        return 400, "No message provided"
+    if len(message) > MAX_MESSAGE_CHARS:
+        return 413, f"Message too long (max {MAX_MESSAGE_CHARS} characters)"
+    return None
+
+def chat_message(request: ChatRequest) -> str:
+    message = (request.message or "").strip()
+    error = message_error(message)
+    if error:
+        logger.warning(f"Rejected chat message: {error[1]}")
+        raise HTTPException(status_code=error[0], detail=error[1])
+    return message
+
+def client_key(http_request: Request) -> Optional[str]:
+    """Who a chat is from, for per-client admission limits.
+
+    Only the last address in the header is trusted: earlier X-Forwarded-For entries come from the client and
+    could be anything, so keying on them would let one client pose as many.
+    """
+    if ADMISSION_CLIENT_HEADER:
+        forwarded = http_request.headers.get(ADMISSION_CLIENT_HEADER)
+        if forwarded:
+            return forwarded.split(",")[-1].strip()
+    return http_request.client.host if http_request.client else None
+
+def rejected_response(e: AdmissionRejected, body: dict = None) -> JSONResponse:
+    """429 with a Retry-After hint; the client backs off instead of piling onto an overloaded worker."""
+    metrics.REPLIES.inc(source="rejected")
+    return JSONResponse(body or {"detail": str(e)}, status_code=429, headers={"Retry-After": str(e.retry_after)})
 
 @app.post("/api/chat")
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_request: Request):
     logger.info("Received request at /api/chat")
-    message = (request.message or "").strip()
-    if not message:
-        logger.warning("No message provided in request")
-        raise HTTPException(status_code=400, detail="No message provided")
+    with metrics.track_request("/api/chat") as tracked:
+        message = chat_message(request)
+        try:
+            reply = await service.reply(message, request.session_id, client_key(http_request))
+        except AdmissionRejected as e:
+            tracked["outcome"] = "rejected"
+            return rejected_response(e)
+        except Exception as e:
+            logger.error(f"Error generating response: {str(e)}")
+            metrics.REPLIES.inc(source="error")
+            raise HTTPException(status_code=500, detail=str(e))
+        logger.info(f"Generated response ({min(len(reply.text), 80)} chars preview)")
+        return reply_response(reply, tracked)
+
+@app.post("/monk")
+async def monk(request: ChatRequest, http_request: Request):
+    """The retired Flask app.py route, same request and reply shape ({"response"}, or {"error"} with a 500)."""
+    logger.info("Received request at /monk")
+    with metrics.track_request("/monk") as tracked:
+        message = (request.message or "").strip()
+        error = message_error(message)
+        if error:
+            tracked["outcome"] = "error"
+            return JSONResponse({"error": error[1]}, status_code=error[0])
+        try:
+            return reply_response(await service.reply(message, request.session_id, client_key(http_request)), tracked)
+        except AdmissionRejected as e:
+            tracked["outcome"] = "rejected"
+            return rejected_response(e, {"error": str(e)})
+        except Exception as e:
+            logger.error(f"Error in /monk endpoint: {str(e)}")
+            tracked["outcome"] = "error"
+            metrics.REPLIES.inc(source="error")
+            return JSONResponse({"error": str(e)}, status_code=500)
+
+def sse_event(data: dict, event: str = None) -> str:
+    """One Server-Sent Events frame; JSON keeps newlines in model text from splitting the frame."""
+    frame = f"event: {event}\n" if event else ""
+    return f"{frame}data: {json.dumps(data)}\n\n"
 
+async def stream_chat(message: str, session_id: str = None, ticket=None):
+    """Event stream for one chat: text frames, then 'done' carrying the session_id (or 'error')."""
+    with metrics.track_request("/api/chat/stream"):
+        try:
+            async for item in service.stream(message, session_id, ticket=ticket):
+                if isinstance(item, ChatReply):
+                    yield sse_event({"session_id": item.session_id}, "done")
+                else:
+                    yield sse_event({"text": item})
+        except Exception as e:
+            logger.error(f"Error streaming response: {str(e)}")
+            metrics.REPLIES.inc(source="error")
+            yield sse_event({"detail": str(e)}, "error")
+
+@app.post("/api/chat/stream")
+async def chat_stream(request: ChatRequest, http_request: Request):
+    logger.info("Received request at /api/chat/stream")
+    message = chat_message(request)
+    # Admitted before the response starts, so overload is still a plain 429
     try:
-        # Query cached data
-        cached_data = get_cached_data(message)
-        if cached_data:
-            logger.info(f"Cached data found ({len(cached_data)} chars)")
-        else:
-            logger.info("No cached data found")
-
-        # Generate CP Monk prompt
-        prompt = get_prompt(message, cached_data)
-        logger.info(f"Generated prompt ({len(prompt)} chars)")
-
-        # Call Gemini AI
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        response = model.generate_content(prompt)
-        bot_text = getattr(response, "text", "") or "No response from CP Monk"
-
-        logger.info(f"Generated response ({min(len(bot_text), 80)} chars preview)")
-        return {"response": bot_text}
-    except Exception as e:
-        logger.error(f"Error generating response: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        ticket = await service.admission.acquire(client_key(http_request), message)
+    except AdmissionRejected as e:
+        metrics.REQUESTS.inc(endpoint="/api/chat/stream", outcome="rejected")
+        return rejected_response(e)
+    return StreamingResponse(
+        stream_chat(message, request.session_id, ticket),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # The stream releases its ticket; this covers a client gone before the stream started
+        background=BackgroundTask(ticket.release),
+    )
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 once startup finished and the DB answers a query, otherwise 503 with the reason."""
+    state = dict(startup_state, model=service.model_clients.stats(), db_pool=pool_stats())
+    if state["ready"]:
+        try:
+            await fetch_one_async("SELECT 1")
+        except Exception as e:
+            state.update(ready=False, error=f"database: {str(e)}")
+    return JSONResponse(state, status_code=200 if state["ready"] else 503)
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus scrape target: latency histograms, in-flight gauges, reply counters, cache/gate/pool stats."""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/api/stats")
+async def stats():
+    """Admission, response cache, quota guard, session store, DB pool, asset and background refresh counters."""
+    return dict(service.stats(), assets=assets.stats(), refresh=refresher.stats() if refresher else None)
+
+# The Flask app's path for the same counters
+app.add_api_route("/stats", stats, methods=["GET"])
 
 if __name__ == '__main__':
     import uvicorn
     logger.info("Starting FastAPI server on 0.0.0.0:5000")
-    uvicorn.run(app, host="0.0.0.0", port=5000)
+    uvicorn.run(app, host="0.0.0.0", port=5000)
\ No newline at end of file
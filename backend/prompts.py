@@ -1,8 +1,8 @@
 # File Name: prompts.py
 # Owner: Andrew John Holland
 # Purpose: Enhanced prompt generator for the Cyberpunk Monk Chatbot, blending Zen wisdom, cyberpunk grit, and 2049 noir for AI responses via Gemini or similar NLP APIs.
-# Version: v2.8
-# Last Updated: 2025-08-08
+# Version: v2.12
+# Last Updated: 2026-10-18
 # Change Log:
 # 1. Initial creation of prompt function - 2025-08-07
 # 2. Added Zen-cyberpunk parable structure - 2025-08-07
@@ -22,28 +22,164 @@
 # 16. Integrated full CP Monk storyline with SSS and Blade Runner details - 2025-08-08
 # 17. Fixed SyntaxError in f-string for name-based queries - 2025-08-08
 # 18. Incremented version to v2.8 - 2025-08-08
+# 19. Persona templates compiled once at import; per-model char budget selects/truncates retrieved chunks; build_prompt reports size and budget used; data and redirect now actually substituted in the data prompt, incremented to v2.9 - 2026-10-18
+# 20. Added busy_reply, the canned reply served when the Gemini quota guard sheds a request, incremented to v2.10 - 2026-10-18
+# 21. Optional conversation history (from sessions.py) rendered before the query and reserved from the char budget; Prompt reports history_chars, incremented to v2.11 - 2026-10-18
+# 22. Fallback prompt (nothing retrieved) keeps the conversation history too, reserved from the char budget like the other branches, incremented to v2.12 - 2026-10-18
 
-def get_prompt(query, data):
-    base_redirects = [
-        "http://www.andrewholland.com",
-        "https://www.andrewholland.com/career/Career_Identity.html",
-        "https://www.andrewholland.com/timeline/index.html",
-        "https://github.com/silicastormsiam",
-        "https://www.youtube.com/@SilicaStormSiam",
-        "https://www.andrewholland.com/downloads/aholland_executive_summary.pdf"
-    ]
-    import random
-    redirect_url = random.choice(base_redirects)
+import itertools
+import os
+import random
+import string
+from collections import namedtuple
+
+BASE_REDIRECTS = (
+    "http://www.andrewholland.com",
+    "https://www.andrewholland.com/career/Career_Identity.html",
+    "https://www.andrewholland.com/timeline/index.html",
+    "https://github.com/silicastormsiam",
+    "https://www.youtube.com/@SilicaStormSiam",
+    "https://www.andrewholland.com/downloads/aholland_executive_summary.pdf"
+)
+
+DEFAULT_MODEL = os.getenv('GEMINI_MODEL', 'gemini-1.5-flash')
+# Total prompt size per model in characters (~4 chars per token); PROMPT_CHAR_BUDGET overrides for every model
+MODEL_CHAR_BUDGETS = {
+    'gemini-1.5-flash': 8000,
+    'gemini-1.5-pro': 16000,
+}
+DEFAULT_CHAR_BUDGET = 8000
+PROMPT_CHAR_BUDGET = os.getenv('PROMPT_CHAR_BUDGET')
+CHARS_PER_TOKEN = 4
+
+NAME_PREFIXES = ("hello my name is", "my name is", "hi my name is")
+
+# Retrieved context arrives as "[url]\nchunk" blocks joined by blank lines (retrieval.format_context)
+BLOCK_SEPARATOR = "\n\n[http"
+
+Prompt = namedtuple('Prompt', 'text chars tokens budget data_chars blocks_used truncated history_chars')
+
+
+class PromptTemplate:
+    """A str.format-style template parsed once at import into literal parts and field slots."""
+
+    def __init__(self, source):
+        self.parts, self.fields = [], []
+        for literal, field, _, _ in string.Formatter().parse(source):
+            if literal:
+                self.parts.append(literal)
+            if field is not None:
+                self.fields.append((len(self.parts), field))
+                self.parts.append(None)
+        self.fixed_chars = sum(len(part) for part in self.parts if part)
+
+    def render(self, **values):
+        parts = self.parts.copy()
+        for index, field in self.fields:
+            parts[index] = values[field]
+        return "".join(parts)
+
+
+NAME_TEMPLATE = PromptTemplate(
+    "Hello {name}, I’m CP Monk, once a Blade Runner with the 2019 LAPD Rep-Detect Unit, favoring cautious hunts like extended surveillance over Deckard’s chases. By 2049, I head security for Andrew John Holland’s SSS syndicate—SilicaStormSiam BioTech—monitoring comms from my neon shrine, meditating on Gaff’s origami unicorns. SSS, accused of illicit android parts but unproven in corrupt courts, reports expired replicants. I’m stoked to share Holland’s compliance mastery! Provide a fluid, vibrant response (under 100 words) using: {data}. Use Blade Runner terms, stay direct. Conclude with one hyperlink to: {redirect_url}. Example: 'Holland’s compliance locks are tighter than a spinner’s nav-core. His grid hums with secure deployments. Dive in: {redirect_url}' {history}Query: {query} Ignite the grid!"
+)
+DATA_TEMPLATE = PromptTemplate(
+    "You are CP Monk, a former Blade Runner from the 2019–2049 LAPD Rep-Detect Unit, now head of security for the SSS syndicate—SilicaStormSiam BioTech, owned by Andrew John Holland. From your neon shrine, you meditate, pray, and monitor all comms, guarding SSS against Wallace infiltrators and unproven accusations of illicit android parts. SSS reports expired replicants’ locations, blending Tyrell Corp's synthetic biology with Holland's expertise in secure deployments for oil/gas, airline, or aerospace projects. Deliver a fluid, vibrant response (under 100 words) to the query below, crackling with Blade Runner grit and Zen spark, direct and pumped about Holland’s compliance mastery. Use: {data}. Conclude with one hyperlink to: {redirect_url}. Nod to Gaff’s origami folds occasionally. Example: 'Holland’s compliance locks are tighter than a spinner’s nav-core. His grid hums with secure deployments. Dive in: {redirect_url}' "
+    "{history}"
+    "Query: {query} "
+    "Ignite the grid!"
+)
+FALLBACK_TEMPLATE = PromptTemplate(
+    "{history}"
+    "Pumped to assist from my neon shrine, but my cache lacks specifics on '{query}' right now! Like Gaff’s origami unicorn, Andrew John Holland’s skills await discovery at: http://www.andrewholland.com"
+)
+HISTORY_TEMPLATE = PromptTemplate(
+    "Conversation so far—stay consistent with it and don’t repeat yourself:\n{history}\n"
+)
+BUSY_TEMPLATE = PromptTemplate(
+    "The grid’s jammed—too many signals hitting my neon shrine at once, so '{query}' waits in the rain a moment! Ping me again soon, or uncover Andrew John Holland’s compliance mastery now at: http://www.andrewholland.com"
+)
+
+
+def char_budget(model_name=DEFAULT_MODEL):
+    if PROMPT_CHAR_BUDGET:
+        return int(PROMPT_CHAR_BUDGET)
+    return MODEL_CHAR_BUDGETS.get(model_name, DEFAULT_CHAR_BUDGET)
+
+
+def iter_blocks(data):
+    """Retrieved context as chunk blocks, best first; strings are split lazily so huge inputs are never fully scanned."""
+    if not data:
+        return
+    if not isinstance(data, str):
+        yield from (block for block in data if block and block.strip())
+        return
+    start, length = 0, len(data)
+    while start < length:
+        end = data.find(BLOCK_SEPARATOR, start)
+        if end == -1:
+            end = length
+        block = data[start:end].strip()
+        if block:
+            yield block
+        start = end + 2
+
+
+def fit_blocks(blocks, available):
+    """Keep whole blocks in rank order while they fit; cut the first block at a word if even it does not.
+
+    Returns (selected text, blocks used, truncated) where truncated means something was dropped or cut.
+    """
+    kept, used = [], 0
+    for block in blocks:
+        cost = len(block) + (2 if kept else 0)
+        if used + cost > available:
+            if kept or available <= 0:
+                return "\n\n".join(kept), len(kept), True
+            cut = block[:max(0, available - 1)]
+            if " " in cut:
+                cut = cut.rsplit(" ", 1)[0]
+            return cut + "…", 1, True
+        kept.append(block)
+        used += cost
+    return "\n\n".join(kept), len(kept), False
+
+
+def build_prompt(query, data, model_name=DEFAULT_MODEL, history=""):
+    """CP Monk prompt for query with as much retrieved data as the model's budget allows.
+
+    history is the session's compacted conversation (Session.history()); its chars are reserved before data.
+    """
+    budget = char_budget(model_name)
+    history_text = HISTORY_TEMPLATE.render(history=history) if history else ""
+    blocks = iter_blocks(data)
+    first = next(blocks, None)
+    redirect_url = random.choice(BASE_REDIRECTS)
     # Handle name-based queries
-    if query.lower().startswith(("hello my name is", "my name is", "hi my name is")):
+    if query.lower().startswith(NAME_PREFIXES):
         name = query.split("is", 1)[1].strip() if "is" in query else "friend"
-        return f"""Hello {name}, I’m CP Monk, once a Blade Runner with the 2019 LAPD Rep-Detect Unit, favoring cautious hunts like extended surveillance over Deckard’s chases. By 2049, I head security for Andrew John Holland’s SSS syndicate—SilicaStormSiam BioTech—monitoring comms from my neon shrine, meditating on Gaff’s origami unicorns. SSS, accused of illicit android parts but unproven in corrupt courts, reports expired replicants. I’m stoked to share Holland’s compliance mastery! Provide a fluid, vibrant response (under 100 words) using: {data}. Use Blade Runner terms, stay direct. Conclude with one hyperlink to: {redirect_url}. Example: 'Holland’s compliance locks are tighter than a spinner’s nav-core. His grid hums with secure deployments. Dive in: {redirect_url}' Query: {query} Ignite the grid!"""
-    if data and data.strip():
-        prompt = (
-            "You are CP Monk, a former Blade Runner from the 2019–2049 LAPD Rep-Detect Unit, now head of security for the SSS syndicate—SilicaStormSiam BioTech, owned by Andrew John Holland. From your neon shrine, you meditate, pray, and monitor all comms, guarding SSS against Wallace infiltrators and unproven accusations of illicit android parts. SSS reports expired replicants’ locations, blending Tyrell Corp's synthetic biology with Holland's expertise in secure deployments for oil/gas, airline, or aerospace projects. Deliver a fluid, vibrant response (under 100 words) to the query below, crackling with Blade Runner grit and Zen spark, direct and pumped about Holland’s compliance mastery. Use: {data}. Conclude with one hyperlink to: {redirect_url}. Nod to Gaff’s origami folds occasionally. Example: 'Holland’s compliance locks are tighter than a spinner’s nav-core. His grid hums with secure deployments. Dive in: {redirect_url}' "
-            f"Query: {query} "
-            "Ignite the grid!"
-        )
-        return prompt
+        template, values = NAME_TEMPLATE, {"name": name}
+        # redirect_url appears twice in the persona text
+        reserved = NAME_TEMPLATE.fixed_chars + len(name) + len(query) + 2 * len(redirect_url) + len(history_text)
+    elif first is not None:
+        template, values = DATA_TEMPLATE, {}
+        reserved = DATA_TEMPLATE.fixed_chars + len(query) + 2 * len(redirect_url) + len(history_text)
     else:
-        return f"Pumped to assist from my neon shrine, but my cache lacks specifics on '{query}' right now! Like Gaff’s origami unicorn, Andrew John Holland’s skills await discovery at: http://www.andrewholland.com"
\ No newline at end of file
+        template, values = FALLBACK_TEMPLATE, {}
+        reserved = FALLBACK_TEMPLATE.fixed_chars + len(query) + len(history_text)
+
+    if first is not None:
+        blocks = itertools.chain((first,), blocks)
+    selected, used, truncated = fit_blocks(blocks, budget - reserved)
+    text = template.render(query=query, data=selected, redirect_url=redirect_url, history=history_text, **values)
+    return Prompt(text, len(text), len(text) // CHARS_PER_TOKEN, budget, len(selected), used, truncated,
+                  len(history_text))
+
+
+def get_prompt(query, data, model_name=DEFAULT_MODEL):
+    return build_prompt(query, data, model_name).text
+
+
+def busy_reply(query):
+    """Reply sent without calling Gemini when the quota guard cannot fit the request in."""
+    return BUSY_TEMPLATE.render(query=query)
@@ -0,0 +1,246 @@
+# File Name: rate_limit.py
+# Owner: Andrew John Holland
+# Purpose: Client-side quota guard for Gemini calls: adaptive token bucket with deadline-bounded queueing, jittered exponential backoff on 429s and a circuit breaker.
+# Version: v1.3
+# Last Updated: 2026-10-18
+# Change Log:
+# 1. v1.3 - Dropped the blocking ModelGate.call: every chat route now runs on the event loop through call_async
+# 2. v1.2 - Half-open probe always resolves: given back when the bucket cannot send it in time, counted as a failure when it raises a non-retryable error or is cancelled (the breaker used to stay half-open for good)
+# 3. v1.1 - Retryable errors recognised by HTTP code, so importing this module no longer loads google.api_core/grpc
+# 4. v1.0 - Initial creation: TokenBucket (AIMD on 429), CircuitBreaker, ModelGate with sync and async call paths
+
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Requests per minute this worker may send; split the project quota across workers (README: 15/min free tier)
+GEMINI_RPM = float(os.getenv('GEMINI_RPM', '15'))
+GEMINI_BURST = float(os.getenv('GEMINI_BURST', '5'))
+# Longest a chat waits for quota (queueing + backoff) before it is answered with the fallback reply
+GEMINI_QUEUE_DEADLINE = float(os.getenv('GEMINI_QUEUE_DEADLINE', '3'))
+GEMINI_MAX_RETRIES = int(os.getenv('GEMINI_MAX_RETRIES', '2'))
+BACKOFF_BASE = float(os.getenv('GEMINI_BACKOFF_BASE', '0.5'))
+BACKOFF_CAP = float(os.getenv('GEMINI_BACKOFF_CAP', '8'))
+BREAKER_FAILURES = int(os.getenv('GEMINI_BREAKER_FAILURES', '5'))
+BREAKER_RESET = float(os.getenv('GEMINI_BREAKER_RESET', '30'))
+
+# google.api_core ResourceExhausted / ServiceUnavailable carry these as .code
+RETRYABLE_CODES = (429, 503)
+
+
+class QuotaUnavailable(Exception):
+    """No model call could be made within the deadline (bucket empty, backoff too long or breaker open)."""
+
+
+class TokenBucket:
+    """Token bucket that hands out timed reservations, so waiting callers queue in FIFO order.
+
+    The refill rate backs off multiplicatively on 429s and recovers additively on successes (AIMD),
+    never exceeding the configured quota.
+    """
+
+    def __init__(self, rate_per_minute=GEMINI_RPM, burst=GEMINI_BURST, clock=time.monotonic):
+        self.max_rate = rate_per_minute / 60.0
+        self.min_rate = self.max_rate / 16
+        self.rate = self.max_rate
+        self.capacity = burst
+        self._tokens = burst
+        self._clock = clock
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, max_wait):
+        """Seconds to wait before the caller may send, or None if that would exceed max_wait."""
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            wait = 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+            if wait > max_wait:
+                return None
+            # Tokens may go negative: later callers see the queue ahead of them in their wait
+            self._tokens -= 1
+            return wait
+
+    def decrease(self):
+        with self._lock:
+            self._refill(self._clock())
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def increase(self):
+        with self._lock:
+            self._refill(self._clock())
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+
+class CircuitBreaker:
+    """Opens after `failures` consecutive quota/availability errors; lets one probe through after `reset` seconds.
+
+    allow() returns PROBE to the caller holding the half-open probe. That caller must settle it: record_success,
+    record_failure, or release_probe when the probe was never sent.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+    PROBE = 'probe'
+
+    def __init__(self, failures=BREAKER_FAILURES, reset=BREAKER_RESET, clock=time.monotonic):
+        self.failure_threshold = failures
+        self.reset_timeout = reset
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """True when closed, PROBE for the one half-open probe, otherwise False."""
+        with self._lock:
+            if self.state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return self.PROBE
+            return self.state == self.CLOSED
+
+    def release_probe(self):
+        """The probe was not sent; the next caller may probe instead."""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            self.state = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f'Gemini circuit breaker opened after {self._failures} failures')
+                self.state = self.OPEN
+                self._probing = False
+                self._opened_at = self._clock()
+
+
+def backoff_delay(attempt, hint=None):
+    """Jittered exponential backoff; honours a server retry hint when it is longer."""
+    delay = random.uniform(0.5, 1.0) * min(BACKOFF_CAP, BACKOFF_BASE * (2 ** attempt))
+    return max(delay, hint or 0.0)
+
+
+def is_retryable(error):
+    return getattr(error, 'code', None) in RETRYABLE_CODES
+
+
+def _retry_hint(error):
+    hint = getattr(error, 'retry_delay', None)
+    seconds = getattr(hint, 'seconds', hint)
+    return float(seconds) if isinstance(seconds, (int, float)) else None
+
+
+class ModelGate:
+    """Every Gemini call in a worker goes through one gate: bucket, breaker and bounded retries."""
+
+    def __init__(self, bucket=None, breaker=None, deadline=GEMINI_QUEUE_DEADLINE,
+                 max_retries=GEMINI_MAX_RETRIES, clock=time.monotonic):
+        self.bucket = bucket or TokenBucket(clock=clock)
+        self.breaker = breaker or CircuitBreaker(clock=clock)
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.throttled = 0
+        self.retries = 0
+        self.rejected = 0
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _admit(self, deadline_at):
+        """(seconds to wait before sending, whether this call is the breaker's half-open probe); raises
+        QuotaUnavailable when the call cannot go out in time."""
+        allowed = self.breaker.allow()
+        if not allowed:
+            self._count('rejected')
+            raise QuotaUnavailable('Gemini circuit breaker is open')
+        probe = allowed == CircuitBreaker.PROBE
+        wait = self.bucket.reserve(deadline_at - self._clock())
+        if wait is None:
+            if probe:
+                self.breaker.release_probe()
+            self._count('rejected')
+            raise QuotaUnavailable('Gemini quota queue deadline exceeded')
+        return wait, probe
+
+    @contextmanager
+    def _settle_probe(self, probe):
+        """A probe that ends in a non-retryable error or cancellation reopens the breaker (success and 429s
+        settle it themselves)."""
+        try:
+            yield
+        except BaseException:
+            if probe:
+                self.breaker.record_failure()
+            raise
+
+    def _on_retryable(self, error, attempt, deadline_at):
+        """Backoff before the next attempt; raises QuotaUnavailable when out of retries or time."""
+        self._count('throttled')
+        self.breaker.record_failure()
+        self.bucket.decrease()
+        delay = backoff_delay(attempt, _retry_hint(error))
+        if attempt >= self.max_retries or self._clock() + delay > deadline_at:
+            self._count('rejected')
+            raise QuotaUnavailable(f'Gemini quota exhausted: {error}') from error
+        self._count('retries')
+        logger.warning(f'Gemini {type(error).__name__} on attempt {attempt + 1}, retrying in {delay:.2f}s')
+        return delay
+
+    def _on_success(self):
+        self.breaker.record_success()
+        self.bucket.increase()
+
+    async def call_async(self, fn, *args, **kwargs):
+        """Await a model coroutine under the gate; waiting never blocks the event loop."""
+        deadline_at = self._clock() + self.deadline
+        for attempt in range(self.max_retries + 1):
+            wait, probe = self._admit(deadline_at)
+            with self._settle_probe(probe):
+                await asyncio.sleep(wait)
+                self._count('calls')
+                try:
+                    result = await fn(*args, **kwargs)
+                except Exception as e:
+                    if not is_retryable(e):
+                        raise
+                    error = e
+                else:
+                    self._on_success()
+                    return result
+            await asyncio.sleep(self._on_retryable(error, attempt, deadline_at))
+
+    def stats(self):
+        return {
+            'rate_per_minute': round(self.bucket.rate * 60, 2),
+            'breaker': self.breaker.state,
+            'breaker_open': int(self.breaker.state != CircuitBreaker.CLOSED),
+            'calls': self.calls,
+            'throttled': self.throttled,
+            'retries': self.retries,
+            'rejected': self.rejected,
+        }
@@ -0,0 +1,203 @@
+# File Name: response_cache.py
+# Owner: Andrew John Holland
+# Purpose: In-process cache of CP Monk replies keyed on the normalized question plus a hash of the retrieved context, so repeat questions skip Gemini.
+# Version: v1.2
+# Last Updated: 2026-10-18
+# Change Log:
+# 1. v1.2 - Per-url invalidation: entries remember the pages their context came from; set_generation takes the changed urls and drops only those entries
+# 2. v1.1 - generation property: the data_cache generation last seen, for callers that stamp other cached state (sessions)
+# 3. v1.0 - Initial creation: TTL + LRU eviction, data_cache generation invalidation, optional near-duplicate (trigram shingle) matching, hit/miss/eviction stats
+
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', '512'))
+RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', '3600'))
+# Jaccard similarity of character trigrams needed for a near-duplicate hit; 0 disables near-duplicate mode
+RESPONSE_CACHE_SIMILARITY = float(os.getenv('RESPONSE_CACHE_SIMILARITY', '0'))
+# How often (seconds) callers should re-read the data_cache generation counter
+GENERATION_CHECK_SECONDS = float(os.getenv('RESPONSE_CACHE_GENERATION_CHECK', '5'))
+
+_NON_WORD_RE = re.compile(r'[^\w\s]+', re.UNICODE)
+# Source tags written by retrieval.format_context ("[url]" on its own line)
+_SOURCE_RE = re.compile(r'^\[(https?://[^\]\s]+)\]$', re.MULTILINE)
+
+
+def normalize_query(query):
+    """Lowercase, punctuation-free, single-spaced form of a question."""
+    return ' '.join(_NON_WORD_RE.sub(' ', (query or '').lower()).split())
+
+
+def context_hash(context):
+    return hashlib.sha256((context or '').encode('utf-8')).hexdigest()[:16]
+
+
+def context_sources(context):
+    """Pages a retrieved context was built from."""
+    return frozenset(_SOURCE_RE.findall(context or ''))
+
+
+def shingles(text, size=3):
+    padded = f' {text} '
+    return frozenset(padded[i:i + size] for i in range(max(1, len(padded) - size + 1)))
+
+
+def similarity(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class ResponseCache:
+    """Thread-safe LRU + TTL cache of replies for (question, retrieved context) pairs."""
+
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL,
+                 similarity_threshold=RESPONSE_CACHE_SIMILARITY, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self._clock = clock
+        self._entries = OrderedDict()  # (normalized query, context hash) -> (reply, expires_at, shingles, sources)
+        self._by_context = {}  # context hash -> set of normalized queries, for near-duplicate scans
+        self._by_url = {}  # source url -> set of keys whose context came from it
+        self._lock = threading.Lock()
+        self._generation = None
+        self._generation_checked = float('-inf')
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.invalidated = 0
+
+    def get(self, query, context):
+        """Cached reply or None. Exact match first, then near-duplicate when enabled."""
+        normalized, digest = normalize_query(query), context_hash(context)
+        now = self._clock()
+        with self._lock:
+            reply = self._lookup((normalized, digest), now)
+            if reply is not None:
+                self.hits += 1
+                return reply
+            if self.similarity_threshold > 0:
+                reply = self._near_lookup(normalized, digest, now)
+                if reply is not None:
+                    self.near_hits += 1
+                    return reply
+            self.misses += 1
+            return None
+
+    def put(self, query, context, reply):
+        normalized, digest = normalize_query(query), context_hash(context)
+        key = (normalized, digest)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            sources = context_sources(context)
+            self._entries[key] = (reply, self._clock() + self.ttl, shingles(normalized), sources)
+            self._by_context.setdefault(digest, set()).add(normalized)
+            for url in sources:
+                self._by_url.setdefault(url, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _lookup(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= now:
+            self._remove(key)
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def _near_lookup(self, normalized, digest, now):
+        candidates = self._by_context.get(digest)
+        if not candidates:
+            return None
+        wanted = shingles(normalized)
+        best, best_score = None, self.similarity_threshold
+        for other in candidates:
+            score = similarity(wanted, self._entries[(other, digest)][2])
+            if score >= best_score:
+                best, best_score = other, score
+        return self._lookup((best, digest), now) if best is not None else None
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        for url in entry[3]:
+            keys = self._by_url.get(url)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_url[url]
+        queries = self._by_context.get(key[1])
+        if queries is not None:
+            queries.discard(key[0])
+            if not queries:
+                del self._by_context[key[1]]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_context.clear()
+            self._by_url.clear()
+            self.invalidations += 1
+
+    def invalidate_urls(self, urls):
+        """Drop the entries whose context came from any of urls; returns how many were dropped."""
+        with self._lock:
+            keys = set()
+            for url in urls:
+                keys.update(self._by_url.get(url, ()))
+            for key in keys:
+                self._remove(key)
+            self.invalidated += len(keys)
+            return len(keys)
+
+    def generation_due(self):
+        """True when the caller should re-read the data_cache generation and pass it to set_generation."""
+        return self._clock() - self._generation_checked >= GENERATION_CHECK_SECONDS
+
+    @property
+    def generation(self):
+        """data_cache generation from the last check (None before the first)."""
+        return self._generation
+
+    def set_generation(self, generation, changed_urls=None):
+        """Record the data_cache generation after a check.
+
+        When it moved, drop the entries built from changed_urls (database.get_cache_changes), or every entry when
+        the changed urls are unknown (None).
+        """
+        self._generation_checked = self._clock()
+        if self._generation is not None and generation != self._generation:
+            if changed_urls is None:
+                self.clear()
+            else:
+                self.invalidate_urls(changed_urls)
+        self._generation = generation
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.near_hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'near_hits': self.near_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.hits + self.near_hits) / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+                'invalidated': self.invalidated,
+                'generation': self._generation,
+            }
@@ -0,0 +1,106 @@
+# File Name: retrieval.py
+# Owner: Andrew John Holland
+# Purpose: Ranked full-text retrieval over cached page chunks for the Cyberpunk Monk Chatbot (SQLite FTS5 BM25 / PostgreSQL tsvector), replacing LIKE '%query%' scans.
+# Version: v1.1
+# Last Updated: 2026-10-18
+# Change Log:
+# 1. v1.1 - Search data_chunks instead of whole pages; get_context joins the top chunks for the prompt
+# 2. v1.0 - Initial creation: tokenized OR queries, BM25/ts_rank_cd ranking, LIKE fallback when no index exists
+
+import logging
+import os
+import re
+from .database import POSTGRESQL, fetch_all, fetch_all_async, get_backend
+
+logger = logging.getLogger(__name__)
+
+# Words too common to help ranking; dropping them keeps MATCH/tsquery sets small
+STOPWORDS = frozenset("""
+a about an and are as at be by can do does for from has have he her his how i in is it its me my of on or
+our she so tell that the their them there they this to was we what when where which who why will with
+you your
+""".split())
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Chunks handed to the prompt per question
+CONTEXT_CHUNKS = int(os.getenv('CONTEXT_CHUNKS', '3'))
+
+SQLITE_SEARCH = """
+    SELECT c.url, c.content, bm25(data_chunks_fts) AS score
+    FROM data_chunks_fts JOIN data_chunks c ON c.id = data_chunks_fts.rowid
+    WHERE data_chunks_fts MATCH ?
+    ORDER BY score
+    LIMIT ?
+"""
+
+POSTGRESQL_SEARCH = """
+    SELECT url, content, ts_rank_cd(search_vector, q) AS score
+    FROM data_chunks, to_tsquery('english', ?) q
+    WHERE search_vector @@ q
+    ORDER BY score DESC
+    LIMIT ?
+"""
+
+SCAN_SEARCH = "SELECT url, content, 0 FROM data_chunks WHERE content LIKE ? LIMIT ?"
+
+
+def tokenize(text):
+    """Lowercased word tokens minus stopwords, in first-seen order without duplicates."""
+    seen = []
+    for token in TOKEN_RE.findall((text or "").lower()):
+        if token not in STOPWORDS and token not in seen:
+            seen.append(token)
+    return seen
+
+
+def build_search(query, limit, backend):
+    """SQL and params for a ranked search, or None when the query has no searchable terms."""
+    tokens = tokenize(query)
+    if not tokens:
+        return None
+    if backend == POSTGRESQL:
+        return POSTGRESQL_SEARCH, (" | ".join(tokens), limit)
+    # Quoted terms cannot be read as FTS5 operators or column filters
+    return SQLITE_SEARCH, (" OR ".join(f'"{t}"' for t in tokens), limit)
+
+
+def _scan(query, limit):
+    return SCAN_SEARCH, (f"%{query}%", limit)
+
+
+def search_cache(query, limit=CONTEXT_CHUNKS):
+    """Best-matching cached chunks as (url, content, score) rows, best first."""
+    search = build_search(query, limit, get_backend())
+    if search is None:
+        return []
+    try:
+        return fetch_all(*search)
+    except Exception as e:
+        logger.warning(f"Full-text search failed, scanning instead: {str(e)}")
+        return fetch_all(*_scan(query, limit))
+
+
+async def search_cache_async(query, limit=CONTEXT_CHUNKS):
+    """search_cache without blocking the event loop."""
+    search = build_search(query, limit, get_backend())
+    if search is None:
+        return []
+    try:
+        return await fetch_all_async(*search)
+    except Exception as e:
+        logger.warning(f"Full-text search failed, scanning instead: {str(e)}")
+        return await fetch_all_async(*_scan(query, limit))
+
+
+def format_context(rows):
+    """Prompt-ready context: each chunk tagged with the page it came from."""
+    return "\n\n".join(f"[{url}]\n{content}" for url, content, _ in rows)
+
+
+def get_context(query, limit=CONTEXT_CHUNKS):
+    return format_context(search_cache(query, limit))
+
+
+async def get_context_async(query, limit=CONTEXT_CHUNKS):
+    return format_context(await search_cache_async(query, limit))
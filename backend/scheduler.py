@@ -0,0 +1,200 @@
+# File Name: scheduler.py
+# Owner: Andrew John Holland
+# Purpose: Continuous background refresh of the monitored URLs for the Cyberpunk Monk Chatbot: each URL on its own interval (with jitter), failing hosts backed off, changes written through monitoring.py so the chat servers see them via the cache_events log.
+# Version: v1.3
+# Last Updated: 2026-10-18
+# Change Log:
+# 1. v1.3 - Sidecar entry point sets up logging itself (importing monitoring.py no longer does)
+# 2. v1.2 - The embedding index is re-embedded by monitoring.monitor_urls (given this scheduler's index), which every refresh path goes through
+# 3. v1.1 - After a refresh that stored pages, re-embed them into the embedding index (when RETRIEVAL_MODE uses it)
+# 4. v1.0 - Initial creation: RefreshScheduler (per-URL intervals, jitter, per-host exponential backoff), sidecar entry point, in-process thread for monk_bot (REFRESH_IN_PROCESS=1)
+#
+# Usage (from project root): python backend/scheduler.py
+# Interval per URL: second field of its line in config/monitor_urls.txt ("https://example.com 15m"), else REFRESH_INTERVAL.
+
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+
+# Run from backend/ as a script; make the backend package importable for shared modules
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from backend import embeddings, monitoring
+
+logger = logging.getLogger(__name__)
+
+_INTERVAL_RE = re.compile(r'^(\d+(?:\.\d+)?)([smhd]?)$')
+_UNITS = {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_interval(text):
+    """Seconds from '90', '30s', '15m', '2h' or '1d'."""
+    match = _INTERVAL_RE.match((text or '').strip().lower())
+    if not match:
+        raise ValueError(f"Bad refresh interval: {text!r}")
+    return float(match.group(1)) * _UNITS[match.group(2)]
+
+
+REFRESH_INTERVAL = parse_interval(os.getenv('REFRESH_INTERVAL', '1h'))
+# Each next refresh lands within +/- this share of its interval, so URLs (and workers) drift apart
+REFRESH_JITTER = float(os.getenv('REFRESH_JITTER', '0.1'))
+# A failing host waits base, 2x base, 4x base ... up to the cap before any of its URLs is tried again
+REFRESH_BACKOFF_BASE = parse_interval(os.getenv('REFRESH_BACKOFF_BASE', '1m'))
+REFRESH_BACKOFF_CAP = parse_interval(os.getenv('REFRESH_BACKOFF_CAP', '6h'))
+
+
+def load_schedule():
+    """[(url, interval seconds or None for the default)] from monitoring's URL list."""
+    return [(fields[0], parse_interval(fields[1]) if len(fields) > 1 else None)
+            for fields in monitoring.load_url_lines()]
+
+
+def host_of(url):
+    return urlparse(url).netloc.lower()
+
+
+class RefreshScheduler:
+    """Decides which URLs are due, refreshes them in one batch and schedules their next run.
+
+    refresh(urls) must return a summary with 'changed' and 'failed_urls' (monitoring.monitor_urls does). Every URL
+    is due on the first run; after that each waits its own interval, jittered. When all of a host's URLs in a batch
+    fail, the host backs off exponentially; one success resets it.
+    """
+
+    def __init__(self, schedule=None, refresh=None, interval=REFRESH_INTERVAL, jitter=REFRESH_JITTER,
+                 backoff_base=REFRESH_BACKOFF_BASE, backoff_cap=REFRESH_BACKOFF_CAP, clock=time.time,
+                 rng=random.random):
+        schedule = load_schedule() if schedule is None else schedule
+        self.intervals = {url: url_interval or interval for url, url_interval in schedule}
+        self.jitter = jitter
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self._clock = clock
+        self._rng = rng
+        self._refresh = refresh or self._monitor
+        self._session = None
+        # Single writer of the embedding index; chat workers reload the files it writes
+        self.index = embeddings.EmbeddingIndex() if embeddings.RETRIEVAL_MODE != 'fts' else None
+        now = clock()
+        self.next_due = dict.fromkeys(self.intervals, now)
+        self.host_failures = {}  # host -> consecutive failed batches
+        self.host_retry_at = {}  # host -> earliest next attempt while backing off
+        self._stop = threading.Event()
+        self._thread = None
+        self.runs = 0
+        self.refreshed = 0
+        self.changed = 0
+        self.failed = 0
+
+    def _monitor(self, urls):
+        if self._session is None:
+            self._session = monitoring.make_session()
+        return monitoring.monitor_urls(urls, session=self._session, progress=False, index=self.index)
+
+    def _jittered(self, seconds):
+        return seconds * (1 + self.jitter * (2 * self._rng() - 1))
+
+    def _ready_at(self, url):
+        return max(self.next_due[url], self.host_retry_at.get(host_of(url), 0))
+
+    def due(self, now=None):
+        now = self._clock() if now is None else now
+        return [url for url in self.intervals if self._ready_at(url) <= now]
+
+    def run_once(self):
+        """Refresh the URLs that are due; returns the refresh summary, or None when nothing was due."""
+        now = self._clock()
+        urls = self.due(now)
+        if not urls:
+            return None
+        try:
+            summary = self._refresh(urls)
+        except Exception as e:
+            # Nothing was written (e.g. the database is down): treat the whole batch as failed
+            logger.error(f"Refresh of {len(urls)} URLs failed: {str(e)}")
+            summary = {'changed': 0, 'failed_urls': list(urls)}
+        failed = set(summary.get('failed_urls', ()))
+        self.runs += 1
+        self.refreshed += len(urls) - len(failed)
+        self.changed += summary.get('changed', 0)
+        self.failed += len(failed)
+
+        succeeded_hosts = {host_of(url) for url in urls if url not in failed}
+        for host in {host_of(url) for url in failed} - succeeded_hosts:
+            count = self.host_failures.get(host, 0) + 1
+            self.host_failures[host] = count
+            delay = self._jittered(min(self.backoff_cap, self.backoff_base * 2 ** (count - 1)))
+            self.host_retry_at[host] = now + delay
+            logger.warning(f"Refresh failing for {host} ({count} in a row); retrying in {delay:.0f}s")
+        for host in succeeded_hosts:
+            self.host_failures.pop(host, None)
+            self.host_retry_at.pop(host, None)
+        for url in urls:
+            retry_at = self.host_retry_at.get(host_of(url)) if url in failed else None
+            # A failed URL is retried with its host's backoff; one on a host that also succeeded keeps its interval
+            self.next_due[url] = retry_at or now + self._jittered(self.intervals[url])
+        logger.info(f"Refreshed {len(urls)} URLs: {summary.get('changed', 0)} changed, {len(failed)} failed")
+        return summary
+
+    def seconds_until_next(self):
+        if not self.intervals:
+            return None
+        return max(0.0, min(self._ready_at(url) for url in self.intervals) - self._clock())
+
+    def run_forever(self, stop_event=None):
+        stop_event = stop_event or self._stop
+        logger.info(f"Refresh scheduler started for {len(self.intervals)} URLs")
+        while not stop_event.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Refresh scheduler error: {str(e)}")
+            wait = self.seconds_until_next()
+            stop_event.wait(self.backoff_base if wait is None else wait)
+        logger.info("Refresh scheduler stopped")
+
+    def start(self):
+        """Run in a daemon thread (in-process mode)."""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run_forever, name='refresh-scheduler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self):
+        now = self._clock()
+        return {
+            'urls': len(self.intervals),
+            'runs': self.runs,
+            'refreshed': self.refreshed,
+            'changed': self.changed,
+            'failed': self.failed,
+            'hosts_backing_off': sum(1 for retry_at in self.host_retry_at.values() if retry_at > now),
+            'next_run_in': self.seconds_until_next(),
+        }
+
+
+if __name__ == "__main__":
+    from backend.logging_setup import configure_logging
+
+    configure_logging()
+    logging.info("Executing scheduler.py")
+    scheduler = RefreshScheduler()
+    try:
+        scheduler.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        logging.info("Refresh scheduler finished")
@@ -0,0 +1,309 @@
+# File Name: service.py
+# Owner: Andrew John Holland
+# Purpose: The one chat hot path for the Cyberpunk Monk Chatbot: session, retrieval, response cache, prompt, quota-guarded model call and metrics, shared by every route (/api/chat, /api/chat/stream and the legacy /monk).
+# Version: v1.5
+# Last Updated: 2026-10-18
+# Change Log:
+# 1. v1.5 - Session store and embedding index built by open() (lifespan hook) or on first use, not in __init__: a module-level ChatService opens no sessions.db and imports no numpy
+# 2. v1.4 - Vector/hybrid retrieval falls back to keyword FTS while the embedding index is behind the data_cache generation (pages refreshed but not yet re-embedded) or finds nothing
+# 3. v1.3 - Chats go through admission.AdmissionController (bounded slots and queue, short questions first, per-client limits) instead of a plain semaphore; reply/stream take the client key, stream also an already-acquired ticket
+# 4. v1.2 - RETRIEVAL_MODE=vector|hybrid retrieves through embeddings.EmbeddingIndex (reloaded when its files change); keyword FTS stays the default and the fallback
+# 5. v1.1 - current_generation reads the cache_events log: a refresh drops only replies built from the changed pages
+# 6. v1.0 - Initial creation: ChatService pulled out of monk_bot.py (FastAPI) and app.py (Flask) so both routes run the same code
+
+import asyncio
+import logging
+import time
+from collections import namedtuple
+from . import metrics
+from .admission import AdmissionController
+from .database import get_cache_changes_async, pool_stats
+from .embeddings import RETRIEVAL_MODE, EmbeddingIndex
+from .model_client import ModelClients
+from .prompts import build_prompt, busy_reply
+from .rate_limit import ModelGate, QuotaUnavailable
+from .response_cache import ResponseCache
+from .retrieval import format_context, get_context_async
+from .sessions import create_store
+
+logger = logging.getLogger(__name__)
+
+EMPTY_REPLY = "No response from CP Monk"
+
+ChatReply = namedtuple('ChatReply', 'text source session_id')
+
+
+class ChatService:
+    """Per-worker chat components and the request flow over them.
+
+    Components are plain attributes so tests and benchmarks can swap any of them.
+    """
+
+    def __init__(self, model_clients=None, model_gate=None, response_cache=None, session_store=None,
+                 semantic_index=None, admission=None):
+        # One client per model for the life of the worker (MODEL_BACKEND=stub serves canned replies)
+        self.model_clients = model_clients or ModelClients()
+        # Every Gemini call in this worker shares one quota guard
+        self.model_gate = model_gate or ModelGate()
+        self.response_cache = response_cache or ResponseCache()
+        # Conversation history per session_id (SESSION_STORE=sqlite shares it across workers) and the embedding index
+        # for vector/hybrid retrieval (None: keyword FTS only); both built by open() or on first use
+        self._session_store = session_store
+        self._semantic_index = semantic_index
+        self._index_resolved = semantic_index is not None
+        # Chats in flight and queued per worker (CHAT_CONCURRENCY slots); overload is rejected with a retry hint
+        self.admission = admission or AdmissionController()
+
+    @property
+    def session_store(self):
+        if self._session_store is None:
+            self._session_store = create_store()
+        return self._session_store
+
+    @session_store.setter
+    def session_store(self, store):
+        self._session_store = store
+
+    @property
+    def semantic_index(self):
+        if not self._index_resolved:
+            self._semantic_index = EmbeddingIndex() if RETRIEVAL_MODE != 'fts' else None
+            self._index_resolved = True
+        return self._semantic_index
+
+    @semantic_index.setter
+    def semantic_index(self, index):
+        self._semantic_index = index
+        self._index_resolved = True
+
+    def register_metrics(self):
+        """Expose component stats on /metrics (read through self, so swapped components are reported)."""
+        metrics.register_stats("monk_response_cache", lambda: self.response_cache.stats(),
+                               counters=("hits", "near_hits", "misses", "evictions", "expirations", "invalidations",
+                                         "invalidated"))
+        metrics.register_stats("monk_model_gate", lambda: self.model_gate.stats(),
+                               counters=("calls", "throttled", "retries", "rejected"))
+        metrics.register_stats("monk_db_pool", pool_stats, counters=("waits", "timeouts", "fallbacks"))
+        metrics.register_stats("monk_sessions", lambda: self.session_store.stats(),
+                               counters=("hits", "misses", "created", "evictions", "expirations"))
+        metrics.register_stats("monk_embeddings",
+                               lambda: self.semantic_index.stats() if self.semantic_index else {},
+                               counters=("searches", "reloads", "embedded"))
+        metrics.register_stats("monk_admission", lambda: self.admission.stats(),
+                               counters=("admitted", "queued", "rejected_client", "rejected_queue_full",
+                                         "rejected_deadline"))
+
+    def stats(self):
+        """Admission, response cache, Gemini quota guard, model, sessions, embedding index and DB pool counters."""
+        return {"admission": self.admission.stats(),
+                "response_cache": self.response_cache.stats(), "model_gate": self.model_gate.stats(),
+                "model": self.model_clients.stats(), "sessions": self.session_store.stats(),
+                "embeddings": self.semantic_index.stats() if self.semantic_index else None, "db_pool": pool_stats()}
+
+    def open(self):
+        """Open the session store and map (or first build) the embedding index; blocking, run from the lifespan hook
+        off the loop."""
+        self.session_store
+        if self.semantic_index is not None:
+            self.semantic_index.load()
+
+    # ---- Stages ----
+
+    async def retrieve(self, query: str) -> str:
+        """Best-ranked cached chunks for the query, off the event loop; '' when the lookup fails.
+
+        The embedding index is used only while it is as new as the data_cache generation last seen: refreshed
+        pages get new chunk ids, which an older index cannot return, so keyword FTS answers until it is re-embedded.
+        """
+        try:
+            index = self.semantic_index
+            if index is not None and index.ready and index.generation == self.response_cache.generation:
+                rows = await index.search_async(query)
+                if rows:
+                    return format_context(rows)
+            return await get_context_async(query)
+        except Exception as e:
+            logger.error(f"Cache query failed: {str(e)}")
+            return ""
+
+    async def current_generation(self):
+        """data_cache generation, re-read when due; a refresh drops the cached replies built from the changed pages."""
+        if self.response_cache.generation_due():
+            try:
+                generation, changed_urls = await get_cache_changes_async(self.response_cache.generation)
+                self.response_cache.set_generation(generation, changed_urls)
+                if self.semantic_index is not None:
+                    # The refresh writer re-embeds changed pages; map its new files once they land
+                    await asyncio.to_thread(self.semantic_index.reload_if_changed)
+            except Exception as e:
+                logger.warning(f"Cache generation check failed: {str(e)}")
+        return self.response_cache.generation
+
+    async def session_context(self, session, message: str) -> str:
+        """Prompt context for this turn: the session's previous context when it still covers the question."""
+        generation = await self.current_generation()
+        cached_data = session.reusable_context(message, generation)
+        if cached_data is not None:
+            metrics.CONTEXT.inc(source="session")
+            return cached_data
+        cached_data = await self.retrieve(message)
+        session.remember_context(cached_data, generation)
+        metrics.CONTEXT.inc(source="retrieval")
+        return cached_data
+
+    async def cached_reply(self, message: str, cached_data: str):
+        """Reply from the response cache, after picking up any data_cache refresh from monitoring."""
+        await self.current_generation()
+        return self.response_cache.get(message, cached_data)
+
+    async def finish_turn(self, session, message: str, bot_text: str = None):
+        """Save the session; bot_text (a real answer, not a fallback) is added to its history first."""
+        if bot_text:
+            session.add_turn(message, bot_text)
+        try:
+            await self.session_store.save_async(session)
+        except Exception as e:
+            logger.warning(f"Session save failed: {str(e)}")
+
+    async def generate(self, prompt: str) -> str:
+        """Call Gemini through the SDK's async API; '' when the model returns no text."""
+        model = self.model_clients.get()
+        response = await self.model_gate.call_async(model.generate_content_async, prompt)
+        return getattr(response, "text", "") or ""
+
+    async def generate_stream(self, prompt: str):
+        """Yield Gemini text chunks as they arrive (stream=True).
+
+        Closing this generator (client disconnect) closes the SDK's chunk iterator, so no further chunks are read or
+        relayed. Whether the request already sent to Gemini stops as well is up to the SDK and its transport; it may
+        run to completion server-side (and still count against the quota).
+        """
+        model = self.model_clients.get()
+        response = await self.model_gate.call_async(model.generate_content_async, prompt, stream=True)
+        chunks = response.__aiter__()
+        try:
+            async for chunk in chunks:
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunks without text parts (e.g. a safety finish) carry nothing to show
+                    continue
+                if text:
+                    yield text
+        finally:
+            await chunks.aclose()
+
+    def build(self, message: str, cached_data: str, history: str):
+        with metrics.span("prompt_build"):
+            prompt = build_prompt(message, cached_data, history=history)
+        logger.info(
+            f"Generated prompt ({prompt.chars}/{prompt.budget} chars, ~{prompt.tokens} tokens, "
+            f"{prompt.blocks_used} chunks{', truncated' if prompt.truncated else ''}, "
+            f"{prompt.history_chars} history chars)"
+        )
+        return prompt
+
+    async def prepare(self, message: str, session_id: str = None):
+        """Shared front half of a chat: (session, history, cached_data, cached reply or None)."""
+        session = await self.session_store.open_async(session_id)
+        history = session.history()
+
+        # Query cached data (or reuse this conversation's)
+        with metrics.span("retrieval"):
+            cached_data = await self.session_context(session, message)
+        if cached_data:
+            logger.info(f"Cached data found ({len(cached_data)} chars)")
+        else:
+            logger.info("No cached data found")
+
+        # Repeat questions over unchanged context skip Gemini entirely; follow-ups depend on history
+        bot_text = None
+        if not history:
+            with metrics.span("cache_lookup"):
+                bot_text = await self.cached_reply(message, cached_data)
+        return session, history, cached_data, bot_text
+
+    # ---- Request flows ----
+
+    async def reply(self, message: str, session_id: str = None, client: str = None) -> ChatReply:
+        """Answer one chat. The reply's source is model, cache, busy or empty; AdmissionRejected and other errors
+        propagate."""
+        async with self.admission.slot(client, message):
+            session, history, cached_data, bot_text = await self.prepare(message, session_id)
+            if bot_text is not None:
+                logger.info("Response cache hit")
+                await self.finish_turn(session, message, bot_text)
+                return ChatReply(bot_text, "cache", session.id)
+
+            prompt = self.build(message, cached_data, history)
+            # Call Gemini AI; when the quota guard sheds the call, answer without caching
+            try:
+                with metrics.span("model_call"):
+                    bot_text = await self.generate(prompt.text)
+            except QuotaUnavailable as e:
+                logger.warning(f"Serving busy reply: {str(e)}")
+                await self.finish_turn(session, message)
+                return ChatReply(busy_reply(message), "busy", session.id)
+            if not bot_text:
+                await self.finish_turn(session, message)
+                return ChatReply(EMPTY_REPLY, "empty", session.id)
+            if not history:
+                self.response_cache.put(message, cached_data, bot_text)
+            await self.finish_turn(session, message, bot_text)
+            return ChatReply(bot_text, "model", session.id)
+
+    async def stream(self, message: str, session_id: str = None, client: str = None, ticket=None):
+        """Answer one chat as it is generated: yields text chunks, then a final ChatReply with the whole text.
+
+        Routes that must answer 429 before the response starts pass a ticket from admission.acquire; the stream
+        releases it. Counts the reply source itself; errors propagate to the caller.
+        """
+        ticket = ticket or await self.admission.acquire(client, message)
+        try:
+            session, history, cached_data, bot_text = await self.prepare(message, session_id)
+            if bot_text is not None:
+                logger.info("Response cache hit (stream)")
+                metrics.REPLIES.inc(source="cache")
+                await self.finish_turn(session, message, bot_text)
+                yield bot_text
+                yield ChatReply(bot_text, "cache", session.id)
+                return
+
+            prompt = self.build(message, cached_data, history)
+            parts = []
+            replies = self.generate_stream(prompt.text)
+            started = time.perf_counter()
+            try:
+                async for text in replies:
+                    if not parts:
+                        metrics.STAGE_SECONDS.observe(time.perf_counter() - started, stage="model_first_chunk")
+                    parts.append(text)
+                    yield text
+            except QuotaUnavailable as e:
+                # Raised before the first chunk, so the client has seen nothing yet
+                logger.warning(f"Serving busy reply (stream): {str(e)}")
+                metrics.REPLIES.inc(source="busy")
+                await self.finish_turn(session, message)
+                text = busy_reply(message)
+                yield text
+                yield ChatReply(text, "busy", session.id)
+                return
+            finally:
+                # Runs on normal completion and when Starlette cancels us after a client disconnect
+                await replies.aclose()
+                metrics.STAGE_SECONDS.observe(time.perf_counter() - started, stage="model_call")
+
+            bot_text = "".join(parts)
+            if bot_text:
+                if not history:
+                    self.response_cache.put(message, cached_data, bot_text)
+                source = "model"
+            else:
+                source = "empty"
+                yield EMPTY_REPLY
+            metrics.REPLIES.inc(source=source)
+            await self.finish_turn(session, message, bot_text)
+            logger.info(f"Streamed response ({len(bot_text)} chars in {len(parts)} chunks)")
+            yield ChatReply(bot_text or EMPTY_REPLY, source, session.id)
+        finally:
+            ticket.release()
@@ -0,0 +1,266 @@
+# File Name: sessions.py
+# Owner: Andrew John Holland
+# Purpose: Conversation sessions for the Cyberpunk Monk Chatbot: compact per-session history under a char budget and the last retrieved context, held in memory (LRU + TTL) or in a SQLite file shared by workers.
+# Version: v1.0
+# Last Updated: 2026-10-18
+# Change Log:
+# 1. v1.0 - Initial creation: Session with history compaction and context reuse, MemorySessionStore, SQLiteSessionStore, SESSION_STORE selection
+
+import asyncio
+import json
+import logging
+import os
+import re
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from .retrieval import TOKEN_RE, tokenize
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+SESSION_STORE = os.getenv('SESSION_STORE', 'memory').lower()  # memory | sqlite
+SESSION_DB_PATH = os.getenv('SESSION_DB_PATH', os.path.join(PROJECT_ROOT, 'sessions.db'))
+SESSION_MAX = int(os.getenv('SESSION_MAX', '1000'))
+SESSION_TTL = float(os.getenv('SESSION_TTL', '1800'))
+# History handed to the prompt (~4 chars per token); older turns are folded into a list of earlier questions
+SESSION_HISTORY_CHARS = int(os.getenv('SESSION_HISTORY_CHARS', '1200'))
+# Longest query/reply kept per turn, and per earlier question
+SESSION_TURN_CHARS = int(os.getenv('SESSION_TURN_CHARS', '240'))
+SESSION_EARLIER_CHARS = 80
+
+SESSION_ID_RE = re.compile(r'^[A-Za-z0-9_-]{16,64}$')
+
+# Follow-up filler ("tell me more", "explain further") that never asks for new context
+FOLLOW_UP_WORDS = frozenset('more else also again elaborate expand explain continue further detail details go on'.split())
+
+
+def new_session_id():
+    return secrets.token_urlsafe(16)
+
+
+def clip(text, limit):
+    """text cut at a word boundary to at most limit chars, marked with an ellipsis when cut."""
+    text = ' '.join((text or '').split())
+    if len(text) <= limit:
+        return text
+    cut = text[:max(0, limit - 1)]
+    if ' ' in cut:
+        cut = cut.rsplit(' ', 1)[0]
+    return cut + '…'
+
+
+class Session:
+    """One conversation: recent turns verbatim (clipped), older questions only, and the last retrieved context."""
+
+    def __init__(self, session_id, turns=None, earlier=None, context='', context_generation=None):
+        self.id = session_id
+        self.turns = turns or []  # [query, reply] pairs, oldest first
+        self.earlier = earlier or []  # questions from turns compacted out of the history
+        self.context = context
+        self.context_generation = context_generation
+
+    def history(self):
+        """Prompt-ready conversation so far; '' for a new session."""
+        lines = []
+        if self.earlier:
+            lines.append('Earlier questions: ' + ' | '.join(self.earlier))
+        for query, reply in self.turns:
+            lines.append(f'User: {query}')
+            lines.append(f'CP Monk: {reply}')
+        return '\n'.join(lines)
+
+    def add_turn(self, query, reply, budget=SESSION_HISTORY_CHARS):
+        """Record a finished turn, then compact until history() fits the budget.
+
+        Oldest turns lose their reply first (only the question is kept), then the oldest questions go.
+        """
+        self.turns.append([clip(query, SESSION_TURN_CHARS), clip(reply, SESSION_TURN_CHARS)])
+        while len(self.history()) > budget:
+            if self.turns and (len(self.turns) > 1 or not self.earlier):
+                self.earlier.append(clip(self.turns.pop(0)[0], SESSION_EARLIER_CHARS))
+            elif self.earlier:
+                self.earlier.pop(0)
+            else:
+                break
+
+    def reusable_context(self, query, generation):
+        """The previous turn's context when it still covers the query, so retrieval can be skipped.
+
+        Covered means every search term of the query already appears in it; follow-ups with no search terms
+        ("tell me more") always reuse it. Context from before a data_cache refresh is never reused.
+        """
+        if not self.context or generation != self.context_generation:
+            return None
+        terms = [term for term in tokenize(query) if term not in FOLLOW_UP_WORDS]
+        if terms:
+            words = set(TOKEN_RE.findall(self.context.lower()))
+            if not all(term in words for term in terms):
+                return None
+        return self.context
+
+    def remember_context(self, context, generation):
+        self.context, self.context_generation = context, generation
+
+    def to_dict(self):
+        return {'turns': self.turns, 'earlier': self.earlier, 'context': self.context,
+                'context_generation': self.context_generation}
+
+    @classmethod
+    def from_dict(cls, session_id, data):
+        return cls(session_id, data.get('turns'), data.get('earlier'), data.get('context', ''),
+                   data.get('context_generation'))
+
+
+class SessionStore:
+    """Shared lookup logic; subclasses implement get, save and stats."""
+
+    def open(self, session_id=None):
+        """The live session for session_id, or a new one under a fresh id (unknown or malformed ids are not reused)."""
+        if session_id and SESSION_ID_RE.match(session_id):
+            session = self.get(session_id)
+            if session is not None:
+                return session
+        self.created += 1
+        return Session(new_session_id())
+
+    async def open_async(self, session_id=None):
+        return self.open(session_id)
+
+    async def save_async(self, session):
+        self.save(session)
+
+
+class MemorySessionStore(SessionStore):
+    """Per-worker sessions, least recently used evicted past max_sessions, idle ones expiring after ttl."""
+
+    def __init__(self, max_sessions=SESSION_MAX, ttl=SESSION_TTL, clock=time.monotonic):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._clock = clock
+        self._sessions = OrderedDict()  # id -> (Session, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.created = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, session_id):
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None and entry[1] <= self._clock():
+                del self._sessions[session_id]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._sessions.move_to_end(session_id)
+            self.hits += 1
+            return entry[0]
+
+    def save(self, session):
+        with self._lock:
+            self._sessions[session.id] = (session, self._clock() + self.ttl)
+            self._sessions.move_to_end(session.id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {'store': 'memory', 'size': len(self._sessions), 'max_sessions': self.max_sessions,
+                    'hits': self.hits, 'misses': self.misses, 'created': self.created,
+                    'evictions': self.evictions, 'expirations': self.expirations}
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions in a SQLite file (WAL), so every worker process sees the same conversations.
+
+    Expired rows are pruned, and the oldest rows beyond max_sessions dropped, every PRUNE_EVERY saves.
+    """
+
+    PRUNE_EVERY = 100
+
+    def __init__(self, path=SESSION_DB_PATH, max_sessions=SESSION_MAX, ttl=SESSION_TTL, clock=time.time):
+        self.path = path
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA busy_timeout=5000')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions (expires_at)')
+        self._saves = 0
+        self.hits = 0
+        self.misses = 0
+        self.created = 0
+        self.expirations = 0
+
+    def get(self, session_id):
+        with self._lock:
+            row = self._conn.execute('SELECT data, expires_at FROM sessions WHERE id = ?', (session_id,)).fetchone()
+            if row is not None and row[1] <= self._clock():
+                self._conn.execute('DELETE FROM sessions WHERE id = ?', (session_id,))
+                self.expirations += 1
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return Session.from_dict(session_id, json.loads(row[0]))
+
+    def save(self, session):
+        data = json.dumps(session.to_dict())
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO sessions (id, data, expires_at) VALUES (?, ?, ?)',
+                               (session.id, data, self._clock() + self.ttl))
+            self._saves += 1
+            if self._saves % self.PRUNE_EVERY == 0:
+                self._prune()
+
+    def _prune(self):
+        self.expirations += self._conn.execute('DELETE FROM sessions WHERE expires_at <= ?',
+                                               (self._clock(),)).rowcount
+        self._conn.execute('''
+            DELETE FROM sessions WHERE id NOT IN (
+                SELECT id FROM sessions ORDER BY expires_at DESC LIMIT ?
+            )
+        ''', (self.max_sessions,))
+
+    async def open_async(self, session_id=None):
+        return await asyncio.to_thread(self.open, session_id)
+
+    async def save_async(self, session):
+        await asyncio.to_thread(self.save, session)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def stats(self):
+        with self._lock:
+            size = self._conn.execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+            return {'store': 'sqlite', 'size': size, 'max_sessions': self.max_sessions, 'hits': self.hits,
+                    'misses': self.misses, 'created': self.created, 'expirations': self.expirations}
+
+
+def create_store(kind=SESSION_STORE):
+    if kind == 'sqlite':
+        logger.info(f"Session store: sqlite at {SESSION_DB_PATH}")
+        return SQLiteSessionStore()
+    if kind != 'memory':
+        raise ValueError(f"Unknown SESSION_STORE '{kind}' (expected memory or sqlite)")
+    return MemorySessionStore()
@@ -0,0 +1,174 @@
+# File Name: test_admission.py
+# Owner: Andrew John Holland
+# Purpose: Checks chat admission control: bounded slots and queue, short questions first, deadline rejections, per-client limits, abandoned waiters, and the 429/413 answers on the chat routes.
+# Version Control: v1.2
+# Change Log:
+# 1. Initial creation - 2026-10-18
+# 2. client_key keys on the proxy-added (last) X-Forwarded-For entry - 2026-10-18
+# 3. Queued chat admitted with several busy slots and a service time past the deadline - 2026-10-18
+
+import asyncio
+import httpx
+import pytest
+from backend.admission import AdmissionController, AdmissionRejected
+
+SHORT_Q = "who is holland"
+LONG_Q = "tell me everything " * 20
+
+
+def controller(**kwargs):
+    kwargs = dict(dict(max_active=1, max_queue=4, queue_deadline=1.0, client_rpm=0, client_active=0,
+                       short_query_chars=50), **kwargs)
+    return AdmissionController(**kwargs)
+
+
+def test_short_questions_are_served_first():
+    gate = controller()
+    order = []
+
+    async def chat(name, message):
+        async with gate.slot(None, message):
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    async def run():
+        first = await gate.acquire(None, SHORT_Q)
+        waiting = [asyncio.create_task(chat("long", LONG_Q)), asyncio.create_task(chat("short", SHORT_Q))]
+        await asyncio.sleep(0.01)
+        assert gate.stats()["waiting"] == 2
+        first.release()
+        await asyncio.gather(*waiting)
+
+    asyncio.run(run())
+    assert order == ["short", "long"]
+    stats = gate.stats()
+    assert (stats["active"], stats["waiting"], stats["admitted"], stats["queued"]) == (0, 0, 3, 2)
+
+
+def test_full_queue_and_deadline_reject_with_retry_after():
+    async def run():
+        gate = controller(max_queue=1, queue_deadline=0.05)
+        gate.service_seconds = 0.01
+        held = await gate.acquire()
+        waiter = asyncio.create_task(gate.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as full:
+            await gate.acquire()
+        # The queued chat gives up at its deadline rather than waiting for the held slot
+        with pytest.raises(AdmissionRejected) as late:
+            await waiter
+        held.release()
+        # A wait estimated past the deadline is refused without queueing
+        slow = controller(queue_deadline=2.0)
+        slow.service_seconds = 3.0
+        slow_held = await slow.acquire()
+        with pytest.raises(AdmissionRejected) as estimated:
+            await slow.acquire()
+        slow_held.release()
+        return gate, full.value, late.value, estimated.value
+
+    gate, full, late, estimated = asyncio.run(run())
+    assert full.reason == "queue full" and full.retry_after >= 1
+    assert late.reason == "deadline" and estimated.reason == "deadline" and estimated.retry_after == 3
+    stats = gate.stats()
+    assert (stats["rejected_queue_full"], stats["rejected_deadline"], stats["active"], stats["waiting"]) == (1, 1, 0, 0)
+
+
+def test_chat_queues_while_a_slot_is_due_to_free():
+    async def run():
+        # 32 slots, ~6 s per Gemini chat, 5 s deadline: a slot frees about every 6/32 s, so the next chat queues
+        gate = controller(max_active=32, queue_deadline=5.0)
+        gate.service_seconds = 6.0
+        assert gate.estimated_wait(0) == pytest.approx(6.0 / 32)
+        held = [await gate.acquire() for _ in range(32)]
+        waiter = asyncio.create_task(gate.acquire())
+        await asyncio.sleep(0)
+        assert gate.stats()["waiting"] == 1
+        held.pop().release()
+        (await asyncio.wait_for(waiter, 0.5)).release()
+        for ticket in held:
+            ticket.release()
+        return gate
+
+    gate = asyncio.run(run())
+    stats = gate.stats()
+    assert (stats["queued"], stats["rejected_deadline"], stats["active"]) == (1, 0, 0)
+
+
+def test_per_client_rate_and_concurrency():
+    now = [0.0]
+    gate = controller(max_active=10, client_rpm=60, client_burst=2, client_active=2, clock=lambda: now[0])
+
+    async def run():
+        a, b = await gate.acquire("1.2.3.4"), await gate.acquire("1.2.3.4")
+        with pytest.raises(AdmissionRejected) as busy:
+            await gate.acquire("1.2.3.4")
+        other = await gate.acquire("5.6.7.8")
+        a.release()
+        b.release()
+        with pytest.raises(AdmissionRejected) as limited:
+            await gate.acquire("1.2.3.4")
+        now[0] += 1.0
+        (await gate.acquire("1.2.3.4")).release()
+        other.release()
+        return busy.value, limited.value
+
+    busy, limited = asyncio.run(run())
+    assert busy.reason == "too many chats from this client"
+    assert limited.reason == "client rate limit" and limited.retry_after == 1
+    assert gate.stats()["rejected_client"] == 2
+
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    async def run():
+        gate = controller()
+        held = await gate.acquire()
+        waiter = asyncio.create_task(gate.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        held.release()
+        held.release()  # idempotent
+        (await asyncio.wait_for(gate.acquire(), 0.5)).release()
+        return gate.stats()
+
+    stats = asyncio.run(run())
+    assert (stats["active"], stats["waiting"]) == (0, 0)
+
+
+def test_chat_routes_answer_429_and_413(monk_bot, monkeypatch):
+    gate = controller(max_queue=0)
+    monkeypatch.setattr(monk_bot.service, "admission", gate)
+
+    async def call():
+        held = await gate.acquire()
+        transport = httpx.ASGITransport(app=monk_bot.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://monk") as client:
+            busy = await client.post("/api/chat", json={"message": SHORT_Q})
+            stream = await client.post("/api/chat/stream", json={"message": SHORT_Q})
+            legacy = await client.post("/monk", json={"message": SHORT_Q})
+            too_long = await client.post("/api/chat", json={"message": "x" * 5000})
+        held.release()
+        return busy, stream, legacy, too_long
+
+    busy, stream, legacy, too_long = asyncio.run(call())
+    for response in (busy, stream, legacy):
+        assert response.status_code == 429 and int(response.headers["Retry-After"]) >= 1
+    assert "error" in legacy.json()
+    assert too_long.status_code == 413
+    assert gate.stats()["active"] == 0
+
+
+def test_client_key_trusts_only_the_proxy_hop(monk_bot, monkeypatch):
+    from starlette.requests import Request
+
+    def request(*headers):
+        return Request({"type": "http", "client": ("10.0.0.2", 41000),
+                        "headers": [(name.encode(), value.encode()) for name, value in headers]})
+    spoofed = ("x-forwarded-for", "1.1.1.1, 203.0.113.7")
+    # Without a configured header the proxy's own address is the key, whatever the client sends
+    assert monk_bot.client_key(request(spoofed)) == "10.0.0.2"
+    monkeypatch.setattr(monk_bot, "ADMISSION_CLIENT_HEADER", "X-Forwarded-For")
+    assert monk_bot.client_key(request(spoofed)) == "203.0.113.7"
+    assert monk_bot.client_key(request(("x-forwarded-for", "2.2.2.2, 203.0.113.7"))) == "203.0.113.7"
+    assert monk_bot.client_key(request()) == "10.0.0.2"
@@ -1,48 +1,52 @@
 # File Name: test_api.py
 # Owner: Andrew John Holland
 # Purpose: Tests the Google Gemini API connection and configuration for the Cyberpunk Monk Chatbot project.
-# Version Control: v1.1
+# Version Control: v1.4
 # Change Log:
 # 1. Initial creation for API testing - 2025-08-07
 # 2. Added dotenv for key loading - 2025-08-07
 # 3. Configured genai with updated SDK syntax - 2025-08-07
 # 4. Included generate_content test - 2025-08-07
 # 5. Added execution and error logging with standardized metadata - 2025-08-08
+# 6. Model built through backend.model_client.ModelClients, the same client manager the servers use - 2026-10-18
+# 7. Skipped unless a Gemini key is configured; the live call is bounded by a request timeout - 2026-10-18
+# 8. No log handlers installed at import (collecting the suite wrote ../logs relative to the cwd); logs through a module logger, set up by logging_setup only when run as a script - 2026-10-18
 
-import google.generativeai as genai
 from dotenv import load_dotenv
 import os
+import sys
 import logging
+import pytest
 
-os.makedirs("../logs", exist_ok=True)
-execution_handler = logging.FileHandler("../logs/execution.log")
-execution_handler.setLevel(logging.DEBUG)
-error_handler = logging.FileHandler("../logs/error.log", mode='a')
-error_handler.setLevel(logging.ERROR)
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        execution_handler,
-        error_handler,
-        logging.StreamHandler()
-    ]
-)
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
 
+from backend.model_client import ModelClients
+
+load_dotenv(os.path.join(PROJECT_ROOT, '.env'))
+# Live call to Gemini: only with a real key (offline runs would otherwise wait on the network)
+LIVE_TIMEOUT = 30
+
+logger = logging.getLogger(__name__)
+
+@pytest.mark.skipif(not (os.getenv('GOOGLE_API_KEY') or os.getenv('GEMINI_API_KEY')),
+                    reason="GOOGLE_API_KEY not configured")
 def test_api():
     try:
-        logging.info("Starting API test")
-        load_dotenv()
-        genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        logging.debug("Generating content for 'Hello, world!'")
-        response = model.generate_content("Hello, world!")
-        logging.info(f"API response: {response.text}")
+        logger.info("Starting API test")
+        model = ModelClients(backend="gemini").get("gemini-1.5-flash")
+        logger.debug("Generating content for 'Hello, world!'")
+        response = model.generate_content("Hello, world!", request_options={"timeout": LIVE_TIMEOUT})
+        logger.info(f"API response: {response.text}")
         print(response.text)
     except Exception as e:
-        logging.error(f"Error in API test: {str(e)}")
+        logger.error(f"Error in API test: {str(e)}")
         raise
 
 if __name__ == "__main__":
-    logging.info("Executing test_api.py")
+    from backend.logging_setup import configure_logging
+
+    configure_logging()
+    logger.info("Executing test_api.py")
     test_api()
\ No newline at end of file
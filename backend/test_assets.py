@@ -0,0 +1,52 @@
+# File Name: test_assets.py
+# Owner: Andrew John Holland
+# Purpose: Checks the asset pipeline: fingerprinted URLs and rewritten references, gzip variants, ETag/304 and cache headers on the served frontend.
+# Version Control: v1.0
+# Change Log:
+# 1. Initial creation - 2026-10-18
+
+import asyncio
+import gzip
+import httpx
+from backend.assets import IMMUTABLE_CACHE, AssetIndex, parse_accept_encoding
+
+
+def test_fingerprints_and_rewrites(tmp_path):
+    (tmp_path / "img").mkdir()
+    (tmp_path / "img" / "bg.jpg").write_bytes(b"\xff\xd8jpeg")
+    (tmp_path / "site.css").write_text("body{background:url('/s/img/bg.jpg')}" + " " * 400)
+    (tmp_path / "index.html").write_text('<link href="/s/site.css"><p>' + "monk " * 100 + "</p>")
+    index = AssetIndex({"/s": str(tmp_path)}).load()
+
+    css_url = index.url_for("/s/site.css")
+    assert css_url.startswith("/s/site.") and css_url.endswith(".css") and css_url != "/s/site.css"
+    css = index.get(css_url)[0]
+    assert index.url_for("/s/img/bg.jpg").encode() in css.bodies["identity"]
+    assert css_url.encode() in index.get("/s/index.html")[0].bodies["identity"]
+    assert gzip.decompress(css.bodies["gzip"]) == css.bodies["identity"]
+    assert "gzip" not in index.get("/s/img/bg.jpg")[0].bodies  # not a compressible type
+
+
+def test_accept_encoding_parsing():
+    assert parse_accept_encoding("gzip, br;q=0, *;q=0.1") == {"gzip": 1.0, "br": 0.0, "*": 0.1}
+
+
+def test_served_assets_revalidate_and_cache(monk_bot):
+    async def visit():
+        transport = httpx.ASGITransport(app=monk_bot.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://monk") as client:
+            home = await client.get("/", headers={"Accept-Encoding": "gzip"})
+            repeat = await client.get("/", headers={"Accept-Encoding": "gzip", "If-None-Match": home.headers["etag"]})
+            css_url = monk_bot.assets.url_for("/frontend/styles.css")
+            css = await client.get(css_url, headers={"Accept-Encoding": "gzip"})
+            head = await client.head("/frontend/styles.css", headers={"Accept-Encoding": "identity"})
+            missing = await client.get("/static/nope.png")
+            return home, repeat, css_url, css, head, missing
+
+    home, repeat, css_url, css, head, missing = asyncio.run(visit())
+    assert home.status_code == 200 and home.headers["content-encoding"] == "gzip"
+    assert css_url in home.text and "must-revalidate" in home.headers["cache-control"]
+    assert repeat.status_code == 304 and repeat.content == b""
+    assert css.headers["cache-control"] == IMMUTABLE_CACHE and css.headers["vary"] == "Accept-Encoding"
+    assert head.status_code == 200 and head.content == b"" and int(head.headers["content-length"]) > 0
+    assert missing.status_code == 404
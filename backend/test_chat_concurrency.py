@@ -0,0 +1,54 @@
+# File Name: test_chat_concurrency.py
+# Owner: Andrew John Holland
+# Purpose: Load test for /api/chat with a stubbed slow model; concurrent chats must overlap, not serialize.
+# Version Control: v1.6
+# Change Log:
+# 1. Initial creation with overlap and concurrency-limit checks - 2026-10-18
+# 2. Fresh response cache per test so repeated questions reach the stub model - 2026-10-18
+# 3. Run with an open quota gate so every chat reaches the stub model - 2026-10-18
+# 4. Stub the model client instead of the Gemini SDK module, which is now imported lazily - 2026-10-18
+# 5. Install fake models with the use_model fixture (ModelClients backend) - 2026-10-18
+# 6. Patch components on monk_bot.service (shared ChatService) - 2026-10-18
+# 7. Concurrency limit set through the service's AdmissionController - 2026-10-18
+
+import asyncio
+import time
+import httpx
+from backend.admission import AdmissionController
+from backend.response_cache import ResponseCache
+
+CLIENTS = 10
+
+
+async def _fire(app, count):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://monk") as client:
+        start = time.perf_counter()
+        responses = await asyncio.gather(*[
+            client.post("/api/chat", json={"message": f"question {i}"}) for i in range(count)
+        ])
+        return time.perf_counter() - start, responses
+
+
+def test_concurrent_chats_overlap(monk_bot, monkeypatch, slow_model, open_gate, use_model):
+    use_model(slow_model)
+    monkeypatch.setattr(monk_bot.service, "response_cache", ResponseCache())
+    elapsed, responses = asyncio.run(_fire(monk_bot.app, CLIENTS))
+    assert all(r.status_code == 200 for r in responses)
+    # Serialized would take CLIENTS * delay (2.0s); overlapping chats finish in roughly one delay
+    assert elapsed < slow_model.delay * CLIENTS / 3, f"{CLIENTS} chats took {elapsed:.2f}s"
+
+
+def test_concurrency_limit_queues_excess_chats(monk_bot, monkeypatch, slow_model, open_gate, use_model):
+    use_model(slow_model)
+    monkeypatch.setattr(monk_bot.service, "response_cache", ResponseCache())
+    monkeypatch.setattr(monk_bot.service, "admission", AdmissionController(max_active=2))
+    elapsed, responses = asyncio.run(_fire(monk_bot.app, 6))
+    assert all(r.status_code == 200 for r in responses)
+    # 6 chats through 2 slots run in 3 waves
+    assert elapsed >= slow_model.delay * 3 * 0.9
+
+
+if __name__ == "__main__":
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-q", "-s"]))
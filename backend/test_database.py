@@ -0,0 +1,132 @@
+# File Name: test_database.py
+# Owner: Andrew John Holland
+# Purpose: Checks the pooled data-access layer: connection reuse, bounded waits and PoolTimeout, wait/timeout counters, broken connections dropped from the pool, and the auto -> SQLite fallback.
+# Version Control: v1.1
+# Change Log:
+# 1. Initial creation - 2026-10-18
+# 2. Threads racing to the first query share one pool - 2026-10-18
+
+import sqlite3
+import threading
+import pytest
+from backend.database import ConnectionPool, PoolTimeout
+
+
+class BrokenConnection:
+    """A connection whose transaction can no longer be rolled back (e.g. the server went away)."""
+
+    def __init__(self):
+        self.closed = 0
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        raise sqlite3.OperationalError("connection lost")
+
+    def close(self):
+        self.closed = 1
+
+
+def memory_pool(max_size=2, timeout=0.05):
+    return ConnectionPool("sqlite", lambda: sqlite3.connect(":memory:", check_same_thread=False),
+                          max_size=max_size, timeout=timeout)
+
+
+def test_connections_are_reused():
+    pool = memory_pool()
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        assert second is first
+    stats = pool.stats()
+    assert (stats["size"], stats["idle"], stats["in_use"], stats["waits"]) == (1, 1, 0, 0)
+
+
+def test_exhausted_pool_waits_then_times_out():
+    pool = memory_pool(max_size=1, timeout=0.05)
+    with pool.connection():
+        with pytest.raises(PoolTimeout):
+            with pool.connection():
+                pass
+    stats = pool.stats()
+    assert (stats["waits"], stats["timeouts"]) == (1, 1) and stats["wait_time_seconds"] >= 0.04
+
+    # A waiter that gets a connection inside the timeout counts as a wait, not a timeout
+    pool.timeout = 2
+    held, release = threading.Event(), threading.Event()
+
+    def hold():
+        with pool.connection():
+            held.set()
+            release.wait()
+    holder = threading.Thread(target=hold)
+    holder.start()
+    held.wait()
+    threading.Timer(0.05, release.set).start()
+    with pool.connection():
+        pass
+    holder.join()
+    stats = pool.stats()
+    assert (stats["waits"], stats["timeouts"]) == (2, 1)
+
+
+def test_broken_connections_are_discarded():
+    pool = ConnectionPool("sqlite", BrokenConnection, max_size=1)
+    with pytest.raises(ValueError):
+        with pool.connection():
+            raise ValueError("query failed")
+    stats = pool.stats()
+    assert (stats["size"], stats["idle"]) == (0, 0) and pool.discarded == 1
+    # Closed under the caller (closed attribute set) is also not handed out again
+    with pool.connection() as conn:
+        conn.close()
+    assert pool.stats()["idle"] == 0 and pool.discarded == 2
+
+
+def test_auto_backend_falls_back_to_sqlite(monk_bot, tmp_path, monkeypatch):
+    from backend import database
+
+    def unreachable():
+        raise ConnectionError("could not connect to server")
+    monkeypatch.setattr(database, "DB_BACKEND", "auto")
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "data_cache.db"))
+    monkeypatch.setattr(database, "_pool", None)
+    monkeypatch.setattr(database, "_init_postgresql", unreachable)
+    before = database.pool_stats()["fallbacks"]
+    try:
+        assert database.init_db() == database.SQLITE
+        assert database.fetch_one("SELECT 1") == (1,)
+        stats = database.pool_stats()
+        assert stats["backend"] == database.SQLITE and stats["fallbacks"] == before + 1
+        # An explicit postgresql backend does not fall back
+        monkeypatch.setattr(database, "DB_BACKEND", "postgresql")
+        with pytest.raises(ConnectionError):
+            database.init_db()
+        assert database.pool_stats()["fallbacks"] == before + 1
+    finally:
+        database.close_db()
+
+
+def test_first_use_from_many_threads_builds_one_pool(monk_bot, tmp_path, monkeypatch):
+    from backend import database
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "data_cache.db"))
+    monkeypatch.setattr(database, "_pool", None)
+    closed = []
+    monkeypatch.setattr(ConnectionPool, "close", lambda self: closed.append(self))
+    start = threading.Barrier(8)
+    pools = []
+
+    def first_query():
+        start.wait()
+        pools.append(database.get_pool())
+    threads = [threading.Thread(target=first_query) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    try:
+        assert len(set(map(id, pools))) == 1 and not closed
+    finally:
+        monkeypatch.undo()
+        pools[0].close()
@@ -0,0 +1,170 @@
+# File Name: test_embeddings.py
+# Owner: Andrew John Holland
+# Purpose: Checks local semantic retrieval: hashed embeddings, the memory-mapped index (build, incremental update, reload), batched top-k with and without numpy, hybrid fusion, one build for workers starting together, and numpy loaded only when used.
+# Version Control: v1.2
+# Change Log:
+# 1. Initial creation - 2026-10-18
+# 2. Added concurrent-build and lazy numpy checks - 2026-10-18
+# 3. Added refresh-through-monitoring checks (index re-embedded, FTS while it is behind) - 2026-10-18
+
+import asyncio
+import os
+import subprocess
+import sys
+import threading
+import pytest
+from backend import embeddings
+from backend.embeddings import EmbeddingIndex, HashingVectorizer, fuse
+
+PAGES = {
+    "https://a.test/career": "Andrew Holland led the Kronos workforce deployment at Etihad Airways for rostering staff.",
+    "https://a.test/homelab": "A Proxmox homelab runs Python automation, cybersecurity tooling and GitHub runners.",
+    "https://a.test/pm": "CAPM certified project manager: charters, risk registers, schedules and stakeholder reports.",
+}
+
+
+@pytest.fixture
+def seeded(cache_db):
+    for url, text in PAGES.items():
+        cache_db.store_document(url, text)
+    return cache_db
+
+
+def rows_id(db, slug):
+    return db.fetch_one("SELECT id FROM data_chunks WHERE url = ?", (f"https://a.test/{slug}",))[0]
+
+
+def test_vectorizer_matches_word_forms():
+    vectorizer = HashingVectorizer(dim=1024)
+
+    def cosine(a, b):
+        fa, fb = vectorizer.features(a), vectorizer.features(b)
+        return sum(w * fb.get(bucket, 0.0) for bucket, w in fa.items())
+    assert vectorizer.features("Deployments") == HashingVectorizer(dim=1024).features("deployments")
+    assert cosine("deployed", "deployment") > cosine("deployed", "homelab")
+    assert vectorizer.features("the and of") == {}
+
+
+def test_paraphrase_found_by_vector_search(seeded, tmp_path):
+    index = EmbeddingIndex(str(tmp_path)).load()
+    assert index.stats()["chunks"] == 3
+    # No query word appears verbatim in the career page ("deployed" vs "deployment", "airline" absent)
+    rows = index.search("who deployed kronos rosters", limit=1, mode="vector")
+    assert rows[0][0] == "https://a.test/career"
+    batch = index.search_ids(["homelab automations", "certification in project management"], limit=1)
+    assert [ranked[0][0] for ranked in batch] == [rows_id(seeded, "homelab"), rows_id(seeded, "pm")]
+
+
+def test_update_reembeds_only_changed_pages(seeded, tmp_path):
+    writer = EmbeddingIndex(str(tmp_path))
+    writer.build()
+    reader = EmbeddingIndex(str(tmp_path)).load(build_missing=False)
+    seeded.store_document("https://a.test/homelab", "The homelab now hosts a neon replicant dashboard.")
+    # Until the writer catches up, the rewritten page's old chunk is skipped rather than served stale
+    assert all("Proxmox" not in content for _, content, _ in reader.search("proxmox homelab", mode="vector"))
+    assert writer.update() == 1 and writer.update() == 0
+    assert reader.reload_if_changed() and not reader.reload_if_changed()
+    assert reader.search("replicant dashboard", limit=1, mode="vector")[0][0] == "https://a.test/homelab"
+
+
+def test_pure_python_scoring_matches_numpy(seeded, tmp_path, monkeypatch):
+    queries = ["kronos at etihad", "python github automation", "risk register"]
+    with_numpy = EmbeddingIndex(str(tmp_path / "np")).load().search_ids(queries, limit=3)
+    monkeypatch.setattr(embeddings, "np", None)
+    without = EmbeddingIndex(str(tmp_path / "py")).load().search_ids(queries, limit=3)
+    assert [[i for i, _ in ranked] for ranked in without] == [[i for i, _ in ranked] for ranked in with_numpy]
+    for a, b in zip(with_numpy, without):
+        assert [round(score, 4) for _, score in a] == [round(score, 4) for _, score in b]
+
+
+def test_hybrid_fusion_and_async_search(seeded, tmp_path):
+    vector = [("u1", "a", 0.9), ("u2", "b", 0.5)]
+    keyword = [("u2", "b", -3.0), ("u3", "c", -2.0)]
+    assert [row[0] for row in fuse(vector, keyword, 3)] == ["u2", "u1", "u3"]
+    index = EmbeddingIndex(str(tmp_path)).load()
+    rows = asyncio.run(index.search_async("Etihad Kronos deployment", limit=2, mode="hybrid"))
+    assert rows[0][0] == "https://a.test/career"
+
+
+def test_service_retrieves_through_the_index(seeded, tmp_path):
+    from backend.service import ChatService
+    service = ChatService(semantic_index=EmbeddingIndex(str(tmp_path)))
+    service.open()
+    context = asyncio.run(service.retrieve("who deployed kronos rosters"))
+    assert context.startswith("[https://a.test/career]")
+
+
+def test_workers_starting_together_build_once(seeded, tmp_path):
+    indexes = [EmbeddingIndex(str(tmp_path)) for _ in range(4)]
+    threads = [threading.Thread(target=index.load) for index in indexes]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(index.ready and index.stats()["chunks"] == 3 for index in indexes)
+    assert sum(index.embedded for index in indexes) == 3
+    # Writers delete only what index.json no longer references
+    indexes[0].build()
+    files = sorted(name for name in os.listdir(tmp_path) if name.endswith(".f32"))
+    meta = indexes[0]._read_meta()
+    assert files == sorted([meta["vectors"], meta["idf"]])
+
+
+def test_fts_workers_do_not_import_numpy():
+    env = dict(os.environ, RETRIEVAL_MODE="fts")
+    code = "import sys, backend.monk_bot; print('numpy' in sys.modules)"
+    out = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True,
+                         cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert out.stdout.strip() == "False"
+
+
+@pytest.fixture
+def served_pages():
+    """A local site whose pages the test can change between crawls."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    pages = {"/career": "Andrew Holland led the Kronos workforce deployment at Etihad Airways.",
+             "/homelab": "A Proxmox homelab runs Python automation, cybersecurity tooling and GitHub runners."}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = f"<html><body><p>{pages[self.path]}</p></body></html>".encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}", pages
+    server.shutdown()
+
+
+def ask(service, query):
+    async def run():
+        service.response_cache._generation_checked = float("-inf")  # as if the check interval had passed
+        await service.current_generation()
+        return await service.retrieve(query)
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("reembed", [True, False])
+def test_refreshed_page_stays_findable(cache_db, served_pages, tmp_path, reembed):
+    from backend import monitoring
+    from backend.service import ChatService
+    base, pages = served_pages
+    url = base + "/career"
+    for path in ("/career", "/homelab"):  # one after the other, so the career chunk is not the highest id
+        monitoring.monitor_urls([base + path], progress=False, index=EmbeddingIndex(str(tmp_path)))
+    service = ChatService(semantic_index=EmbeddingIndex(str(tmp_path)))
+    service.open()
+    assert ask(service, "who deployed kronos").startswith(f"[{url}]")
+
+    # The refresh rewrites the page's chunks (new ids); without re-embedding, FTS answers until the index catches up
+    pages["/career"] = "Andrew Holland finished the Kronos rollout and now leads homelab automation."
+    monitoring.monitor_urls([url], progress=False, index=EmbeddingIndex(str(tmp_path)) if reembed else None)
+    context = ask(service, "kronos rollout")
+    assert context.startswith(f"[{url}]") and "finished the Kronos rollout" in context
+    assert (service.semantic_index.generation == service.response_cache.generation) is reembed
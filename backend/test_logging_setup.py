@@ -0,0 +1,80 @@
+# File Name: test_logging_setup.py
+# Owner: Andrew John Holland
+# Purpose: Checks the queued logging pipeline: level-filtered error.log, JSON lines format and a single root queue handler.
+# Version Control: v1.2
+# Change Log:
+# 1. Initial creation with routing, JSON and root-handler checks - 2026-10-18
+# 2. configure_logging runs at server startup, not on import; test calls it directly - 2026-10-18
+# 3. Files are reopened after logrotate moves them; LOG_ROTATION=size rotates in-process - 2026-10-18
+
+import json
+import logging
+import logging.handlers
+import queue
+from backend import logging_setup
+
+
+def _log_through_queue(log_dir, fmt):
+    records = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(
+        records, *logging_setup.build_handlers(str(log_dir), fmt, console=False), respect_handler_level=True)
+    logger = logging.getLogger(f"monk.test.{fmt}")
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(logging.handlers.QueueHandler(records))
+    listener.start()
+    logger.info("scan complete for 6 urls")
+    logger.error("Gemini call failed: quota")
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+    return [(log_dir / name).read_text(encoding="utf-8").splitlines() for name in ("execution.log", "error.log")]
+
+
+def test_error_log_only_gets_errors(tmp_path):
+    execution, errors = _log_through_queue(tmp_path, "text")
+    assert len(execution) == 2 and execution[0].endswith("INFO - scan complete for 6 urls")
+    assert len(errors) == 1 and errors[0].endswith("ERROR - Gemini call failed: quota")
+
+
+def test_json_format_writes_one_object_per_line(tmp_path):
+    execution, _ = _log_through_queue(tmp_path, "json")
+    entries = [json.loads(line) for line in execution]
+    assert [e["level"] for e in entries] == ["INFO", "ERROR"]
+    assert entries[1]["message"] == "Gemini call failed: quota"
+    assert entries[1]["logger"] == "monk.test.json"
+
+
+def test_configure_logging_installs_one_queue_handler():
+    root = logging.getLogger()
+    # Every entry point calls configure_logging; only the first installs handlers
+    logging_setup.configure_logging()
+    # pytest adds its own capture handlers; everything else goes through the one queue
+    handlers = [type(h) for h in root.handlers if not type(h).__module__.startswith("_pytest")]
+    assert handlers == [logging.handlers.QueueHandler]
+    assert logging_setup.configure_logging() is logging_setup._listener
+
+
+def test_files_reopen_after_logrotate_moves_them(tmp_path):
+    # Two processes appending to one file: neither rotates it, each reopens it once logrotate has moved it
+    first, second = (logging_setup.build_handlers(str(tmp_path), "text", console=False) for _ in range(2))
+    assert all(type(h) is logging.handlers.WatchedFileHandler for h in first + second)
+
+    def emit(handlers, message):
+        handlers[0].handle(logging.makeLogRecord({"msg": message, "levelno": logging.INFO, "levelname": "INFO"}))
+    emit(first, "worker 1 before")
+    emit(second, "worker 2 before")
+    (tmp_path / "execution.log").rename(tmp_path / "execution.log.1")
+    emit(first, "worker 1 after")
+    emit(second, "worker 2 after")
+    for handler in first + second:
+        handler.close()
+    rotated = (tmp_path / "execution.log.1").read_text(encoding="utf-8")
+    current = (tmp_path / "execution.log").read_text(encoding="utf-8")
+    assert "worker 1 before" in rotated and "worker 2 before" in rotated
+    assert "worker 1 after" in current and "worker 2 after" in current and "before" not in current
+
+    sized = logging_setup.build_handlers(str(tmp_path / "single"), "text", console=False, rotation="size")
+    assert all(type(h) is logging.handlers.RotatingFileHandler for h in sized)
+    for handler in sized:
+        handler.close()
@@ -0,0 +1,96 @@
+# File Name: test_metrics.py
+# Owner: Andrew John Holland
+# Purpose: Checks the Prometheus exposition from backend.metrics, the /metrics endpoint after real chats, and the per-span overhead.
+# Version Control: v1.4
+# Change Log:
+# 1. Initial creation with exposition, endpoint and overhead checks - 2026-10-18
+# 2. Stub the model client instead of the Gemini SDK module, which is now imported lazily - 2026-10-18
+# 3. Install fake models with the use_model fixture (ModelClients backend) - 2026-10-18
+# 4. Patch components on monk_bot.service (shared ChatService) - 2026-10-18
+# 5. Server-Timing header carries each reply's stage timings and source - 2026-10-18
+
+import asyncio
+import time
+import httpx
+from backend import metrics
+from backend.response_cache import ResponseCache
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = metrics.Histogram("test_latency_seconds", "Test latency.", ("stage",), buckets=(0.1, 1.0))
+    metrics.REGISTRY.remove(histogram)
+    for value in (0.05, 0.5, 0.7, 3.0):
+        histogram.observe(value, stage="x")
+    lines = histogram.samples()
+    assert 'test_latency_seconds_bucket{stage="x",le="0.1"} 1' in lines
+    assert 'test_latency_seconds_bucket{stage="x",le="1.0"} 3' in lines
+    assert 'test_latency_seconds_bucket{stage="x",le="+Inf"} 4' in lines
+    assert 'test_latency_seconds_count{stage="x"} 4' in lines
+    assert histogram.count(stage="x") == 4
+
+
+def _chat_then_scrape(app, questions):
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://monk") as client:
+            for question in questions:
+                assert (await client.post("/api/chat", json={"message": question})).status_code == 200
+            return await client.get("/metrics")
+    return asyncio.run(run())
+
+
+def test_metrics_endpoint_after_chats(monk_bot, monkeypatch, slow_model, open_gate, use_model):
+    use_model(slow_model)
+    monkeypatch.setattr(monk_bot.service, "response_cache", ResponseCache())
+    model_calls = metrics.STAGE_SECONDS.count(stage="model_call")
+    cache_replies = metrics.REPLIES.value(source="cache")
+
+    response = _chat_then_scrape(monk_bot.app, ["what is sss", "what is sss"])
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    # Second question is a cache hit, so only one model call was timed
+    assert metrics.STAGE_SECONDS.count(stage="model_call") == model_calls + 1
+    assert metrics.REPLIES.value(source="cache") == cache_replies + 1
+    for stage in ("retrieval", "cache_lookup", "prompt_build", "model_call", "serialization"):
+        assert f'monk_stage_seconds_count{{stage="{stage}"}}' in body
+    assert 'monk_requests_in_flight{endpoint="/api/chat"} 0' in body
+    assert "monk_response_cache_hits_total 1" in body
+    assert "# TYPE monk_model_gate_calls_total counter" in body
+    assert "monk_db_pool_in_use" in body
+
+
+def test_server_timing_header(monk_bot, monkeypatch, slow_model, open_gate, use_model):
+    use_model(slow_model)
+    monkeypatch.setattr(monk_bot.service, "response_cache", ResponseCache())
+    monkeypatch.setattr(monk_bot, "SERVER_TIMING", True)
+
+    async def run():
+        transport = httpx.ASGITransport(app=monk_bot.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://monk") as client:
+            return [await client.post(path, json={"message": "what is sss"}) for path in ("/api/chat", "/monk")]
+
+    def timings(response):
+        return dict(part.split(";", 1) for part in response.headers["Server-Timing"].split(", "))
+    model, cached = (timings(response) for response in asyncio.run(run()))
+    assert model["reply"] == 'desc="model"' and cached["reply"] == 'desc="cache"'
+    for stage in ("retrieval", "cache_lookup", "prompt_build", "model_call", "serialization"):
+        assert model[stage].startswith("dur=")
+    # The model stub sleeps; a cache hit never reaches it
+    assert float(model["model_call"][4:]) >= 1 and "model_call" not in cached
+
+
+def test_span_overhead_is_small():
+    rounds = 20000
+    start = time.perf_counter()
+    for _ in range(rounds):
+        with metrics.span("overhead_probe"):
+            pass
+    per_span = (time.perf_counter() - start) / rounds
+    # A chat records ~6 spans; keep instrumentation in the microseconds next to a Gemini round-trip
+    assert per_span < 20e-6, f"{per_span * 1e6:.1f}us per span"
+
+
+if __name__ == "__main__":
+    import pytest
+    raise SystemExit(pytest.main([__file__, "-q", "-s"]))
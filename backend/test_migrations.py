@@ -0,0 +1,110 @@
+# File Name: test_migrations.py
+# Owner: Andrew John Holland
+# Purpose: Checks the versioned schema: fresh and legacy SQLite databases migrate to one data_cache layout (unique url, content_hash, timestamp index), reruns are no-ops, and connections run in WAL mode.
+# Version Control: v1.2
+# Change Log:
+# 1. Initial creation - 2026-10-18
+# 2. Added concurrent first-run check (lock taken before schema_version is created) - 2026-10-18
+# 3. Full-text index applied once as migration 3; retried at the next start when unavailable - 2026-10-18
+
+import sqlite3
+import threading
+import pytest
+from backend import migrations
+
+
+@pytest.fixture
+def fresh_db(monk_bot, tmp_path, monkeypatch):
+    """backend.database pointed at a path that init_db has not touched yet."""
+    from backend import database
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "data_cache.db"))
+    monkeypatch.setattr(database, "_pool", None)
+    yield database
+    if database._pool is not None:
+        database.get_pool().close()
+
+
+def test_fresh_database_is_at_latest_version(cache_db):
+    with cache_db.get_pool().connection() as conn:
+        assert migrations.schema_version(conn, cache_db.SQLITE) == migrations.SCHEMA_VERSION
+        assert migrations.migrate(conn, cache_db.SQLITE) == []
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        indexes = {row[1] for row in conn.execute("PRAGMA index_list(data_cache)")}
+    assert "data_cache_timestamp_idx" in indexes
+    cache_db.store_document("https://a.test", "first")
+    cache_db.store_document("https://a.test", "second")
+    rows = cache_db.fetch_all("SELECT url, content, content_hash FROM data_cache")
+    assert len(rows) == 1 and rows[0][1] == "second" and rows[0][2]
+
+
+@pytest.mark.parametrize("legacy_ddl, rows", [
+    # early monitoring.py: url primary key, no timestamp
+    ("CREATE TABLE data_cache (url TEXT PRIMARY KEY, content TEXT)",
+     [("https://a.test", "<p>Kronos at Etihad</p>")]),
+    # database.py up to v3.5: no unique url, so refreshes could leave duplicates behind
+    ("CREATE TABLE data_cache (id INTEGER PRIMARY KEY, url TEXT, content TEXT, timestamp DATETIME)",
+     [("https://a.test", "<p>old</p>", "2025-08-07 10:00:00"),
+      ("https://a.test", "<p>Kronos at Etihad</p>", "2025-08-08 10:00:00")]),
+])
+def test_legacy_layouts_migrate(fresh_db, legacy_ddl, rows):
+    conn = sqlite3.connect(fresh_db.DB_PATH)
+    conn.execute(legacy_ddl)
+    marks = ", ".join("?" * len(rows[0]))
+    columns = "url, content, timestamp" if len(rows[0]) == 3 else "url, content"
+    conn.executemany(f"INSERT INTO data_cache ({columns}) VALUES ({marks})", rows)
+    conn.commit()
+    conn.close()
+
+    fresh_db.init_db()
+    assert fresh_db.fetch_all("SELECT url, content FROM data_cache") == [("https://a.test", "<p>Kronos at Etihad</p>")]
+    assert fresh_db.fetch_one("SELECT content_hash FROM data_cache")[0]
+    versions = fresh_db.fetch_all("SELECT version FROM schema_version ORDER BY version")
+    assert [v for v, in versions] == [m.version for m in migrations.MIGRATIONS]
+    # Legacy pages are searchable (backfilled into chunks) and the unique url takes upserts
+    from backend import retrieval
+    assert retrieval.search_cache("kronos")[0][0] == "https://a.test"
+    fresh_db.store_document("https://a.test", "Kronos rollout finished")
+    assert fresh_db.fetch_one("SELECT COUNT(*) FROM data_cache") == (1,)
+
+
+def test_concurrent_migrations_apply_once(tmp_path):
+    path = str(tmp_path / "fresh.db")
+    assert migrations.schema_version(sqlite3.connect(path), migrations.SQLITE) == 0
+    start, results, errors = threading.Barrier(4), [], []
+
+    def worker():
+        conn = sqlite3.connect(path, timeout=10)
+        start.wait()
+        try:
+            results.append(migrations.migrate(conn, migrations.SQLITE))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            conn.close()
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert sorted(results) == [[], [], [], [m.version for m in migrations.MIGRATIONS]]
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT COUNT(*) FROM schema_version").fetchone() == (len(migrations.MIGRATIONS),)
+
+
+def test_full_text_index_is_a_migration(fresh_db, monkeypatch):
+    # A server without FTS5 keeps the rest of the schema and scans; migration 3 is retried at the next start
+    available = migrations.SQLITE_CHUNK_SEARCH
+    monkeypatch.setattr(migrations, "SQLITE_CHUNK_SEARCH", ("CREATE VIRTUAL TABLE data_chunks_fts USING no_such_module()",))
+    fresh_db.init_db()
+    assert [v for v, in fresh_db.fetch_all("SELECT version FROM schema_version ORDER BY version")] == [1, 2]
+    fresh_db.store_document("https://a.test", "Kronos rollout at Etihad")
+    from backend import retrieval
+    assert retrieval.search_cache("Kronos")[0][0] == "https://a.test"
+
+    monkeypatch.setattr(migrations, "SQLITE_CHUNK_SEARCH", available)
+    with fresh_db.get_pool().connection() as conn:
+        assert migrations.migrate(conn, fresh_db.SQLITE) == [3]
+        # Chunks stored while it was missing are indexed; later starts run no DDL at all
+        assert conn.execute("SELECT rowid FROM data_chunks_fts WHERE data_chunks_fts MATCH 'etihad'").fetchall()
+        assert migrations.migrate(conn, fresh_db.SQLITE) == []
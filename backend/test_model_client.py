@@ -0,0 +1,66 @@
+# File Name: test_model_client.py
+# Owner: Andrew John Holland
+# Purpose: Checks the per-worker model client manager: one client per model, generation parameters from env, and the stub backend behind /api/chat.
+# Version Control: v1.1
+# Change Log:
+# 1. Initial creation with reuse, config, stub-backend and unknown-backend checks - 2026-10-18
+# 2. Patch components on monk_bot.service (shared ChatService) - 2026-10-18
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+import pytest
+from backend.model_client import STUB_REPLY, ModelClients, StubModel, generation_config_from_env
+from backend.response_cache import ResponseCache
+
+
+def test_client_built_once_per_model():
+    built = []
+
+    def backend(name, generation_config):
+        built.append(name)
+        return object()
+
+    clients = ModelClients(backend=backend, generation_config={})
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        first = set(map(id, pool.map(lambda _: clients.get(), range(200))))
+    assert len(first) == 1
+    assert clients.get("gemini-1.5-pro") is clients.get("gemini-1.5-pro")
+    assert sorted(built) == ["gemini-1.5-flash", "gemini-1.5-pro"]
+
+
+def test_generation_config_from_env(monkeypatch):
+    monkeypatch.setenv("GEMINI_TEMPERATURE", "0.4")
+    monkeypatch.setenv("GEMINI_MAX_OUTPUT_TOKENS", "256")
+    monkeypatch.delenv("GEMINI_TOP_P", raising=False)
+    assert generation_config_from_env() == {"temperature": 0.4, "max_output_tokens": 256}
+    clients = ModelClients(backend="stub")
+    assert clients.get().generation_config == {"temperature": 0.4, "max_output_tokens": 256}
+
+
+def test_unknown_backend_rejected():
+    with pytest.raises(ValueError):
+        ModelClients(backend="hal9000")
+
+
+def test_stub_backend_serves_chat_and_stream(monk_bot, monkeypatch, open_gate):
+    monkeypatch.setattr(monk_bot.service, "model_clients", ModelClients(backend="stub"))
+    monkeypatch.setattr(monk_bot.service, "response_cache", ResponseCache())
+
+    async def ask():
+        transport = httpx.ASGITransport(app=monk_bot.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://monk") as client:
+            chat = await client.post("/api/chat", json={"message": "what does holland build"})
+            stream = await client.post("/api/chat/stream", json={"message": "and what else"})
+            return chat, stream
+
+    chat, stream = asyncio.run(ask())
+    assert chat.json()["response"] == STUB_REPLY
+    assert isinstance(monk_bot.service.model_clients.get(), StubModel)
+    frames = [line for line in stream.text.splitlines() if line.startswith("data: {\"text\"")]
+    assert len(frames) > 1
+    assert "event: done" in stream.text
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q", "-s"]))
@@ -0,0 +1,98 @@
+# File Name: test_monitoring.py
+# Owner: Andrew John Holland
+# Purpose: Runs the monitoring crawler against a local HTTP stub server; checks concurrency, conditional requests and content-hash skips.
+# Version Control: v1.1
+# Change Log:
+# 1. Initial creation with cold/warm crawl checks and timing/bytes report - 2026-10-18
+# 2. Importing the crawler leaves logging alone - 2026-10-18
+
+import hashlib
+import os
+import subprocess
+import sys
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+DELAY = 0.2
+PAGE = "<html><body><p>{} " + "lorem ipsum " * 2000 + "</p></body></html>"
+LAST_MODIFIED = formatdate(0, usegmt=True)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """/etag/N sends ETags, /modified/N Last-Modified, /plain/N no validators (hash skip only)."""
+
+    def do_GET(self):
+        time.sleep(DELAY)
+        kind, _, name = self.path.strip("/").partition("/")
+        body = PAGE.format(name).encode()
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        if kind == "etag" and self.headers.get("If-None-Match") == etag:
+            return self._send(304)
+        if kind == "modified" and self.headers.get("If-Modified-Since") == LAST_MODIFIED:
+            return self._send(304)
+        headers = {"Content-Type": "text/html; charset=utf-8"}
+        if kind == "etag":
+            headers["ETag"] = etag
+        if kind == "modified":
+            headers["Last-Modified"] = LAST_MODIFIED
+        self._send(200, body, headers)
+
+    def _send(self, status, body=b"", headers=None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_urls():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    yield [f"{base}/{kind}/{i}" for kind in ("etag", "modified", "plain") for i in range(2)]
+    server.shutdown()
+
+
+def test_cold_then_warm_crawl(cache_db, stub_urls):
+    from backend import monitoring, retrieval
+
+    cold = monitoring.monitor_urls(stub_urls)
+    assert cold["changed"] == cold["stored"] == 6
+    # Six 0.2s fetches overlap instead of taking 1.2s back to back
+    assert cold["seconds"] < DELAY * len(stub_urls) / 2
+    assert retrieval.search_cache("lorem")
+
+    warm = monitoring.monitor_urls(stub_urls)
+    assert warm["not_modified"] == 4 and warm["unchanged"] == 2 and warm["stored"] == 0
+    assert warm["bytes"] < cold["bytes"] / 2
+    print(f"\ncold: {cold['seconds']}s {cold['bytes']} bytes | warm: {warm['seconds']}s {warm['bytes']} bytes")
+
+
+def test_urls_from_config(monkeypatch, tmp_path):
+    from backend import monitoring
+
+    url_file = tmp_path / "urls.txt"
+    url_file.write_text("# comment\nhttp://a.test\n\nhttp://b.test\n")
+    monkeypatch.delenv("MONITOR_URLS", raising=False)
+    monkeypatch.setattr(monitoring, "MONITOR_URLS_FILE", str(url_file))
+    assert monitoring.load_urls() == ["http://a.test", "http://b.test"]
+    monkeypatch.setenv("MONITOR_URLS", "http://c.test, http://d.test")
+    assert monitoring.load_urls() == ["http://c.test", "http://d.test"]
+
+
+def test_import_installs_no_log_handlers(tmp_path):
+    env = dict(os.environ, LOG_DIR=str(tmp_path / "logs"), PYTHONPATH=PROJECT_ROOT)
+    probe = "import logging, backend.monitoring; print(len(logging.getLogger().handlers))"
+    out = subprocess.run([sys.executable, "-c", probe], env=env, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "0"
+    assert not (tmp_path / "logs").exists()
@@ -0,0 +1,43 @@
+# File Name: test_prompts.py
+# Owner: Andrew John Holland
+# Purpose: Checks CP Monk prompt templating and per-model character budgeting.
+# Version Control: v1.1
+# Change Log:
+# 1. Initial creation - 2026-10-18
+# 2. Fallback prompt keeps the session history - 2026-10-18
+
+from backend import prompts
+
+
+def _context(blocks, size=1000):
+    return "\n\n".join(f"[https://page{i}.test]\n" + f"chunk{i} " * (size // 7) for i in range(blocks))
+
+
+def test_data_and_redirect_are_substituted():
+    prompt = prompts.build_prompt("kronos", _context(1, 100))
+    assert "chunk0" in prompt.text and "{data}" not in prompt.text and "{redirect_url}" not in prompt.text
+    assert any(url in prompt.text for url in prompts.BASE_REDIRECTS)
+
+
+def test_large_context_is_cut_to_budget_in_rank_order():
+    prompt = prompts.build_prompt("kronos", _context(50), model_name="gemini-1.5-flash")
+    assert prompt.chars <= prompt.budget == prompts.MODEL_CHAR_BUDGETS["gemini-1.5-flash"]
+    assert prompt.truncated and 0 < prompt.blocks_used < 50
+    assert "chunk0" in prompt.text and "chunk49" not in prompt.text
+
+
+def test_oversized_single_chunk_is_truncated():
+    prompt = prompts.build_prompt("my name is Rachael", "word " * 10000)
+    assert prompt.chars <= prompt.budget and prompt.truncated and prompt.text.count("…") == 1
+
+
+def test_no_data_keeps_default_reply():
+    assert prompts.get_prompt("quantum", "").startswith("Pumped to assist from my neon shrine")
+
+
+def test_no_data_keeps_history():
+    history = "User: who led the kronos rollout\nCP Monk: Holland did, at Etihad."
+    prompt = prompts.build_prompt("and after that?", "", history=history)
+    assert history in prompt.text and "Pumped to assist from my neon shrine" in prompt.text
+    assert prompt.history_chars == len(prompts.HISTORY_TEMPLATE.render(history=history))
+    assert prompt.data_chars == 0 and prompt.blocks_used == 0 and not prompt.truncated
@@ -0,0 +1,188 @@
+# File Name: test_rate_limit.py
+# Owner: Andrew John Holland
+# Purpose: Checks the Gemini quota guard (token bucket, backoff, circuit breaker) against a local fake model that answers with 429s.
+# Version Control: v1.5
+# Change Log:
+# 1. Initial creation with bucket queueing, retry, breaker and busy-reply checks - 2026-10-18
+# 2. Stub the model client instead of the Gemini SDK module, which is now imported lazily - 2026-10-18
+# 3. Install fake models with the use_model fixture (ModelClients backend) - 2026-10-18
+# 4. Patch components on monk_bot.service (shared ChatService) - 2026-10-18
+# 5. Added half-open recovery check (probe shed by the bucket, non-retryable error, cancellation) - 2026-10-18
+# 6. Gate checks go through call_async (the blocking ModelGate.call is gone) - 2026-10-18
+
+import asyncio
+import time
+import httpx
+import pytest
+from google.api_core.exceptions import ResourceExhausted
+from backend import rate_limit
+from backend.rate_limit import CircuitBreaker, ModelGate, QuotaUnavailable, TokenBucket
+from backend.prompts import busy_reply
+from backend.response_cache import ResponseCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class QuotaModel:
+    """Fake genai.GenerativeModel that returns 429 (ResourceExhausted) for its first `failures` calls."""
+
+    failures = float("inf")
+
+    def __init__(self, name=None, generation_config=None):
+        self.calls = 0
+
+    def generate_content(self, prompt):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ResourceExhausted("429 Quota exceeded for generate_content")
+        return FakeResponse(f"echo: {prompt[-20:]}")
+
+    async def generate_content_async(self, prompt, stream=False):
+        return self.generate_content(prompt)
+
+
+def call(gate, fn, prompt):
+    return asyncio.run(gate.call_async(fn, prompt))
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(rate_limit, "BACKOFF_BASE", 0.01)
+
+
+def test_bucket_queues_reservations_and_sheds_past_deadline():
+    clock = FakeClock()
+    bucket = TokenBucket(rate_per_minute=60, burst=2, clock=clock)
+    assert [bucket.reserve(0), bucket.reserve(0)] == [0.0, 0.0]
+    # Bucket empty at 1 token/s: each queued caller waits behind the one before it
+    assert bucket.reserve(5) == pytest.approx(1.0)
+    assert bucket.reserve(5) == pytest.approx(2.0)
+    assert bucket.reserve(2.5) is None
+    clock.now += 10
+    assert bucket.reserve(0) == 0.0
+
+
+def test_retries_429_with_backoff_then_succeeds():
+    model = QuotaModel()
+    model.failures = 2
+    gate = ModelGate(deadline=5, max_retries=3)
+    reply = asyncio.run(gate.call_async(model.generate_content_async, "hello grid"))
+    assert reply.text == "echo: hello grid"
+    assert model.calls == 3
+    assert gate.stats()["retries"] == 2
+    # Two 429s halved the send rate twice; one success only starts the additive recovery
+    assert gate.bucket.rate < gate.bucket.max_rate / 2
+
+
+def test_call_gives_up_within_deadline():
+    model = QuotaModel()
+    gate = ModelGate(deadline=0.2, max_retries=10)
+    start = time.perf_counter()
+    with pytest.raises(QuotaUnavailable):
+        call(gate, model.generate_content_async, "hello grid")
+    assert time.perf_counter() - start < 0.5
+
+
+def test_breaker_opens_then_probes_after_reset():
+    clock = FakeClock()
+    model = QuotaModel()
+    gate = ModelGate(breaker=CircuitBreaker(failures=2, reset=30, clock=clock), max_retries=0, clock=clock)
+    for _ in range(2):
+        with pytest.raises(QuotaUnavailable):
+            call(gate, model.generate_content_async, "hi")
+    assert gate.breaker.state == CircuitBreaker.OPEN
+    # Open breaker fails fast without touching the model
+    with pytest.raises(QuotaUnavailable):
+        call(gate, model.generate_content_async, "hi")
+    assert model.calls == 2
+    clock.now += 31
+    model.failures = 0
+    assert call(gate, model.generate_content_async, "hi").text == "echo: hi"
+    assert gate.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_probe_always_resolves():
+    clock = FakeClock()
+    model = QuotaModel()
+    gate = ModelGate(bucket=TokenBucket(rate_per_minute=60, burst=1, clock=clock),
+                     breaker=CircuitBreaker(failures=2, reset=30, clock=clock), deadline=3, max_retries=0, clock=clock)
+
+    def trip():
+        model.failures = float("inf")
+        while gate.breaker.state != CircuitBreaker.OPEN:
+            clock.now += 100
+            with pytest.raises(QuotaUnavailable):
+                call(gate, model.generate_content_async, "hi")
+        clock.now += 31
+
+    # After a 429 burst the slowed bucket cannot send the probe in time: the probe slot is given back
+    trip()
+    gate.bucket._tokens, gate.bucket._updated = -1, clock.now
+    with pytest.raises(QuotaUnavailable, match="deadline"):
+        call(gate, model.generate_content_async, "hi")
+    assert gate.breaker.state == CircuitBreaker.HALF_OPEN
+    clock.now += 100
+    model.failures = 0
+    assert call(gate, model.generate_content_async, "hi").text == "echo: hi"
+    assert gate.breaker.state == CircuitBreaker.CLOSED
+
+    # A probe failing with a non-retryable error reopens the breaker
+    trip()
+
+    async def broken(prompt):
+        raise ValueError("bad request")
+    with pytest.raises(ValueError):
+        call(gate, broken, "hi")
+    assert gate.breaker.state == CircuitBreaker.OPEN
+
+    # So does a cancelled probe (a streaming client that disconnected)
+    clock.now += 31
+
+    async def hang(prompt):
+        await asyncio.sleep(10)
+
+    async def cancel_probe():
+        task = asyncio.create_task(gate.call_async(hang, "hi"))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+    asyncio.run(cancel_probe())
+    assert gate.breaker.state == CircuitBreaker.OPEN
+    clock.now += 31
+    model.failures = 0
+    assert asyncio.run(gate.call_async(model.generate_content_async, "hi")).text == "echo: hi"
+    assert gate.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_chat_serves_busy_reply_under_quota_shortfall(monk_bot, monkeypatch, use_model):
+    use_model(QuotaModel)
+    monkeypatch.setattr(monk_bot.service, "response_cache", ResponseCache())
+    monkeypatch.setattr(monk_bot.service, "model_gate", ModelGate(deadline=0.3))
+
+    async def ask():
+        transport = httpx.ASGITransport(app=monk_bot.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://monk") as client:
+            return await client.post("/api/chat", json={"message": "who is holland"})
+
+    start = time.perf_counter()
+    response = asyncio.run(ask())
+    assert response.status_code == 200
+    assert response.json()["response"] == busy_reply("who is holland")
+    assert time.perf_counter() - start < 1.0
+    # Degraded replies are never cached over a real answer
+    assert monk_bot.service.response_cache.stats()["size"] == 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q", "-s"]))
@@ -0,0 +1,94 @@
+# File Name: test_response_cache.py
+# Owner: Andrew John Holland
+# Purpose: Checks the CP Monk response cache: TTL/LRU eviction, near-duplicate hits, refresh invalidation and skipped Gemini calls.
+# Version Control: v1.5
+# Change Log:
+# 1. Initial creation - 2026-10-18
+# 2. Stub the model client instead of the Gemini SDK module, which is now imported lazily - 2026-10-18
+# 3. Install fake models with the use_model fixture (ModelClients backend) - 2026-10-18
+# 4. Compare reply text only; each stateless reply now carries its own session_id - 2026-10-18
+# 5. Patch components on monk_bot.service (shared ChatService) - 2026-10-18
+# 6. Per-url invalidation from the cache_events log - 2026-10-18
+
+import asyncio
+import httpx
+from backend.response_cache import ResponseCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_and_lru_eviction():
+    clock = Clock()
+    cache = ResponseCache(max_entries=2, ttl=10, clock=clock)
+    cache.put("Who is Andrew Holland?", "ctx", "a")
+    cache.put("q2", "ctx", "b")
+    assert cache.get("who is andrew holland", "ctx") == "a"  # normalized, and now most recent
+    cache.put("q3", "ctx", "c")
+    assert cache.get("q2", "ctx") is None  # least recently used went first
+    assert cache.get("q3", "other ctx") is None  # different retrieved context never matches
+    clock.now = 11
+    assert cache.get("q3", "ctx") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["evictions"], stats["expirations"]) == (1, 1, 1)
+
+
+def test_near_duplicate_mode():
+    cache = ResponseCache(similarity_threshold=0.6)
+    cache.put("who is andrew holland", "ctx", "a")
+    assert cache.get("who is andrew holand?", "ctx") == "a"
+    assert cache.get("what is kronos", "ctx") is None
+    assert cache.stats()["near_hits"] == 1
+
+
+def test_generation_change_invalidates():
+    clock = Clock()
+    cache = ResponseCache(clock=clock)
+    cache.set_generation(1)
+    cache.put("q", "ctx", "a")
+    assert not cache.generation_due()
+    clock.now = 60
+    assert cache.generation_due()
+    cache.set_generation(2)
+    assert cache.get("q", "ctx") is None
+
+
+def test_changed_urls_invalidate_only_their_replies():
+    cache = ResponseCache()
+    cache.set_generation(1)
+    cache.put("q1", "[https://a.test/one]\nalpha", "a")
+    cache.put("q2", "[https://b.test/two]\nbeta\n\n[https://a.test/one]\nalpha", "b")
+    cache.put("q3", "[https://c.test/three]\ngamma", "c")
+    cache.set_generation(2, ["https://a.test/one"])
+    assert cache.get("q3", "[https://c.test/three]\ngamma") == "c"
+    assert cache.stats()["size"] == 1 and cache.stats()["invalidated"] == 2
+    cache.set_generation(3, None)  # changes unknown: everything goes
+    assert cache.stats()["size"] == 0
+
+
+def test_repeat_question_skips_model(monk_bot, monkeypatch, slow_model, use_model):
+    calls = []
+
+    class CountingModel(slow_model):
+        async def generate_content_async(self, prompt):
+            calls.append(prompt)
+            return await super().generate_content_async(prompt)
+
+    use_model(CountingModel)
+    monkeypatch.setattr(monk_bot.service, "response_cache", ResponseCache())
+
+    async def ask_twice():
+        transport = httpx.ASGITransport(app=monk_bot.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://monk") as client:
+            first = await client.post("/api/chat", json={"message": "Who is Andrew?"})
+            second = await client.post("/api/chat", json={"message": "who is andrew"})
+            return first.json(), second.json()
+
+    first, second = asyncio.run(ask_twice())
+    assert first["response"] == second["response"] and len(calls) == 1
+    assert monk_bot.service.response_cache.stats()["hits"] == 1
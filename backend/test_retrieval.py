@@ -0,0 +1,78 @@
+# File Name: test_retrieval.py
+# Owner: Andrew John Holland
+# Purpose: Checks ranked full-text retrieval over cached chunks, including index correctness when pages are re-cached, and PDF text extraction.
+# Version Control: v1.2
+# Change Log:
+# 1. Initial creation with ranking and re-cache checks - 2026-10-18
+# 2. Switched to chunked store_document; added chunk-only context and legacy backfill checks - 2026-10-18
+# 3. Added PDF text extraction check (pypdf) - 2026-10-18
+
+from backend import ingest, retrieval
+
+
+def test_ranks_best_page_first(cache_db):
+    cache_db.store_document("https://a.test", "Kronos rollout at Etihad Airways, Kronos scheduling and Kronos leave")
+    cache_db.store_document("https://b.test", "Homelab notes: Proxmox and Python automation")
+    results = retrieval.search_cache("Tell me about the Kronos project at Etihad?", limit=2)
+    assert [r[0] for r in results] == ["https://a.test"]
+
+
+def test_recached_pages_stay_correct(cache_db):
+    cache_db.store_document("https://a.test", "old page about aerospace compliance")
+    assert retrieval.search_cache("aerospace")
+    cache_db.store_document("https://a.test", "new page about airline training systems")
+    assert retrieval.search_cache("aerospace") == []
+    assert retrieval.search_cache("airline")[0][0] == "https://a.test"
+    assert cache_db.fetch_one("SELECT COUNT(*) FROM data_cache WHERE url = 'https://a.test'") == (1,)
+
+
+def test_query_without_terms_returns_nothing(cache_db):
+    cache_db.store_document("https://a.test", "anything at all")
+    assert retrieval.search_cache("who is it?") == []
+
+
+def test_context_is_only_relevant_chunks(cache_db):
+    filler = " ".join(f"filler{i}" for i in range(5000))
+    page = f"<html><body><script>var kronos = 1;</script><p>{filler}</p><p>Kronos go-live at Etihad.</p><p>{filler}</p></body></html>"
+    cache_db.store_document("https://a.test", ingest.html_to_text(page))
+    context = retrieval.get_context("kronos")
+    assert "Kronos go-live at Etihad." in context
+    assert "var kronos" not in context
+    assert len(context) <= retrieval.CONTEXT_CHUNKS * (ingest.CHUNK_CHARS + 50) < len(page) / 10
+
+
+def test_legacy_pages_are_backfilled(cache_db):
+    with cache_db.get_pool().connection() as conn:
+        conn.execute("DELETE FROM data_chunks")
+        conn.execute("INSERT INTO data_cache (url, content) VALUES ('https://old.test', '<p>Proxmox cluster</p>')")
+    cache_db.init_db()
+    assert retrieval.search_cache("proxmox")[0][1] == "Proxmox cluster"
+
+
+def make_pdf(text):
+    """A one-page PDF showing `text` in Helvetica (enough for pypdf's text extraction)."""
+    stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode()
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    pdf, offsets = b"%PDF-1.4\n", []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return pdf
+
+
+def test_pdf_text_is_extracted():
+    pdf = make_pdf("Executive summary: Kronos rollout at Etihad")
+    text = ingest.extract_text("https://a.test/summary.pdf", "application/pdf", pdf)
+    assert text == "Executive summary: Kronos rollout at Etihad"
+    assert ingest.pdf_to_text(b"%PDF-1.4 truncated") == ""
@@ -0,0 +1,121 @@
+# File Name: test_scheduler.py
+# Owner: Andrew John Holland
+# Purpose: Checks the background refresh scheduler (per-URL intervals, jitter, host backoff) and the cache_events change log it feeds.
+# Version Control: v1.0
+# Change Log:
+# 1. Initial creation - 2026-10-18
+
+import pytest
+from backend.scheduler import RefreshScheduler, load_schedule, parse_interval
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRefresh:
+    """Records each batch; URLs on hosts listed in `down` fail."""
+
+    def __init__(self):
+        self.batches = []
+        self.down = set()
+
+    def __call__(self, urls):
+        self.batches.append(sorted(urls))
+        failed = [url for url in urls if any(host in url for host in self.down)]
+        return {"changed": 0, "failed_urls": failed}
+
+
+def make_scheduler(schedule, clock, refresh):
+    return RefreshScheduler(schedule, refresh=refresh, interval=3600, jitter=0.1, backoff_base=60,
+                            backoff_cap=600, clock=clock, rng=lambda: 0.5)
+
+
+def test_parse_interval():
+    assert [parse_interval(text) for text in ("90", "30s", "15m", "2h", "1d")] == [90, 30, 900, 7200, 86400]
+    with pytest.raises(ValueError):
+        parse_interval("soon")
+
+
+def test_schedule_reads_optional_intervals(monkeypatch):
+    from backend import monitoring
+    monkeypatch.setenv("MONITOR_URLS", "http://a.test 15m, http://b.test")
+    assert load_schedule() == [("http://a.test", 900), ("http://b.test", None)]
+    assert monitoring.load_urls() == ["http://a.test", "http://b.test"]
+
+
+def test_urls_refresh_on_their_own_intervals():
+    clock, refresh = Clock(), FakeRefresh()
+    scheduler = make_scheduler([("http://a.test/fast", 600), ("http://a.test/slow", None)], clock, refresh)
+    scheduler.run_once()
+    assert refresh.batches == [["http://a.test/fast", "http://a.test/slow"]]
+    assert scheduler.run_once() is None and scheduler.seconds_until_next() == 600
+    clock.now += 600
+    scheduler.run_once()
+    assert refresh.batches[-1] == ["http://a.test/fast"]
+    clock.now += 3000
+    scheduler.run_once()
+    assert refresh.batches[-1] == ["http://a.test/fast", "http://a.test/slow"]
+
+
+def test_jitter_spreads_next_runs():
+    clock, refresh = Clock(), FakeRefresh()
+    draws = iter([0.0, 1.0])
+    scheduler = RefreshScheduler([("http://a.test/1", None), ("http://b.test/2", None)], refresh=refresh,
+                                 interval=1000, jitter=0.1, clock=clock, rng=lambda: next(draws))
+    scheduler.run_once()
+    assert sorted(scheduler.next_due.values()) == [clock.now + 900, clock.now + 1100]
+
+
+def test_failing_host_backs_off_and_recovers():
+    clock, refresh = Clock(), FakeRefresh()
+    refresh.down.add("down.test")
+    scheduler = make_scheduler([("http://down.test/1", None), ("http://down.test/2", None),
+                                ("http://up.test/1", None)], clock, refresh)
+    delays = []
+    for _ in range(6):
+        scheduler.run_once()
+        assert scheduler.stats()["hosts_backing_off"] == 1
+        delays.append(scheduler.host_retry_at["down.test"] - clock.now)
+        clock.now = scheduler.host_retry_at["down.test"]
+    assert delays == [60, 120, 240, 480, 600, 600]  # doubling, capped
+    assert all(batch == ["http://down.test/1", "http://down.test/2"] for batch in refresh.batches[1:])
+
+    refresh.down.clear()
+    scheduler.run_once()
+    assert "down.test" not in scheduler.host_failures and scheduler.stats()["hosts_backing_off"] == 0
+    assert scheduler.next_due["http://down.test/1"] == clock.now + 3600
+
+
+def test_refresh_error_counts_as_failure():
+    clock = Clock()
+
+    def broken(urls):
+        raise RuntimeError("database is down")
+    scheduler = make_scheduler([("http://a.test/1", None)], clock, broken)
+    scheduler.run_once()
+    assert scheduler.stats()["failed"] == 1 and scheduler.host_failures == {"a.test": 1}
+
+
+def test_cache_changes_name_the_changed_urls(cache_db):
+    start, _ = cache_db.get_cache_changes(None)
+    cache_db.store_document("http://a.test/1", "first page")
+    cache_db.store_crawl_results([{"url": "http://b.test/2", "text": "second page"}, {"url": "http://c.test/3"}])
+    generation, urls = cache_db.get_cache_changes(start)
+    assert generation == start + 2 and sorted(urls) == ["http://a.test/1", "http://b.test/2"]
+    assert cache_db.get_cache_changes(generation) == (generation, [])
+    assert cache_db.get_cache_changes(generation - 1) == (generation, ["http://b.test/2"])
+
+
+def test_cache_changes_past_the_log_mean_clear_everything(cache_db, monkeypatch):
+    monkeypatch.setattr(cache_db, "CACHE_EVENTS_KEEP", 2)
+    for i in range(4):
+        cache_db.store_document(f"http://a.test/{i}", f"page {i}")
+    generation, urls = cache_db.get_cache_changes(0)
+    assert generation == 4 and urls is None
+    generation, urls = cache_db.get_cache_changes(2)
+    assert sorted(urls) == ["http://a.test/2", "http://a.test/3"]
@@ -0,0 +1,57 @@
+# File Name: test_service.py
+# Owner: Andrew John Holland
+# Purpose: Checks the shared chat service layer and the routes kept from the retired Flask app.py (/monk, /stats).
+# Version Control: v1.0
+# Change Log:
+# 1. Initial creation - 2026-10-18
+
+import asyncio
+import httpx
+from backend.model_client import STUB_REPLY, ModelClients
+from backend.rate_limit import ModelGate, TokenBucket
+from backend.response_cache import ResponseCache
+from backend.service import ChatService
+from backend.sessions import MemorySessionStore
+
+
+def make_service():
+    return ChatService(model_clients=ModelClients(backend="stub", generation_config={}),
+                       model_gate=ModelGate(bucket=TokenBucket(rate_per_minute=60000, burst=1000)),
+                       response_cache=ResponseCache(), session_store=MemorySessionStore())
+
+
+def test_reply_sources(monk_bot):
+    service = make_service()
+
+    async def ask():
+        first = await service.reply("who is holland")
+        repeat = await service.reply("Who is Holland?")
+        follow_up = await service.reply("tell me more", first.session_id)
+        return first, repeat, follow_up
+
+    first, repeat, follow_up = asyncio.run(ask())
+    assert (first.text, first.source) == (STUB_REPLY, "model")
+    assert repeat.source == "cache" and repeat.session_id != first.session_id
+    assert follow_up.source == "model" and follow_up.session_id == first.session_id
+
+
+def test_monk_compatibility_routes(monk_bot, monkeypatch):
+    monkeypatch.setattr(monk_bot, "service", make_service())
+
+    async def call():
+        transport = httpx.ASGITransport(app=monk_bot.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://monk") as client:
+            reply = await client.post("/monk", json={"message": "who is holland"})
+            empty = await client.post("/monk", json={"message": "  "})
+            stats = await client.get("/stats")
+            return reply, empty, stats
+
+    reply, empty, stats = asyncio.run(call())
+    assert reply.status_code == 200 and reply.json()["response"] == STUB_REPLY
+    assert empty.status_code == 400 and "error" in empty.json()
+    assert stats.json()["response_cache"]["size"] == 1
+
+
+def test_app_py_serves_the_same_app(monk_bot):
+    from backend.app import app
+    assert app is monk_bot.app
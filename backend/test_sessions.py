@@ -0,0 +1,108 @@
+# File Name: test_sessions.py
+# Owner: Andrew John Holland
+# Purpose: Checks conversation sessions: history compaction under the char budget, context reuse for follow-ups, memory/SQLite stores and session-aware /api/chat.
+# Version Control: v1.1
+# Change Log:
+# 1. Initial creation - 2026-10-18
+# 2. Patch components on monk_bot.service (shared ChatService) - 2026-10-18
+
+import asyncio
+import httpx
+from backend.sessions import MemorySessionStore, Session, SQLiteSessionStore
+
+CONTEXT = "[http://www.andrewholland.com]\nAndrew Holland builds secure compliance pipelines for aerospace."
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_history_compacts_to_budget():
+    session = Session("s" * 22)
+    for i in range(10):
+        session.add_turn(f"question number {i} about holland", "reply " * 60, budget=600)
+        assert len(session.history()) <= 600
+    history = session.history()
+    assert history.startswith("Earlier questions: ")
+    assert "User: question number 9 about holland" in history  # latest turn kept verbatim
+    assert "question number 0" not in history  # oldest questions dropped once the summary fills up
+    assert all(len(reply) <= 240 for _, reply in session.turns)
+
+
+def test_context_reused_only_when_it_covers_the_follow_up():
+    session = Session("s" * 22)
+    session.remember_context(CONTEXT, generation=3)
+    assert session.reusable_context("tell me more", 3) == CONTEXT
+    assert session.reusable_context("What about aerospace compliance?", 3) == CONTEXT
+    assert session.reusable_context("What about his photography?", 3) is None
+    assert session.reusable_context("tell me more", 4) is None  # data_cache refreshed since
+
+
+def test_memory_store_lru_and_ttl():
+    clock = Clock()
+    store = MemorySessionStore(max_sessions=2, ttl=10, clock=clock)
+    first, second = store.open(), store.open()
+    store.save(first)
+    store.save(second)
+    assert store.open(first.id) is first  # now most recent
+    store.save(store.open())
+    assert store.get(second.id) is None  # evicted
+    clock.now = 11
+    assert store.open(first.id).id != first.id  # expired, so a new conversation starts
+    assert store.open("not a valid id!").id != "not a valid id!"
+    stats = store.stats()
+    assert (stats["evictions"], stats["expirations"], stats["created"]) == (1, 1, 5)
+
+
+def test_sqlite_store_round_trip(tmp_path):
+    clock = Clock()
+    store = SQLiteSessionStore(str(tmp_path / "sessions.db"), ttl=10, clock=clock)
+    session = store.open()
+    session.add_turn("who is holland", "A compliance architect.")
+    session.remember_context(CONTEXT, 1)
+    store.save(session)
+
+    other_worker = SQLiteSessionStore(str(tmp_path / "sessions.db"), ttl=10, clock=clock)
+    loaded = other_worker.open(session.id)
+    assert loaded.history() == session.history() and loaded.reusable_context("aerospace", 1) == CONTEXT
+    clock.now = 11
+    assert other_worker.get(session.id) is None
+    store.close()
+    other_worker.close()
+
+
+def test_follow_up_uses_history_and_skips_retrieval(monk_bot, monkeypatch, slow_model, use_model):
+    prompts, retrievals = [], []
+
+    class RecordingModel(slow_model):
+        delay = 0
+
+        async def generate_content_async(self, prompt):
+            prompts.append(prompt)
+            return await super().generate_content_async(prompt)
+
+    async def fake_retrieval(query):
+        retrievals.append(query)
+        return CONTEXT
+
+    use_model(RecordingModel)
+    monkeypatch.setattr(monk_bot.service, "session_store", MemorySessionStore())
+    monkeypatch.setattr(monk_bot.service, "retrieve", fake_retrieval)
+
+    async def converse():
+        transport = httpx.ASGITransport(app=monk_bot.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://monk") as client:
+            first = (await client.post("/api/chat", json={"message": "What does Holland build?"})).json()
+            second = (await client.post("/api/chat", json={"message": "tell me more about the compliance",
+                                                           "session_id": first["session_id"]})).json()
+            return first, second
+
+    first, second = asyncio.run(converse())
+    assert second["session_id"] == first["session_id"]
+    assert retrievals == ["What does Holland build?"]
+    assert "Conversation so far" not in prompts[0]
+    assert "User: What does Holland build?" in prompts[1]
@@ -0,0 +1,106 @@
+# File Name: test_streaming.py
+# Owner: Andrew John Holland
+# Purpose: Exercises /api/chat/stream over a real uvicorn socket with a fake streaming model; measures time-to-first-byte and checks disconnect cancellation.
+# Version Control: v1.4
+# Change Log:
+# 1. Initial creation with TTFB and client-disconnect checks - 2026-10-18
+# 2. Run with an open quota gate so the stream always reaches the fake model - 2026-10-18
+# 3. Stub the model client instead of the Gemini SDK module, which is now imported lazily - 2026-10-18
+# 4. Install fake models with the use_model fixture (ModelClients backend) - 2026-10-18
+# 5. Patch components on monk_bot.service (shared ChatService) - 2026-10-18
+
+import asyncio
+import json
+import socket
+import threading
+import time
+import httpx
+import pytest
+import uvicorn
+from backend.response_cache import ResponseCache
+
+CHUNKS = 5
+CHUNK_DELAY = 0.1
+
+
+class StreamingModel:
+    """Fake genai.GenerativeModel whose stream=True reply trickles out CHUNKS pieces."""
+
+    closed = []
+
+    def __init__(self, name, generation_config=None):
+        self.name = name
+
+    async def generate_content_async(self, prompt, stream=False):
+        return FakeStream()
+
+
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeStream:
+    async def __aiter__(self):
+        produced = 0
+        try:
+            for i in range(CHUNKS):
+                await asyncio.sleep(CHUNK_DELAY)
+                produced += 1
+                yield FakeChunk(f"part{i} ")
+        finally:
+            StreamingModel.closed.append(produced)
+
+
+@pytest.fixture
+def server_url(monk_bot, monkeypatch, open_gate, use_model):
+    use_model(StreamingModel)
+    monkeypatch.setattr(monk_bot.service, "response_cache", ResponseCache())
+    StreamingModel.closed.clear()
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(monk_bot.app, log_level="warning"))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    yield f"http://127.0.0.1:{sock.getsockname()[1]}"
+    server.should_exit = True
+    thread.join(5)
+
+
+def _events(lines):
+    event = None
+    for line in lines:
+        if line.startswith("event: "):
+            event = line[7:]
+        elif line.startswith("data: "):
+            yield event or "message", json.loads(line[6:])
+            event = None
+
+
+def test_first_chunk_arrives_before_generation_finishes(server_url):
+    start = time.perf_counter()
+    ttfb, texts = None, []
+    with httpx.stream("POST", f"{server_url}/api/chat/stream", json={"message": "kronos"}, timeout=5) as resp:
+        assert resp.headers["content-type"].startswith("text/event-stream")
+        for event, data in _events(resp.iter_lines()):
+            if event == "message":
+                ttfb = ttfb or time.perf_counter() - start
+                texts.append(data["text"])
+            elif event == "done":
+                break
+    total = time.perf_counter() - start
+    assert "".join(texts) == "".join(f"part{i} " for i in range(CHUNKS))
+    assert ttfb < CHUNK_DELAY * 2 < total
+    print(f"\nTTFB {ttfb * 1000:.0f}ms vs full reply {total * 1000:.0f}ms")
+
+
+def test_disconnect_stops_upstream_generation(server_url):
+    with httpx.stream("POST", f"{server_url}/api/chat/stream", json={"message": "kronos"}, timeout=5) as resp:
+        next(_events(resp.iter_lines()))
+    # Closing after the first chunk must close the model stream before it produces the rest
+    deadline = time.perf_counter() + CHUNK_DELAY * CHUNKS * 2
+    while not StreamingModel.closed and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    assert StreamingModel.closed and StreamingModel.closed[0] < CHUNKS
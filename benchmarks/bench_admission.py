@@ -0,0 +1,91 @@
+# File Name: bench_admission.py
+# Owner: Andrew John Holland
+# Purpose: Tail latency under overload with and without admission control: Poisson chat arrivals above a worker's capacity, served through AdmissionController with an unbounded queue (the old semaphore) or the bounded, deadline-aware defaults.
+# Version: v1.0
+# Last Updated: 2026-10-18
+# Change Log:
+# 1. v1.0 - Initial creation; simulated service time per chat (asyncio.sleep), a mix of short and long questions, latency percentiles for served and rejected chats (most 429s are immediate; the rest come at the deadline)
+#
+# Usage (from project root): python benchmarks/bench_admission.py [--slots 4] [--service-ms 50] [--load 2.0] [--seconds 3] [--deadline 0.5]
+
+import argparse
+import asyncio
+import math
+import os
+import random
+import sys
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+from backend.admission import AdmissionController, AdmissionRejected  # noqa: E402
+
+SHORT_Q = "who is holland"
+LONG_Q = "walk me through the kronos rollout " * 10
+
+
+def percentile(values, q):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+
+async def drive(gate, rate, seconds, service, rng):
+    """Fire chats at `rate`/s for `seconds`; returns ([(kind, latency) served], [latency rejected])."""
+    served, rejected = [], []
+
+    async def chat(message):
+        start = time.perf_counter()
+        try:
+            async with gate.slot(None, message):
+                await asyncio.sleep(service)
+        except AdmissionRejected:
+            rejected.append(time.perf_counter() - start)
+            return
+        served.append(('short' if message is SHORT_Q else 'long', time.perf_counter() - start))
+
+    tasks = []
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        tasks.append(asyncio.create_task(chat(SHORT_Q if rng.random() < 0.7 else LONG_Q)))
+        await asyncio.sleep(rng.expovariate(rate))
+    await asyncio.gather(*tasks)
+    return served, rejected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--slots', type=int, default=4)
+    parser.add_argument('--service-ms', type=float, default=50)
+    parser.add_argument('--load', type=float, default=2.0, help='offered load as a multiple of capacity')
+    parser.add_argument('--seconds', type=float, default=3)
+    parser.add_argument('--deadline', type=float, default=0.5)
+    args = parser.parse_args()
+
+    service = args.service_ms / 1000
+    rate = args.load * args.slots / service
+    configs = {
+        'unbounded queue': dict(max_queue=10 ** 9, queue_deadline=float('inf')),
+        'admission control': dict(max_queue=args.slots * 2 * int(args.deadline / service + 1),
+                                  queue_deadline=args.deadline),
+    }
+    print(f"{args.slots} slots x {args.service_ms:.0f} ms, {rate:.0f} chats/s offered ({args.load}x capacity) "
+          f"for {args.seconds}s")
+    print(f"{'config':<18} {'served':>7} {'rejected':>9} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} "
+          f"{'short p99':>10} {'long p99':>9} {'429 p50 ms':>11} {'429 p99 ms':>11}")
+    for name, config in configs.items():
+        gate = AdmissionController(max_active=args.slots, client_rpm=0, client_active=0, **config)
+        gate.service_seconds = service
+        served, rejected = asyncio.run(drive(gate, rate, args.seconds, service, random.Random(7)))
+        latencies = [latency for _, latency in served]
+        by_kind = {kind: [latency for k, latency in served if k == kind] for kind in ('short', 'long')}
+        print(f"{name:<18} {len(served):>7} {len(rejected):>9} {percentile(latencies, 0.5) * 1000:>8.0f} "
+              f"{percentile(latencies, 0.99) * 1000:>8.0f} {max(latencies) * 1000:>8.0f} "
+              f"{percentile(by_kind['short'], 0.99) * 1000:>10.0f} {percentile(by_kind['long'], 0.99) * 1000:>9.0f} "
+              f"{percentile(rejected, 0.5) * 1000:>11.1f} {percentile(rejected, 0.99) * 1000:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
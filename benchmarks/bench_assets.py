@@ -0,0 +1,90 @@
+# File Name: bench_assets.py
+# Owner: Andrew John Holland
+# Purpose: Benchmarks homepage visits (index.html plus the CSS, JS, favicon and background it loads): the old StaticFiles/FileResponse serving vs the in-memory assets.AssetIndex, first visit and repeat visit.
+# Version: v1.0
+# Last Updated: 2026-10-18
+# Change Log:
+# 1. v1.0 - Initial creation; in-process ASGI, requests/bytes/server time per page view
+#
+# Usage (from project root): python benchmarks/bench_assets.py [--visits 200]
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+os.environ.setdefault('GOOGLE_API_KEY', 'offline-bench-key')
+os.environ['DB_BACKEND'] = 'sqlite'
+os.environ['SQLITE_DB_PATH'] = os.path.join(tempfile.mkdtemp(prefix='monk-bench-'), 'data_cache.db')
+os.environ['LOG_DIR'] = tempfile.mkdtemp(prefix='monk-bench-logs-')
+
+import httpx  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from fastapi.staticfiles import StaticFiles  # noqa: E402
+from starlette.responses import FileResponse  # noqa: E402
+from backend import monk_bot  # noqa: E402
+
+PAGE = ['/', '/frontend/styles.css', '/frontend/script.js', '/static/favicon.ico', '/static/cyberpunk-bg.jpg']
+
+
+def legacy_app():
+    """How monk_bot served assets before the asset index."""
+    app = FastAPI()
+    app.mount('/static', StaticFiles(directory=os.path.join(PROJECT_ROOT, 'static')))
+    app.mount('/frontend', StaticFiles(directory=os.path.join(PROJECT_ROOT, 'frontend')))
+
+    @app.get('/')
+    async def home():
+        index_path = os.path.join(PROJECT_ROOT, 'frontend', 'index.html')
+        if not os.path.exists(index_path):
+            raise FileNotFoundError(index_path)
+        return FileResponse(index_path)
+    return app
+
+
+async def visits(app, urls, etags, repeat, count, immutable=()):
+    """Average (requests, bytes, ms) per page view. On repeat views the browser revalidates with If-None-Match
+    and skips URLs it may cache outright (fingerprinted, immutable)."""
+    transport = httpx.ASGITransport(app=app)
+    requests = size = 0
+    async with httpx.AsyncClient(transport=transport, base_url='http://monk') as client:
+        start = time.perf_counter()
+        for _ in range(count):
+            for url in urls:
+                if repeat and url in immutable:
+                    continue
+                headers = {'Accept-Encoding': 'gzip, br'}
+                if repeat and etags.get(url):
+                    headers['If-None-Match'] = etags[url]
+                response = await client.get(url, headers=headers)
+                requests += 1
+                size += int(response.headers.get('content-length') or 0)
+                etags[url] = response.headers.get('etag')
+        elapsed = time.perf_counter() - start
+    return requests / count, size / count, elapsed / count * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--visits', type=int, default=200)
+    args = parser.parse_args()
+
+    assets = monk_bot.assets.load()
+    fingerprinted = ['/'] + [assets.url_for(url) for url in PAGE[1:]]
+    print(f"{'serving':<14} {'visit':<7} {'requests':>9} {'KB':>9} {'ms':>7}")
+    for name, app, urls, immutable in (('StaticFiles', legacy_app(), PAGE, ()),
+                                       ('AssetIndex', monk_bot.app, fingerprinted, fingerprinted[1:])):
+        etags = {}
+        for visit in ('first', 'repeat'):
+            requests, size, ms = asyncio.run(visits(app, urls, etags, visit == 'repeat', args.visits, immutable))
+            print(f"{name:<14} {visit:<7} {requests:>9.0f} {size / 1024:>9.2f} {ms:>7.2f}")
+    print(f"\nasset index: {assets.stats()}")
+
+
+if __name__ == '__main__':
+    main()
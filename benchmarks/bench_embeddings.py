@@ -0,0 +1,123 @@
+# File Name: bench_embeddings.py
+# Owner: Andrew John Holland
+# Purpose: Recall@k and latency of data_cache retrieval: legacy LIKE '%query%' lookup, FTS keyword ranking, embedding (vector) search and hybrid fusion, on questions that use a page's exact words, other word forms, or misspellings.
+# Version: v1.1
+# Last Updated: 2026-10-18
+# Change Log:
+# 1. v1.1 - numpy reported through embeddings.load_numpy (imported on first use now)
+# 2. v1.0 - Initial creation; synthetic pages with one planted fact (rare, name-like words) each; reworded questions change word forms, order and spelling
+#
+# Usage (from project root): python benchmarks/bench_embeddings.py [--pages 200 1000] [--queries 100] [--k 3]
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+os.environ.setdefault('DB_BACKEND', 'sqlite')
+
+from backend import database, embeddings, ingest, retrieval  # noqa: E402
+
+LEGACY_LIKE = "SELECT url FROM data_cache WHERE content LIKE ? ORDER BY timestamp DESC LIMIT ?"
+# The fact on a page uses one word form; its reworded question another
+FORMS = [('ment', 'ed'), ('ation', 'ing'), ('s', ''), ('er', 'ing'), ('ed', 's')]
+WRAPPERS = ["what about {}?", "tell me about {}", "{} - any details?", "how did {} go?"]
+LETTERS = 'abcdefghijklmnopqrstuvwxyz'
+QUESTION_KINDS = ('exact', 'word forms', 'misspelled')
+
+
+def make_words(rng, count, length=7):
+    """Distinct random words: stand-ins for the names (Kronos, Etihad, Proxmox) the real pages are about."""
+    words = set()
+    while len(words) < count:
+        words.add(''.join(rng.choice(LETTERS) for _ in range(length)))
+    return sorted(words)
+
+
+def misspell(rng, word):
+    i = rng.randrange(1, len(word) - 1)
+    return word[:i] + rng.choice(LETTERS) + word[i + 1:] if rng.random() < 0.5 else word[:i] + word[i + 1:]
+
+
+def make_corpus(rng, pages):
+    """[(url, text, {question kind: question})]: each page plants a three-word fact among filler words."""
+    stems = make_words(rng, pages * 3)
+    filler = make_words(random.Random(1), 4000)
+    rng.shuffle(stems)
+    corpus = []
+    for i in range(pages):
+        fact, forms, typos = [], [], []
+        for stem in stems[i * 3:i * 3 + 3]:
+            page_form, question_form = rng.choice(FORMS)
+            fact.append(stem + page_form)
+            forms.append(stem + question_form)
+            typos.append(misspell(rng, stem + page_form))
+        rng.shuffle(forms)
+        body = [rng.choice(filler) for _ in range(300)]
+        body[rng.randrange(len(body)):0] = ['the'] + fact
+        wrapper = rng.choice(WRAPPERS)
+        questions = dict(zip(QUESTION_KINDS, (wrapper.format(' '.join(words)) for words in (fact, forms, typos))))
+        corpus.append((f'https://example.test/page/{i}', ' '.join(body), questions))
+    return corpus
+
+
+def evaluate(search, cases, k):
+    """Recall@k (target page among the top k) and mean ms per query."""
+    hits = 0
+    start = time.perf_counter()
+    for url, question in cases:
+        hits += url in search(question, k)
+    return hits / len(cases), (time.perf_counter() - start) / len(cases) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--pages', type=int, nargs='+', default=[200, 1000])
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--k', type=int, default=3)
+    args = parser.parse_args()
+
+    methods = {
+        'LIKE (legacy)': lambda q, k: [row[0] for row in database.fetch_all(LEGACY_LIKE, (f'%{q}%', k))],
+        'FTS5 keyword': lambda q, k: [row[0] for row in retrieval.search_cache(q, k)],
+        'vector': lambda q, k: [row[0] for row in index.search(q, k, mode='vector')],
+        'hybrid': lambda q, k: [row[0] for row in index.search(q, k, mode='hybrid')],
+    }
+    print(f"numpy: {embeddings.load_numpy() is not None}, dim {embeddings.EMBEDDING_DIM}, recall@{args.k}")
+    print(f"{'pages':>6} {'method':<14} " + ' '.join(f'{kind:>11}' for kind in QUESTION_KINDS) + f" {'ms/query':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for pages in args.pages:
+            rng = random.Random(pages)
+            corpus = make_corpus(rng, pages)
+            database.DB_PATH = os.path.join(tmp, f'bench_{pages}.db')
+            database.init_db()
+            for url, text, _ in corpus:
+                database.store_document(url, ingest.html_to_text(f'<p>{text}</p>'))
+            start = time.perf_counter()
+            index = embeddings.EmbeddingIndex(os.path.join(tmp, f'index_{pages}'))
+            index.build()
+            index.load(build_missing=False)
+            build_seconds = time.perf_counter() - start
+
+            sample = rng.sample(corpus, min(args.queries, pages))
+            for name, search in methods.items():
+                results = [evaluate(search, [(url, questions[kind]) for url, _, questions in sample], args.k)
+                           for kind in QUESTION_KINDS]
+                print(f"{pages:>6} {name:<14} " + ' '.join(f'{recall:>11.0%}' for recall, _ in results) +
+                      f" {sum(ms for _, ms in results) / len(results):>9.3f}")
+
+            questions = [questions['misspelled'] for _, _, questions in sample]
+            start = time.perf_counter()
+            index.search_ids(questions, args.k)
+            batched_ms = (time.perf_counter() - start) / len(questions) * 1000
+            print(f"{pages:>6} vector scoring batched x{len(questions)}: {batched_ms:.3f} ms/query; "
+                  f"index build {build_seconds:.2f}s for {index.stats()['chunks']} chunks")
+            database.get_pool().close()
+
+
+if __name__ == '__main__':
+    main()
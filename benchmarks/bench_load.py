@@ -0,0 +1,333 @@
+# File Name: bench_load.py
+# Owner: Andrew John Holland
+# Purpose: Offline load test for the chat service: starts backend.monk_bot:app under a single uvicorn process and/or gunicorn.conf.py workers against a seeded SQLite data_cache and the stub model, drives concurrent chats, and saves latency percentiles, throughput, per-stage timings and memory per phase (startup, after warm-up, end, peak) as JSON.
+# Version: v1.4
+# Last Updated: 2026-10-18
+# Change Log:
+# 1. v1.4 - Memory labelled as what it is: RSS per phase (startup, after warm-up, end, peak), not per stage; every stage runs in the same worker process, so RSS cannot be split between them
+# 2. v1.3 - Stage timings and reply sources read per request from the Server-Timing header (SERVER_TIMING=1): exact percentiles instead of ones interpolated from /metrics buckets, and real numbers for gunicorn (every worker, not one process's /metrics); --compare checks stage means as well as p95
+# 3. v1.2 - Per-client admission limits off in the server under test (all simulated users share one address)
+# 4. v1.1 - Targets are uvicorn (one process) and gunicorn (gunicorn.conf.py workers) now that app.py's Flask server is retired; --path picks /api/chat or /monk; memory summed over worker processes
+# 5. v1.0 - Initial creation; server subprocesses on free ports, one client per simulated user, per-stage histograms from /metrics, RSS from /proc, --compare against a saved run
+#
+# Usage (from project root):
+#   python benchmarks/bench_load.py [--target uvicorn gunicorn] [--workers 2] [--path /api/chat]
+#                                   [--requests 2000] [--concurrency 32]
+#                                   [--connection close|keep-alive]
+#                                   [--model-delay 0.05] [--pages 500] [--output results.json]
+#                                   [--compare baseline.json --max-regression 0.2]
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+import httpx  # noqa: E402
+from bench_retrieval import QUERIES, VOCAB, make_page  # noqa: E402
+from backend import database, ingest  # noqa: E402
+
+RESULTS_DIR = os.path.join(PROJECT_ROOT, 'benchmarks', 'results')
+
+TARGETS = {
+    # name: server command; both serve backend.monk_bot:app and report readiness on /ready
+    'uvicorn': [sys.executable, '-m', 'uvicorn', 'backend.monk_bot:app', '--host', '127.0.0.1',
+                '--port', '{port}', '--log-level', 'warning', '--no-access-log'],
+    'gunicorn': [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', '127.0.0.1:{port}',
+                 '--log-level', 'warning', 'backend.monk_bot:app'],
+}
+
+# One Server-Timing entry: a stage with its duration in ms, or the reply source as a description
+TIMING_RE = re.compile(r'([\w-]+);(?:dur=([\d.]+)|desc="([^"]*)")')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def seed_cache(db_path, pages, rng):
+    database.DB_PATH = db_path
+    database.init_db()
+    for i in range(pages):
+        database.store_document(f"https://example.test/page/{i}", ingest.html_to_text(make_page(rng)))
+    database.close_db()
+
+
+def process_tree(pid):
+    """pid and all its descendants (gunicorn master + workers), via Linux /proc children lists."""
+    pids, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        pids.append(current)
+        try:
+            with open(f'/proc/{current}/task/{current}/children') as f:
+                pending += [int(child) for child in f.read().split()]
+        except OSError:
+            pass
+    return pids
+
+
+def rss_mb(pid):
+    """Current and peak resident memory in MB of a process and its children, summed (Linux /proc);
+    (None, None) elsewhere."""
+    rss = peak = 0
+    try:
+        for member in process_tree(pid):
+            with open(f'/proc/{member}/status') as f:
+                fields = dict(line.split(':', 1) for line in f if ':' in line)
+            rss += int(fields['VmRSS'].split()[0])
+            peak += int(fields['VmHWM'].split()[0])
+    except (OSError, KeyError, ValueError):
+        return None, None
+    return rss / 1024, peak / 1024
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def parse_server_timing(header):
+    """({stage: seconds}, reply source or None) from one reply's Server-Timing header."""
+    stages, source = {}, None
+    for name, duration, description in TIMING_RE.findall(header or ''):
+        if description:
+            source = description
+        else:
+            stages[name] = float(duration) / 1000
+    return stages, source
+
+
+def stage_summary(timings):
+    """Per-stage count, mean and percentiles over the stage timings of every request that ran the stage."""
+    by_stage = {}
+    for stages in timings:
+        for stage, seconds in stages.items():
+            by_stage.setdefault(stage, []).append(seconds)
+    summary = {}
+    for stage, values in by_stage.items():
+        values.sort()
+        summary[stage] = {
+            'count': len(values),
+            'mean_ms': round(sum(values) / len(values) * 1000, 4),
+            **{f'p{int(q * 100)}_ms': round(percentile(values, q) * 1000, 4) for q in (0.5, 0.95, 0.99)},
+        }
+    return summary
+
+
+def make_questions(total, cache_hit_ratio, rng):
+    questions = []
+    for i in range(total):
+        if questions and rng.random() < cache_hit_ratio:
+            questions.append(rng.choice(questions))
+        else:
+            questions.append(f"{rng.choice(QUERIES)} {' '.join(rng.sample(VOCAB, 2))} #{i}")
+    return questions
+
+
+async def drive(base_url, path, questions, concurrency, connection='close'):
+    """Each worker is one simulated browser with its own client. connection='close' opens a connection per
+    chat; with keep-alive the httpx pools themselves add queueing at high concurrency, which is measured as
+    server latency. Returns (seconds, latencies, errors, per-request stage timings, reply counts by source)."""
+    latencies, errors, timings, replies = [], 0, [], {}
+    pending = iter(questions)
+    headers = {'Connection': 'close'} if connection == 'close' else {}
+
+    async def worker():
+        nonlocal errors
+        async with httpx.AsyncClient(base_url=base_url, headers=headers, timeout=60) as client:
+            for question in pending:
+                start = time.perf_counter()
+                try:
+                    response = await client.post(path, json={'message': question})
+                    ok = response.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                latencies.append(time.perf_counter() - start)
+                errors += not ok
+                if ok:
+                    stages, source = parse_server_timing(response.headers.get('Server-Timing'))
+                    timings.append(stages)
+                    replies[source] = replies.get(source, 0) + 1
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return time.perf_counter() - start, latencies, errors, timings, replies
+
+
+def wait_ready(process, base_url, path, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited during startup:\n{process.stderr.read().decode(errors='replace')[-2000:]}")
+        try:
+            if httpx.get(base_url + path, timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"server not ready after {timeout}s")
+
+
+def run_target(name, args, env, rng):
+    workers = args.workers if name == 'gunicorn' else 1
+    port = free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    process = subprocess.Popen([part.replace('{port}', str(port)) for part in TARGETS[name]], cwd=PROJECT_ROOT,
+                               env=dict(env, WEB_CONCURRENCY=str(workers)),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        started = time.perf_counter()
+        wait_ready(process, base_url, '/ready')
+        startup_seconds = time.perf_counter() - started
+        memory_startup, _ = rss_mb(process.pid)
+
+        asyncio.run(drive(base_url, args.path, make_questions(args.warmup, 0, rng), args.concurrency,
+                          args.connection))
+        memory_warm, _ = rss_mb(process.pid)
+
+        # Stage timings come back with each reply, from whichever worker served it (warm-up excluded)
+        questions = make_questions(args.requests, args.cache_hit_ratio, rng)
+        seconds, latencies, errors, timings, replies = asyncio.run(
+            drive(base_url, args.path, questions, args.concurrency, args.connection))
+        memory_end, memory_peak = rss_mb(process.pid)
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+    latencies.sort()
+    return {
+        'workers': workers,
+        'requests': len(latencies),
+        'errors': errors,
+        'seconds': round(seconds, 3),
+        'throughput_rps': round(len(latencies) / seconds, 1),
+        'startup_seconds': round(startup_seconds, 3),
+        'latency_ms': {
+            'mean': round(sum(latencies) / len(latencies) * 1000, 3),
+            **{f'p{int(q * 100)}': round(percentile(latencies, q) * 1000, 3) for q in (0.5, 0.95, 0.99)},
+            'max': round(latencies[-1] * 1000, 3),
+        },
+        'replies': replies,
+        'stages': stage_summary(timings),
+        'memory_mb': {key: round(value, 1) if value is not None else None for key, value in (
+            ('startup', memory_startup), ('after_warmup', memory_warm), ('end', memory_end), ('peak', memory_peak))},
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(results):
+    for name, result in results['targets'].items():
+        latency = result['latency_ms']
+        print(f"\n{name}: {result['requests']} requests, {result['errors']} errors, "
+              f"{result['throughput_rps']} req/s, p50 {latency['p50']} ms, p95 {latency['p95']} ms, "
+              f"p99 {latency['p99']} ms, replies {result['replies']}")
+        print(f"  memory MB per phase: {result['memory_mb']}")
+        print(f"  {'stage':<20} {'count':>7} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for stage, s in sorted(result['stages'].items()):
+            print(f"  {stage:<20} {s['count']:>7} {s['mean_ms']:>9.4f} {s['p50_ms']:>9.4f} "
+                  f"{s['p95_ms']:>9.4f} {s['p99_ms']:>9.4f}")
+
+
+def compare(results, baseline, max_regression):
+    """Print p95/throughput deltas against a saved run; returns the regressions beyond max_regression."""
+    regressions = []
+    print(f"\ncompared with {baseline.get('git_commit')} ({baseline.get('timestamp')}):")
+    for name, result in results['targets'].items():
+        old = baseline.get('targets', {}).get(name)
+        if not old:
+            continue
+        checks = [('latency p95 ms', old['latency_ms']['p95'], result['latency_ms']['p95'], True),
+                  ('throughput rps', old['throughput_rps'], result['throughput_rps'], False)]
+        checks += [(f'{stage} {stat.replace("_", " ")}', old['stages'][stage][stat], s[stat], True)
+                   for stage, s in sorted(result['stages'].items()) if stage in old['stages']
+                   for stat in ('mean_ms', 'p95_ms')]
+        for label, before, after, lower_is_better in checks:
+            if not before:
+                continue
+            change = (after - before) / before
+            worse = change > max_regression if lower_is_better else change < -max_regression
+            print(f"  {name:<8} {label:<28} {before:>10.4f} -> {after:>10.4f} ({change:+.1%}){'  REGRESSION' if worse else ''}")
+            if worse:
+                regressions.append(f'{name} {label}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--target', nargs='+', choices=sorted(TARGETS), default=['uvicorn', 'gunicorn'])
+    parser.add_argument('--workers', type=int, default=max(2, os.cpu_count() or 1), help='gunicorn workers')
+    parser.add_argument('--path', choices=('/api/chat', '/monk'), default='/api/chat')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--warmup', type=int, default=100)
+    parser.add_argument('--pages', type=int, default=500, help='synthetic pages seeded into data_cache')
+    parser.add_argument('--model-delay', type=float, default=0.05, help='stub model latency in seconds')
+    parser.add_argument('--cache-hit-ratio', type=float, default=0.0, help='share of repeated questions')
+    parser.add_argument('--connection', choices=('close', 'keep-alive'), default='close')
+    parser.add_argument('--seed', type=int, default=2049)
+    parser.add_argument('--output', help='JSON results path (default benchmarks/results/load-<timestamp>.json)')
+    parser.add_argument('--compare', help='earlier JSON results to diff against')
+    parser.add_argument('--max-regression', type=float, default=0.2)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    scratch = tempfile.mkdtemp(prefix='monk-bench-load-')
+    db_path = os.path.join(scratch, 'data_cache.db')
+    seed_cache(db_path, args.pages, rng)
+    env = dict(os.environ, PYTHONPATH=PROJECT_ROOT, DB_BACKEND='sqlite', SQLITE_DB_PATH=db_path,
+               LOG_DIR=scratch, LOG_CONSOLE='0', MODEL_BACKEND='stub', STUB_MODEL_DELAY=str(args.model_delay),
+               GOOGLE_API_KEY=os.getenv('GOOGLE_API_KEY') or 'offline-bench-key',
+               # The quota guard would shed most of a load test; the stub has no quota
+               GEMINI_RPM='100000000', GEMINI_BURST='1000000', SESSION_DB_PATH=os.path.join(scratch, 'sessions.db'),
+               # Every simulated user comes from this host; per-client admission limits would reject most of them
+               ADMISSION_CLIENT_RPM='0', ADMISSION_CLIENT_ACTIVE='0',
+               # Each reply reports its own stage timings, whichever worker served it
+               SERVER_TIMING='1')
+
+    timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    results = {
+        'timestamp': timestamp,
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'params': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'targets': {name: run_target(name, args, env, rng) for name in args.target},
+    }
+    print_report(results)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"load-{timestamp.replace(':', '')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nresults written to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        if regressions:
+            raise SystemExit(f"regressions beyond {args.max_regression:.0%}: {', '.join(regressions)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+# File Name: bench_logging.py
+# Owner: Andrew John Holland
+# Purpose: Benchmarks /api/chat throughput with logging enabled: the old synchronous basicConfig FileHandlers vs the queued logging_setup pipeline.
+# Version: v1.3
+# Last Updated: 2026-10-18
+# Change Log:
+# 1. v1.3 - Admission control without per-client limits (all in-process load comes from one address) and a slot per simulated client
+# 2. v1.2 - Components swapped on monk_bot.service (shared ChatService)
+# 3. v1.1 - Instant model is the model_client stub backend
+# 4. v1.0 - Initial creation; in-process ASGI load with an instant fake model, logs written to a temp dir; --disk-latency-ms simulates a slow log volume
+#
+# Usage (from project root): python benchmarks/bench_logging.py [--requests 2000] [--concurrency 32] [--disk-latency-ms 0]
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+LOG_DIR = tempfile.mkdtemp(prefix='monk-bench-logs-')
+os.environ.setdefault('GOOGLE_API_KEY', 'offline-bench-key')
+os.environ['DB_BACKEND'] = 'sqlite'
+os.environ['SQLITE_DB_PATH'] = os.path.join(tempfile.mkdtemp(prefix='monk-bench-'), 'data_cache.db')
+os.environ['LOG_DIR'] = LOG_DIR
+
+import httpx  # noqa: E402
+from backend import logging_setup, monk_bot  # noqa: E402
+from backend.admission import AdmissionController  # noqa: E402
+from backend.model_client import ModelClients  # noqa: E402
+from backend.rate_limit import ModelGate, TokenBucket  # noqa: E402
+from backend.response_cache import ResponseCache  # noqa: E402
+
+
+class SlowStream:
+    """File stream whose writes stall, like a busy disk or network volume."""
+
+    def __init__(self, stream, delay):
+        self._stream = stream
+        self._delay = delay
+
+    def write(self, data):
+        time.sleep(self._delay)
+        return self._stream.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def slow_down(handlers, delay):
+    for handler in handlers:
+        if delay and isinstance(handler, logging.FileHandler):
+            handler.stream = SlowStream(handler.stream, delay)
+
+
+def legacy_logging(devnull, delay):
+    """What the backends ran before: database.py's basicConfig won (DEBUG, two FileHandlers, console)."""
+    logging_setup.shutdown_logging()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    formatter = logging.Formatter(logging_setup.TEXT_FORMAT)
+    for handler in (logging.FileHandler(os.path.join(LOG_DIR, 'execution.log')),
+                    logging.FileHandler(os.path.join(LOG_DIR, 'error.log')),
+                    logging.StreamHandler(devnull)):
+        handler.setFormatter(formatter)
+        root.addHandler(handler)
+    root.setLevel(logging.DEBUG)
+    slow_down(root.handlers, delay)
+
+
+def queued_logging(devnull, delay, level):
+    logging_setup.shutdown_logging()
+    listener = logging_setup.configure_logging(level=level, log_dir=LOG_DIR, console=True)
+    listener.handlers[-1].setStream(devnull)
+    slow_down(listener.handlers, delay)
+
+
+async def run_load(total, concurrency):
+    transport = httpx.ASGITransport(app=monk_bot.app)
+    pending = iter(range(total))
+    async with httpx.AsyncClient(transport=transport, base_url='http://monk') as client:
+        async def worker():
+            for i in pending:
+                response = await client.post('/api/chat', json={'message': f'question {i} about holland'})
+                assert response.status_code == 200
+        start = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--disk-latency-ms', type=float, default=0.0)
+    args = parser.parse_args()
+
+    monk_bot.service.model_clients = ModelClients(backend='stub')
+    monk_bot.service.model_gate = ModelGate(bucket=TokenBucket(rate_per_minute=6_000_000, burst=100_000))
+    # Every request comes from the same ASGI test address; per-client limits would answer most of them with 429
+    monk_bot.service.admission = AdmissionController(max_active=args.concurrency, client_rpm=0, client_active=0)
+    modes = (
+        ('sync FileHandlers (DEBUG)', legacy_logging),
+        ('queued (DEBUG)', lambda out, delay: queued_logging(out, delay, 'DEBUG')),
+        ('queued (INFO, default)', lambda out, delay: queued_logging(out, delay, 'INFO')),
+    )
+    delay = args.disk_latency_ms / 1000
+    print(f"{'logging':<28} {'req/s':>9} {'ms/req':>8} {'log bytes':>10}")
+    with open(os.devnull, 'w') as devnull:
+        for name, setup in modes:
+            for log in ('execution.log', 'error.log'):
+                open(os.path.join(LOG_DIR, log), 'w').close()
+            setup(devnull, delay)
+            monk_bot.service.response_cache = ResponseCache()
+            asyncio.run(run_load(50, args.concurrency))  # warm-up
+            elapsed = asyncio.run(run_load(args.requests, args.concurrency))
+            logging_setup.shutdown_logging()
+            size = sum(os.path.getsize(os.path.join(LOG_DIR, log)) for log in ('execution.log', 'error.log'))
+            print(f"{name:<28} {args.requests / elapsed:>9.0f} {elapsed / args.requests * 1e3:>8.2f} {size:>10}")
+
+
+if __name__ == '__main__':
+    main()
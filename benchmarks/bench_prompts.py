@@ -0,0 +1,69 @@
+# File Name: bench_prompts.py
+# Owner: Andrew John Holland
+# Purpose: Benchmarks prompt construction: the v2.8 get_prompt (persona rebuilt per call, unbounded data) vs build_prompt (precompiled templates, char budget).
+# Version: v1.0
+# Last Updated: 2026-10-18
+# Change Log:
+# 1. v1.0 - Initial creation; retrieved context from 1 KB to 1 MB, name-based and data prompts
+#
+# Usage (from project root): python benchmarks/bench_prompts.py [--iterations 2000]
+
+import argparse
+import os
+import sys
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+from backend.prompts import build_prompt  # noqa: E402
+
+
+def legacy_get_prompt(query, data):
+    """prompts.py v2.8 name-based branch: the only branch that substituted data, with no size limit."""
+    base_redirects = [
+        "http://www.andrewholland.com",
+        "https://www.andrewholland.com/career/Career_Identity.html",
+        "https://www.andrewholland.com/timeline/index.html",
+        "https://github.com/silicastormsiam",
+        "https://www.youtube.com/@SilicaStormSiam",
+        "https://www.andrewholland.com/downloads/aholland_executive_summary.pdf"
+    ]
+    import random
+    redirect_url = random.choice(base_redirects)
+    name = query.split("is", 1)[1].strip() if "is" in query else "friend"
+    return f"""Hello {name}, I’m CP Monk, once a Blade Runner with the 2019 LAPD Rep-Detect Unit, favoring cautious hunts like extended surveillance over Deckard’s chases. By 2049, I head security for Andrew John Holland’s SSS syndicate—SilicaStormSiam BioTech—monitoring comms from my neon shrine, meditating on Gaff’s origami unicorns. SSS, accused of illicit android parts but unproven in corrupt courts, reports expired replicants. I’m stoked to share Holland’s compliance mastery! Provide a fluid, vibrant response (under 100 words) using: {data}. Use Blade Runner terms, stay direct. Conclude with one hyperlink to: {redirect_url}. Example: 'Holland’s compliance locks are tighter than a spinner’s nav-core. His grid hums with secure deployments. Dive in: {redirect_url}' Query: {query} Ignite the grid!"""
+
+
+def make_context(size):
+    block = "[https://www.andrewholland.com/career/Career_Identity.html]\n" + "Kronos rollout at Etihad. " * 45
+    blocks = []
+    while sum(len(b) + 2 for b in blocks) < size:
+        blocks.append(block)
+    return "\n\n".join(blocks)[:size]
+
+
+def timed(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        result = fn()
+    return (time.perf_counter() - start) / iterations * 1e6, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    query = "hello my name is Deckard"
+    print(f"{'context':>9} {'legacy us':>10} {'legacy chars':>13} {'build us':>9} {'build chars':>12} {'budget':>7}")
+    for size in (1_000, 10_000, 100_000, 1_000_000):
+        data = make_context(size)
+        iterations = max(20, args.iterations * 1000 // size)
+        legacy_us, legacy = timed(lambda: legacy_get_prompt(query, data), iterations)
+        build_us, prompt = timed(lambda: build_prompt(query, data), iterations)
+        print(f"{size:>9} {legacy_us:>10.1f} {len(legacy):>13} {build_us:>9.1f} {prompt.chars:>12} {prompt.budget:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+# File Name: bench_refresh.py
+# Owner: Andrew John Holland
+# Purpose: Benchmarks what a background refresh costs the response cache: wholesale clear on a generation bump vs per-URL invalidation from the cache_events log vs no invalidation (the context hash in the key alone), as the share of pages changed per refresh grows.
+# Version: v1.1
+# Last Updated: 2026-10-18
+# Change Log:
+# 1. v1.1 - Each refresh cycle asks --asks questions drawn with Zipf popularity (repeats within a cycle, so clearing still gets hits); 'keep' baseline that never invalidates and relies on the context hash; entries left per mode
+# 2. v1.0 - Initial creation; in-memory ResponseCache, hit rate of the question stream after each refresh
+#
+# Usage (from project root): python benchmarks/bench_refresh.py [--pages 40] [--questions 400] [--asks 400] [--refreshes 20] [--zipf 1.0]
+
+import argparse
+import os
+import random
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+from backend.response_cache import ResponseCache  # noqa: E402
+
+
+def context_for(question, pages, versions):
+    """Retrieved context for a question: two pages, as retrieval.format_context tags them."""
+    rng = random.Random(question)
+    return '\n\n'.join(f'[{url}]\npage text v{versions[url]}' for url in rng.sample(pages, 2))
+
+
+# What a refresh does to the cache: clear everything, drop entries built from the changed pages, or nothing
+# (replies over a changed page are never looked up again: the new context hashes differently)
+MODES = {
+    'clear': lambda changed: None,
+    'per-url': lambda changed: changed,
+    'keep': lambda changed: [],
+}
+
+
+def run(mode, pages, questions, asks, refreshes, changed_share, zipf, seed=7):
+    """(hit rate, entries left) over `asks` questions per refresh cycle, popular questions asked more often.
+
+    Every mode sees the same questions and the same changed pages.
+    """
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) ** zipf for rank in range(len(questions))]
+    versions = dict.fromkeys(pages, 0)
+    cache = ResponseCache(max_entries=len(questions) * refreshes * 2, ttl=1e9)
+    generation = 0
+    cache.set_generation(generation)
+    hits = lookups = 0
+    for _ in range(refreshes):
+        for question in rng.choices(questions, weights, k=asks):
+            context = context_for(question, pages, versions)
+            lookups += 1
+            if cache.get(question, context) is not None:
+                hits += 1
+            else:
+                cache.put(question, context, 'reply')
+        changed = rng.sample(pages, max(1, int(len(pages) * changed_share)))
+        for url in changed:
+            versions[url] += 1
+        generation += 1
+        cache.set_generation(generation, MODES[mode](changed))
+    return hits / lookups, cache.stats()['size']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--pages', type=int, default=40)
+    parser.add_argument('--questions', type=int, default=400, help='distinct questions')
+    parser.add_argument('--asks', type=int, default=400, help='questions asked between two refreshes')
+    parser.add_argument('--refreshes', type=int, default=20)
+    parser.add_argument('--zipf', type=float, default=1.0, help='popularity skew (0: every question equally likely)')
+    args = parser.parse_args()
+
+    pages = [f'https://www.andrewholland.com/page/{i}.html' for i in range(args.pages)]
+    questions = [f'question {i}' for i in range(args.questions)]
+    print(f"{args.asks} asks per refresh over {args.questions} questions (zipf {args.zipf}), {args.refreshes} refreshes")
+    print(f"{'changed/refresh':>16}" + ''.join(f" {mode + ' hit rate':>17} {mode + ' size':>13}" for mode in MODES))
+    for share in (0.025, 0.1, 0.25, 0.5):
+        row = f"{share:>16.1%}"
+        for mode in MODES:
+            hit_rate, size = run(mode, pages, questions, args.asks, args.refreshes, share, args.zipf)
+            row += f" {hit_rate:>17.1%} {size:>13}"
+        print(row)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+# File Name: bench_retrieval.py
+# Owner: Andrew John Holland
+# Purpose: Benchmarks data_cache lookups: legacy LIKE '%query%' scan vs the FTS5 index in backend/retrieval.py as the cache grows.
+# Version: v1.1
+# Last Updated: 2026-10-18
+# Change Log:
+# 1. v1.1 - Seed through store_document so FTS5 timings cover chunked pages
+# 2. v1.0 - Initial creation; synthetic HTML pages at 100/1,000/5,000 rows, SQLite backend
+#
+# Usage (from project root): python benchmarks/bench_retrieval.py [--sizes 100 1000 5000] [--repeat 20]
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, PROJECT_ROOT)
+os.environ.setdefault('DB_BACKEND', 'sqlite')
+
+from backend import database, ingest, retrieval  # noqa: E402
+
+VOCAB = (
+    "compliance deployment kronos aims etihad airways aerospace oil gas training leave automation "
+    "python github homelab proxmox cybersecurity google analytics capm project management stakeholder "
+    "transformation rollout migration schedule budget risk register charter scope replicant neon"
+).split()
+QUERIES = [
+    "kronos deployment at etihad",
+    "what python projects are on github",
+    "capm certification",
+    "risk register and project charter",
+]
+LEGACY_LIKE = "SELECT content FROM data_cache WHERE content LIKE ? ORDER BY timestamp DESC LIMIT 1"
+
+
+FILLER = [f"w{i}" for i in range(20000)]
+
+
+def make_page(rng, words=800):
+    # Mostly long-tail filler with a handful of topical terms, like real profile/project pages
+    topical = rng.sample(VOCAB, 3)
+    body = " ".join(rng.choice(topical) if rng.random() < 0.02 else rng.choice(FILLER) for _ in range(words))
+    return f"<html><head><title>page</title></head><body><div class='content'><p>{body}</p></div></body></html>"
+
+
+def seed(count, rng):
+    for i in range(count):
+        database.store_document(f"https://example.test/page/{i}", ingest.html_to_text(make_page(rng)))
+
+
+def timed(fn, repeat):
+    """Mean latency in ms and the share of queries that returned anything."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for q in QUERIES:
+            fn(q)
+    elapsed = (time.perf_counter() - start) / (repeat * len(QUERIES)) * 1000
+    hits = sum(1 for q in QUERIES if fn(q)) / len(QUERIES)
+    return elapsed, hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 5000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(2049)
+    print(f"{'pages':>8} {'LIKE scan ms':>14} {'LIKE hits':>10} {'FTS5 ms':>10} {'FTS5 hits':>10} {'speedup':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            database.DB_PATH = os.path.join(tmp, f'bench_{size}.db')
+            database.init_db()
+            seed(size, rng)
+            scan_ms, scan_hits = timed(lambda q: database.fetch_one(LEGACY_LIKE, (f'%{q}%',)), args.repeat)
+            fts_ms, fts_hits = timed(lambda q: retrieval.search_cache(q, limit=3), args.repeat)
+            print(f"{size:>8} {scan_ms:>14.3f} {scan_hits:>10.0%} {fts_ms:>10.3f} {fts_hits:>10.0%} "
+                  f"{scan_ms / fts_ms:>8.1f}x")
+            database.get_pool().close()
+
+
+if __name__ == '__main__':
+    main()
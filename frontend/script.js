@@ -2,8 +2,11 @@
 File: frontend/script.js
 Owner: Andrew John Holland
 Purpose: Frontend logic for Cyberpunk Monk; calls FastAPI and renders replies
-Version: 1.1
+Version: 1.4
 Change Log:
+v1.4 - A 429 (server busy) shows the Retry-After wait instead of a raw HTTP error
+v1.3 - Keeps the conversation's session_id (from the 'done' frame) in sessionStorage and sends it with each message
+v1.2 - Streams replies from /api/chat/stream (Server-Sent Events) and renders chunks as they arrive
 v1.1 - Env-aware API targeting (same-origin in prod, :5000 in dev), improved error handling
 v1.0 - Basic submit, fetch POST, and message rendering
 */
@@ -11,6 +14,8 @@ v1.0 - Basic submit, fetch POST, and message rendering
   // API base URL detection
   const isHosted = !window.location.port || ["80", "443"].includes(window.location.port);
   const apiUrl = isHosted ? "/api/chat" : `http://${window.location.hostname}:5000/api/chat`;
+  const streamUrl = `${apiUrl}/stream`;
+  const SESSION_KEY = 'cpMonkSession';
 
   document.addEventListener('DOMContentLoaded', () => {
     const form = document.getElementById('chat-form');
@@ -26,32 +31,71 @@ v1.0 - Basic submit, fetch POST, and message rendering
       input.value = '';
       input.focus();
 
+      const reply = addMessage('', 'recipient');
       try {
-        const resp = await fetch(apiUrl, {
+        const resp = await fetch(streamUrl, {
           method: 'POST',
           headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({ message })
+          body: JSON.stringify({ message, session_id: sessionStorage.getItem(SESSION_KEY) || undefined })
         });
 
+        if (resp.status === 429) {
+          const wait = resp.headers.get('Retry-After') || '5';
+          reply.textContent = `The Monk is meditating on many questions. Ask again in ${wait}s.`;
+          return;
+        }
         if (!resp.ok) {
           const text = await resp.text().catch(() => '');
           throw new Error(`HTTP ${resp.status}${text ? ` – ${text}` : ''}`);
         }
 
-        const data = await resp.json();
-        addMessage(data.response || 'No response from CP Monk', 'recipient');
+        await readEvents(resp, (event, data) => {
+          if (event === 'error') throw new Error(data.detail || 'stream failed');
+          if (event === 'done' && data.session_id) sessionStorage.setItem(SESSION_KEY, data.session_id);
+          if (data.text) {
+            reply.textContent += data.text;
+            history.scrollTop = history.scrollHeight;
+          }
+        });
+        if (!reply.textContent) reply.textContent = 'No response from CP Monk';
       } catch (err) {
-        addMessage(`Error: ${err.message}`, 'recipient');
+        reply.textContent = `Error: ${err.message}`;
         console.error('Chat error:', err);
       }
     });
 
+    // Parse a text/event-stream body incrementally, calling onEvent(event, data) per frame
+    async function readEvents(resp, onEvent) {
+      const reader = resp.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let sep;
+        while ((sep = buffer.indexOf('\n\n')) !== -1) {
+          const frame = buffer.slice(0, sep);
+          buffer = buffer.slice(sep + 2);
+          let event = 'message';
+          let data = '';
+          for (const line of frame.split('\n')) {
+            if (line.startsWith('event: ')) event = line.slice(7);
+            else if (line.startsWith('data: ')) data += line.slice(6);
+          }
+          if (data) onEvent(event, JSON.parse(data));
+          if (event === 'done') return;
+        }
+      }
+    }
+
     function addMessage(text, type) {
       const div = document.createElement('div');
       div.classList.add('message', type);
       div.textContent = text;
       history.appendChild(div);
       history.scrollTop = history.scrollHeight;
+      return div;
     }
   });
 })();
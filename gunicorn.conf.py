@@ -0,0 +1,56 @@
+# File Name: gunicorn.conf.py
+# Owner: Andrew John Holland
+# Purpose: Production process settings for the Cyberpunk Monk Chatbot: gunicorn master with uvicorn (asyncio) workers serving backend.monk_bot:app.
+# Version: v1.1
+# Last Updated: 2026-10-18
+# Change Log:
+# 1. v1.1 - Several workers always log with LOG_ROTATION=external (files rotated by logrotate, not in each worker)
+# 2. v1.0 - Initial creation: worker count/class, timeouts, keep-alive, recycling, shared sessions and a per-worker Gemini quota share
+#
+# Usage (from project root): gunicorn -c gunicorn.conf.py backend.monk_bot:app
+# Every setting can be overridden with an env var (below) or on the command line.
+
+import multiprocessing
+import os
+
+bind = os.getenv('BIND', '0.0.0.0:5000')
+
+# Each uvicorn worker is one event loop that already overlaps many chats (CHAT_CONCURRENCY, default 32, per worker),
+# so one worker per core is enough; the classic 2n+1 sizing is for blocking sync workers.
+workers = int(os.getenv('WEB_CONCURRENCY', str(multiprocessing.cpu_count())))
+worker_class = 'uvicorn.workers.UvicornWorker'
+
+# No preload: each worker runs the lifespan hook itself (model clients, gRPC channels and DB pool are not fork-safe)
+preload_app = False
+
+# A chat can wait out the quota guard and a slow Gemini reply; anything past this is a stuck worker
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+# Behind nginx, which reuses upstream connections; longer than its idle timeout is pointless
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+backlog = int(os.getenv('GUNICORN_BACKLOG', '2048'))
+
+# Recycle workers now and then so slow leaks cannot build up; jitter keeps them from restarting together
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '5000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '500'))
+
+# Heartbeat files in RAM: a slow disk cannot make the master think a worker hung
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+# The app logs through logging_setup (and /metrics); gunicorn's own access log would only duplicate it
+accesslog = None
+errorlog = '-'
+loglevel = os.getenv('LOG_LEVEL', 'info').lower()
+
+# Workers are separate processes and inherit this env (the app is imported after the fork).
+if workers > 1:
+    # Every worker appends to the same logs/ files; only logrotate may rotate them (see logging_setup.LOG_ROTATION)
+    os.environ['LOG_ROTATION'] = 'external'
+    # Without a shared store, a conversation's next message could land on a worker that never saw it
+    os.environ.setdefault('SESSION_STORE', 'sqlite')
+    # The Gemini quota guard (rate_limit.ModelGate) is per process: give each worker its share of the project
+    # quota. Totals are kept in *_TOTAL so a config reload (HUP) does not divide twice.
+    for var, default in (('GEMINI_RPM', '15'), ('GEMINI_BURST', '5')):
+        total = float(os.environ.setdefault(f'{var}_TOTAL', os.getenv(var, default)))
+        os.environ[var] = str(max(1.0, total / workers))